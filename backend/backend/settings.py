@@ -61,8 +61,9 @@ APPEND_SLASH = False
 # Update the MIDDLEWARE to ensure CommonMiddleware is in the correct order
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'linkedin_api.middleware.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'linkedin_api.middleware.ApiSessionMiddleware',  # SessionMiddleware that skips SESSIONLESS_PATH_PREFIXES
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -98,6 +99,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,  # Background job workers write concurrently with requests
+        },
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),  # Seconds a request thread keeps its connection; 0 closes it after each request
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -145,7 +151,7 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Session settings
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')  # 'django.contrib.sessions.backends.signed_cookies' needs no database
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 SESSION_COOKIE_SECURE = False
 SESSION_COOKIE_HTTPONLY = True
@@ -153,6 +159,8 @@ SESSION_COOKIE_SAMESITE = 'Lax'  # Changed back to Lax for better security
 SESSION_COOKIE_DOMAIN = None
 SESSION_COOKIE_NAME = 'sessionid'
 SESSION_SAVE_EVERY_REQUEST = True  # Save the session data on every request
+# Paths that never load or save the session; the API takes its key in the request body
+SESSIONLESS_PATH_PREFIXES = [prefix for prefix in os.getenv('SESSIONLESS_PATH_PREFIXES', '/api/,/metrics').split(',') if prefix]
 
 # Security settings
 SECURE_PROXY_SSL_HEADER = None
@@ -181,12 +189,16 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-requested-with',
     'x-csrftoken',
+    'x-api-key',
+    'if-none-match',
+    'x-response-format',
 ]
 
 # Add response headers
 CORS_EXPOSE_HEADERS = [
     'content-type',
     'content-length',
+    'etag',
 ]
 
 # Ensure all responses have CORS headers
@@ -235,6 +247,146 @@ LINKEDIN_SCOPES = [
 
 # OpenAI Settings
 # OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')  # Any OpenAI-compatible endpoint
+
+# OpenAI client pool: one long-lived client per API key; open sockets are
+# bounded by OPENAI_CLIENT_POOL_MAX_SIZE * OPENAI_MAX_CONNECTIONS_PER_CLIENT
+OPENAI_CLIENT_POOL_MAX_SIZE = int(os.getenv('OPENAI_CLIENT_POOL_MAX_SIZE', '128'))
+OPENAI_CLIENT_POOL_TTL = int(os.getenv('OPENAI_CLIENT_POOL_TTL', '900'))  # Seconds a client may sit idle
+OPENAI_MAX_CONNECTIONS_PER_CLIENT = int(os.getenv('OPENAI_MAX_CONNECTIONS_PER_CLIENT', '20'))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', '60'))  # Seconds an idle connection is kept open
+OPENAI_CLIENT_CLOSE_DELAY = float(os.getenv('OPENAI_CLIENT_CLOSE_DELAY', '60'))  # Seconds an evicted async client stays open for calls still in flight
+
+# Caches
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'results': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'results',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Result cache for model outputs that only depend on their prompt (CV analysis,
+# skills, ideas, calendar, industry trends)
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+RESULT_CACHE_BACKEND = os.getenv('RESULT_CACHE_BACKEND', 'memory')  # 'memory' or 'django'
+RESULT_CACHE_ALIAS = os.getenv('RESULT_CACHE_ALIAS', 'results')  # Django cache alias for the 'django' backend
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1024'))  # Size cap for the 'memory' backend
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', '86400'))  # Seconds
+
+# Near-duplicate CV detection: a CV whose word shingles are this similar to an
+# already analyzed one reuses its analysis (needs RESULT_CACHE_ENABLED)
+SIMILAR_CV_ENABLED = os.getenv('SIMILAR_CV_ENABLED', 'true').lower() == 'true'
+SIMILAR_CV_THRESHOLD = float(os.getenv('SIMILAR_CV_THRESHOLD', '0.9'))  # Estimated Jaccard similarity, 0-1
+SIMILAR_CV_MAX_ENTRIES = int(os.getenv('SIMILAR_CV_MAX_ENTRIES', '5000'))  # Least recently matched CVs are evicted beyond this
+SIMILAR_CV_INDEX_PATH = os.getenv('SIMILAR_CV_INDEX_PATH', str(BASE_DIR / '.cache' / 'similar_cvs.json.gz'))  # '' keeps it in memory only
+SIMILAR_CV_SAVE_INTERVAL = float(os.getenv('SIMILAR_CV_SAVE_INTERVAL', '30'))  # Seconds between writes of a changed index
+
+# Generation pipeline concurrency
+GENERATION_MAX_WORKERS_PER_REQUEST = int(os.getenv('GENERATION_MAX_WORKERS_PER_REQUEST', '8'))  # Stages run in parallel for one request
+GENERATION_MAX_CONCURRENT_STAGES = int(os.getenv('GENERATION_MAX_CONCURRENT_STAGES', '32'))  # Stages run in parallel across the process
+GENERATION_MAX_CONCURRENT_ASYNC_STAGES = int(os.getenv('GENERATION_MAX_CONCURRENT_ASYNC_STAGES', '512'))  # Same cap for the async views, per event loop
+GENERATION_MULTI_POST = os.getenv('GENERATION_MULTI_POST', 'false').lower() == 'true'  # Default for the multi_post request flag
+
+# Request coalescing: identical generations, completions and news lookups that are
+# already in flight are joined instead of being run again
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '300'))  # Seconds a caller waits before running the work itself
+
+# OpenAI call scheduling, per API key. The bucket sizes are starting points; they are
+# replaced by the limits OpenAI reports in its x-ratelimit-* response headers.
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', '500'))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_TOKENS_PER_MINUTE', '30000'))
+OPENAI_INITIAL_CONCURRENCY = int(os.getenv('OPENAI_INITIAL_CONCURRENCY', '8'))  # Calls in flight; grows additively, halves on 429
+OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', '64'))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '4'))
+OPENAI_BACKOFF_BASE = float(os.getenv('OPENAI_BACKOFF_BASE', '0.5'))  # Seconds; doubled per attempt when no retry-after is sent
+OPENAI_BACKOFF_MAX = float(os.getenv('OPENAI_BACKOFF_MAX', '30'))
+OPENAI_SCHEDULER_POLL_INTERVAL = float(os.getenv('OPENAI_SCHEDULER_POLL_INTERVAL', '0.05'))
+
+# JSON responses of generate-posts, generation detail and job status
+RESPONSE_COMPRESSION_ENABLED = os.getenv('RESPONSE_COMPRESSION_ENABLED', 'true').lower() == 'true'  # Negotiated from Accept-Encoding
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))  # Smaller bodies are sent uncompressed
+RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '5'))  # Used when the brotli package is installed
+
+# Background generation jobs (POST /api/generate-posts with background=true)
+GENERATION_JOB_WORKERS = int(os.getenv('GENERATION_JOB_WORKERS', '4'))  # Jobs run in parallel per process
+GENERATION_JOB_STALE_AFTER = int(os.getenv('GENERATION_JOB_STALE_AFTER', '600'))  # Seconds without a heartbeat before a job counts as interrupted
+GENERATION_JOB_HEARTBEAT = int(os.getenv('GENERATION_JOB_HEARTBEAT', '30'))  # Seconds between heartbeats of a process' unfinished jobs; keep well below STALE_AFTER
+
+# Generation history: successful runs are stored so one section can be regenerated
+GENERATION_HISTORY_ENABLED = os.getenv('GENERATION_HISTORY_ENABLED', 'true').lower() == 'true'
+
+# Batch generation (POST /api/generate-posts/batch)
+BATCH_MAX_CVS = int(os.getenv('BATCH_MAX_CVS', '50'))  # CVs per batch request
+BATCH_MAX_BYTES = int(os.getenv('BATCH_MAX_BYTES', str(100 * 1024 * 1024)))  # Total PDF bytes per batch request
+BATCH_MAX_CONCURRENT_CVS = int(os.getenv('BATCH_MAX_CONCURRENT_CVS', '4'))  # CVs processed at once across all batches
+
+# CV PDF extraction
+PDF_MAX_BYTES = int(os.getenv('PDF_MAX_BYTES', str(10 * 1024 * 1024)))  # Uploads larger than this are rejected
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '50'))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '8'))  # Smaller PDFs are extracted in-process
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', '4'))  # Processes used for large PDFs
+PDF_TEXT_CACHE_MAX_ENTRIES = int(os.getenv('PDF_TEXT_CACHE_MAX_ENTRIES', '256'))
+PDF_TEXT_CACHE_TTL = int(os.getenv('PDF_TEXT_CACHE_TTL', '86400'))
+
+# News search
+NEWS_BACKEND = os.getenv('NEWS_BACKEND', 'google')  # 'google', or 'fixture' to serve NEWS_FIXTURE_PATH offline
+NEWS_FEED_URL = os.getenv('NEWS_FEED_URL', 'https://news.google.com/rss/search')  # Used by the 'google' backend
+NEWS_FIXTURE_PATH = os.getenv('NEWS_FIXTURE_PATH', str(BASE_DIR / 'linkedin_api' / 'fixtures' / 'news_feed.xml'))
+NEWS_CONNECT_TIMEOUT = float(os.getenv('NEWS_CONNECT_TIMEOUT', '3'))
+NEWS_READ_TIMEOUT = float(os.getenv('NEWS_READ_TIMEOUT', '5'))
+NEWS_TOTAL_TIMEOUT = float(os.getenv('NEWS_TOTAL_TIMEOUT', '8'))  # Upper bound for fetching the whole feed
+NEWS_POOL_MAX_SIZE = int(os.getenv('NEWS_POOL_MAX_SIZE', '10'))
+NEWS_CACHE_TTL = int(os.getenv('NEWS_CACHE_TTL', '900'))
+NEWS_CACHE_MAX_ENTRIES = int(os.getenv('NEWS_CACHE_MAX_ENTRIES', '512'))
+
+# Record/replay of OpenAI and news traffic (see linkedin_api/utils/cassettes.py)
+CASSETTE_MODE = os.getenv('CASSETTE_MODE', 'off')  # 'off', 'record' or 'replay'
+CASSETTE_PATH = os.getenv('CASSETTE_PATH', str(BASE_DIR / 'cassettes' / 'traffic.jsonl.gz'))
+CASSETTE_LATENCY_SCALE = float(os.getenv('CASSETTE_LATENCY_SCALE', '1'))  # Share of the recorded latency replayed; 0 answers at once
+
+# Background warmer: keeps trends and news cached for the most frequent industry
+# and expertise combinations. Needs a server-side key; user keys are never used for it.
+WARMER_ENABLED = os.getenv('WARMER_ENABLED', 'false').lower() == 'true'
+WARMER_API_KEY = os.getenv('WARMER_API_KEY', os.getenv('OPENAI_API_KEY', ''))
+WARMER_INTERVAL = int(os.getenv('WARMER_INTERVAL', '600'))  # Seconds between refreshes; keep below NEWS_CACHE_TTL
+WARMER_MAX_AGE = int(os.getenv('WARMER_MAX_AGE', '1500'))  # Seconds after its last refresh before a combination counts as cold
+WARMER_MAX_INDUSTRIES = int(os.getenv('WARMER_MAX_INDUSTRIES', '20'))  # Industry/expertise combinations kept warm
+WARMER_MIN_REQUESTS = int(os.getenv('WARMER_MIN_REQUESTS', '3'))  # Sightings before a combination is warmed
+WARMER_MAX_TRACKED = int(os.getenv('WARMER_MAX_TRACKED', '1000'))  # Distinct combinations counted
+
+# tiktoken encoding for exact token counts (o200k_base for gpt-4o), loaded in the background at
+# startup; empty, or until it has loaded, counts are estimated at ~4 characters per token
+PROMPT_TOKEN_ENCODING = os.getenv('PROMPT_TOKEN_ENCODING', '')
+# Prompt budgets, in tokens, for the variable inputs pasted into each call type
+PROMPT_TOKEN_BUDGETS = {
+    'cv_profile': int(os.getenv('PROMPT_BUDGET_CV_PROFILE', '6000')),  # Normalized CV text
+    'skills_context': int(os.getenv('PROMPT_BUDGET_SKILLS_CONTEXT', '1000')),  # Skills analysis in post prompts
+    'industry_trends': int(os.getenv('PROMPT_BUDGET_INDUSTRY_TRENDS', '800')),
+    'news': int(os.getenv('PROMPT_BUDGET_NEWS', '600')),
+}
+
+# Prometheus metrics (GET /metrics)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Scrapes must send "Authorization: Bearer <token>"; required unless DEBUG
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# Request tracing: spans are written to TRACE_FILE (JSON lines) for sampled
+# traces and for every trace that failed or took longer than TRACE_SLOW_THRESHOLD
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'true').lower() == 'true'
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))  # Fraction of ordinary traces kept
+TRACE_ALLOW_CLIENT_SAMPLING = os.getenv('TRACE_ALLOW_CLIENT_SAMPLING', 'false').lower() == 'true'  # Honour "X-Trace-Sample: 1" from clients
+TRACE_SLOW_THRESHOLD = float(os.getenv('TRACE_SLOW_THRESHOLD', '20'))  # Seconds
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '1000'))  # Per trace; batches can have many
+TRACE_FILE = os.getenv('TRACE_FILE', str(BASE_DIR / 'logs' / 'traces.jsonl'))
+TRACE_FILE_MAX_BYTES = int(os.getenv('TRACE_FILE_MAX_BYTES', str(50 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv('TRACE_FILE_BACKUPS', '5'))
+TRACE_QUEUE_SIZE = int(os.getenv('TRACE_QUEUE_SIZE', '10000'))  # Spans beyond this are dropped, never waited on
 
 # Add logging configuration
 LOGGING = {
@@ -255,5 +407,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'linkedin_api': {
+            'handlers': ['console'],
+            'level': os.getenv('LOG_LEVEL', 'INFO'),  # DEBUG also logs raw model output
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from linkedin_api.views import metrics
 
 # Main URL patterns
 urlpatterns = [
@@ -29,6 +30,9 @@ urlpatterns = [
     
     # DRF auth
     path('api-auth/', include('rest_framework.urls')),
+
+    # Prometheus metrics
+    path('metrics', metrics, name='metrics'),
 ]
 
 # Serve static files during development
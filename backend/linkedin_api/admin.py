@@ -0,0 +1,19 @@
+from django.contrib import admin
+from .models import GeneratedPost, Generation, GenerationJob
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('id', 'api_key_hash', 'created_at', 'updated_at', 'started_at', 'finished_at')
+
+class GeneratedPostInline(admin.TabularInline):
+    model = GeneratedPost
+    extra = 0
+    readonly_fields = ('post_type', 'version', 'status', 'created_at')
+
+@admin.register(Generation)
+class GenerationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'cv_hash', 'created_at', 'updated_at')
+    readonly_fields = ('id', 'api_key_hash', 'cv_hash', 'created_at', 'updated_at')
+    inlines = [GeneratedPostInline]
@@ -1,3 +1,4 @@
+import threading
 from django.apps import AppConfig
     
 
@@ -7,4 +8,11 @@ class LinkedinApiConfig(AppConfig):
     verbose_name = 'LinkedIn API'
 
     def ready(self):
-        import linkedin_api.signals  # noqa: F401 
\ No newline at end of file
+        import linkedin_api.signals  # noqa: F401
+        from django.conf import settings
+
+        if settings.PROMPT_TOKEN_ENCODING:
+            # Loading may download the encoding, so keep it off startup and out of requests;
+            # token counts are estimated until it is ready
+            from .utils.prompt_budget import load_encoding
+            threading.Thread(target=load_encoding, name='token-encoding-loader', daemon=True).start()
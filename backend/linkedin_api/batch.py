@@ -0,0 +1,156 @@
+import contextvars
+import logging
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from .serializers import serialize_generation
+from .streaming import encode_event
+from .utils.pdf_extraction import extract_cv_text
+from .utils.pipeline import run_generation
+from .utils import tracing
+from .utils.result_cache import cache_bypassed
+
+logger = logging.getLogger(__name__)
+
+class BatchUploadError(ValueError):
+    """Raised when a batch upload is empty or over the configured limits"""
+
+# Shared by every batch request, so BATCH_MAX_CONCURRENT_CVS bounds the CVs in
+# flight across the process; further CVs wait in the executor's queue.
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BATCH_MAX_CONCURRENT_CVS,
+                thread_name_prefix='batch-cv'
+            )
+        return _executor
+
+class _BatchLimits:
+    """Running CV count and byte total of a batch, checked against the configured limits"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_bytes = 0
+
+    def add(self, size):
+        self.count += 1
+        self.total_bytes += size
+        if self.count > settings.BATCH_MAX_CVS:
+            raise BatchUploadError(f"A batch can contain at most {settings.BATCH_MAX_CVS} CVs")
+        if self.total_bytes > settings.BATCH_MAX_BYTES:
+            raise BatchUploadError(f"A batch can be at most {settings.BATCH_MAX_BYTES // (1024 * 1024)} MB")
+
+def _zip_entries(upload, limits):
+    with zipfile.ZipFile(upload) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.lower().endswith('.pdf') or name.startswith('__MACOSX/'):
+                continue
+            # Check the declared sizes before inflating anything; reads stop at
+            # the declared size, so a lying header cannot get past the limits
+            if info.file_size > settings.PDF_MAX_BYTES:
+                raise BatchUploadError(f"{name} is larger than {settings.PDF_MAX_BYTES // (1024 * 1024)} MB")
+            limits.add(info.file_size)
+            yield name, archive.read(info)
+
+def collect_batch_uploads(files):
+    """Return ``[(filename, pdf_bytes)]`` from uploaded PDFs and zip archives of PDFs"""
+    cvs = []
+    limits = _BatchLimits()
+    for upload in files:
+        if upload.name.lower().endswith('.zip'):
+            try:
+                cvs.extend(_zip_entries(upload, limits))
+            except zipfile.BadZipFile as e:
+                raise BatchUploadError(f"{upload.name}: {str(e)}")
+        else:
+            limits.add(upload.size)
+            cvs.append((upload.name, upload.read()))
+
+    if not cvs:
+        raise BatchUploadError('No CV files provided')
+    return cvs
+
+def process_cv(index, filename, data, api_key, no_cache, cancel_event):
+    """Extract and generate content for one CV of a batch; returns the per-CV result"""
+    started = time.perf_counter()
+    result = {'index': index, 'filename': filename}
+    try:
+        if cancel_event.is_set():
+            result.update(status='cancelled')
+            return result
+
+        cv_text = extract_cv_text(data).text
+        with cache_bypassed(no_cache):
+            generation = run_generation(cv_text, api_key, cancel_event=cancel_event)
+
+        if not generation['cv_analysis']:
+            result.update(status='error', error='Failed to analyze CV')
+        elif not generation['content_ideas']:
+            result.update(status='error', error='Failed to generate content ideas')
+        else:
+            result.update(status='success', result=serialize_generation(
+                generation['cv_analysis'],
+                generation['content_ideas'],
+                generation['posts'],
+                generation['industry_trends'],
+                generation['content_calendar'],
+                generation['news']
+            ))
+    except Exception as e:
+        logger.exception("Error processing batch CV %s", filename)
+        result.update(status='error', error=str(e))
+
+    result['elapsed'] = round(time.perf_counter() - started, 3)
+    return result
+
+def _traced_process_cv(index, filename, *args):
+    with tracing.span('batch.cv', index=index, filename=filename) as span:
+        result = process_cv(index, filename, *args)
+        span.set(status=result['status'])
+        return result
+
+def stream_batch(cvs, api_key, stream_format='ndjson', no_cache=False):
+    """Run every CV on the shared batch pool and yield one ``cv_result`` event per CV as it finishes.
+
+    The stream ends with a ``batch_done`` summary including the throughput in
+    CVs per minute. If the client disconnects, queued CVs are dropped and
+    running ones are cancelled between stages.
+    """
+    started = time.perf_counter()
+    cancel_event = threading.Event()
+    executor = _get_executor()
+    pending = {
+        executor.submit(contextvars.copy_context().run, _traced_process_cv, index, filename, data, api_key, no_cache, cancel_event)
+        for index, (filename, data) in enumerate(cvs)
+    }
+    counts = {'success': 0, 'error': 0}
+
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                counts[result['status']] = counts.get(result['status'], 0) + 1
+                yield encode_event('cv_result', result, stream_format)
+
+        elapsed = time.perf_counter() - started
+        yield encode_event('batch_done', {
+            'total': len(cvs),
+            'succeeded': counts['success'],
+            'failed': counts['error'],
+            'elapsed': round(elapsed, 3),
+            'cvs_per_minute': round(len(cvs) * 60 / elapsed, 2) if elapsed else None
+        }, stream_format)
+    finally:
+        if pending:
+            cancel_event.set()
+            for future in pending:
+                future.cancel()
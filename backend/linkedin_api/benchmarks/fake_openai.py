@@ -0,0 +1,292 @@
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from xml.sax.saxutils import escape
+
+# Local stand-in for the OpenAI chat completions API and the Google News RSS
+# feed, for benchmarks. Answers follow the request's json_schema when one is
+# given, so structured-output calls parse; plain-text answers use the content
+# ideas layout, which every other text call accepts as-is. Latency is drawn from
+# a log-normal time to first token plus the completion length at a fixed token
+# rate, and a configurable share of requests is answered with a 429.
+
+WORDS = ('platform delivery team customers data reliability growth product engineering insight '
+         'pipeline launch mentoring strategy quality scale cloud automation feedback impact').split()
+
+class LatencyModel:
+    """Time to first token (log-normal around ``median``) plus ``tokens / tokens_per_second``"""
+
+    def __init__(self, median=0.4, sigma=0.5, tokens_per_second=80.0, time_scale=1.0):
+        self.median = median
+        self.sigma = sigma
+        self.tokens_per_second = tokens_per_second
+        self.time_scale = time_scale
+
+    def first_token(self, rng):
+        if self.median <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median), self.sigma) * self.time_scale
+
+    def per_token(self):
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return self.time_scale / self.tokens_per_second
+
+class ServerConfig:
+    def __init__(self, latency=None, rate_limit_probability=0.0, retry_after_ms=250, completion_words=150,
+                 requests_per_minute=10000, tokens_per_minute=2000000, news_latency=0.15, seed=0):
+        self.latency = latency or LatencyModel()
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after_ms = retry_after_ms
+        self.completion_words = completion_words
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.news_latency = news_latency
+        self.seed = seed
+
+def _count_tokens(text):
+    return max(1, len(text) // 4)
+
+def _words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+def _sample(schema, rng, string_words):
+    """A value matching a strict JSON schema (objects, arrays, strings and enums)"""
+    kind = schema.get('type')
+    if kind == 'object':
+        return {name: _sample(child, rng, string_words) for name, child in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [_sample(schema['items'], rng, string_words) for _ in range(rng.randint(2, 4))]
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+    if kind in ('integer', 'number'):
+        return rng.randint(1, 10)
+    if kind == 'boolean':
+        return True
+    return _words(rng, string_words)
+
+def _ideas_text(rng, words):
+    parts = []
+    for number in range(1, 4):
+        parts.append(f"{number}. Title: {_words(rng, 5)}\nAngle: {_words(rng, 10)}\nKey Points:\n"
+                     f"- {_words(rng, 8)}\n- {_words(rng, 8)}")
+    text = '\n'.join(parts)
+    padding = words - len(text.split())
+    return text + ('\n' + _words(rng, padding) if padding > 0 else '')
+
+def request_rng(request, config):
+    """Random source seeded by the request, so a rerun gets the same answers and delays"""
+    digest = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big') ^ config.seed)
+
+def completion_text(request, config):
+    """The answer for a chat completion request; deterministic for a given request"""
+    rng = request_rng(request, config)
+    response_format = request.get('response_format') or {}
+    if response_format.get('type') == 'json_schema':
+        schema = response_format['json_schema']
+        # Post schemas need long strings to pass the multi-post validation
+        string_words = 90 if 'posts' in schema.get('name', '') else 6
+        return json.dumps(_sample(schema['schema'], rng, string_words))
+    return _ideas_text(rng, config.completion_words)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeOpenAI/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.endswith('/models'):
+            self._send(200, json.dumps({'object': 'list', 'data': [{'id': 'gpt-4o', 'object': 'model'}]}).encode())
+        elif path == '/rss/search':
+            self.server.fake.record('news')
+            time.sleep(self.server.fake.config.news_latency * self.server.fake.config.latency.time_scale)
+            self._send(200, self.server.fake.rss_feed(), 'application/rss+xml')
+        else:
+            self._send(404, b'{}')
+
+    def do_POST(self):
+        fake = self.server.fake
+        if not urlparse(self.path).path.endswith('/chat/completions'):
+            self._send(404, b'{}')
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        fake.begin()
+        try:
+            self._complete(fake, request)
+        finally:
+            fake.end()
+
+    def _complete(self, fake, request):
+        config = fake.config
+        rng = request_rng(request, config)
+        response_format = (request.get('response_format') or {}).get('json_schema', {}).get('name')
+        kind = response_format or ('stream' if request.get('stream') else 'text')
+
+        # Drawn independently of the request so a retried request isn't throttled forever
+        if config.rate_limit_probability and fake.rate_limit_rng.random() < config.rate_limit_probability:
+            fake.record('rate_limited')
+            body = json.dumps({'error': {'message': 'Rate limit reached (benchmark)', 'type': 'requests',
+                                         'code': 'rate_limit_exceeded'}}).encode()
+            self._send(429, body, headers=dict(fake.limit_headers(0), **{'retry-after-ms': str(config.retry_after_ms)}))
+            return
+
+        fake.record(kind)
+        text = completion_text(request, config)
+        prompt_tokens = sum(_count_tokens(message.get('content') or '') for message in request.get('messages', []))
+        completion_tokens = _count_tokens(text)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        headers = fake.limit_headers(prompt_tokens + completion_tokens)
+        time.sleep(config.latency.first_token(rng))
+
+        if not request.get('stream'):
+            time.sleep(completion_tokens * config.latency.per_token())
+            body = json.dumps({
+                'id': 'chatcmpl-benchmark', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': request.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': usage,
+            }).encode()
+            self._send(200, body, headers=headers)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        words = text.split(' ')
+        for start in range(0, len(words), 4):
+            delta = ' '.join(words[start:start + 4]) + (' ' if start + 4 < len(words) else '')
+            time.sleep(_count_tokens(delta) * config.latency.per_token())
+            self._chunk(self._event(request, [{'index': 0, 'delta': {'content': delta}, 'finish_reason': None}]))
+        if (request.get('stream_options') or {}).get('include_usage'):
+            self._chunk(self._event(request, [], usage))
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _event(self, request, choices, usage=None):
+        chunk = {'id': 'chatcmpl-benchmark', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                 'model': request.get('model'), 'choices': choices}
+        if usage is not None:
+            chunk['usage'] = usage
+        return b"data: " + json.dumps(chunk).encode() + b"\n\n"
+
+class FakeOpenAIServer:
+    """Threaded HTTP server on 127.0.0.1; use as a context manager or call start()/stop()"""
+
+    def __init__(self, config=None):
+        self.config = config or ServerConfig()
+        self.counts = Counter()
+        self.rate_limit_rng = random.Random(self.config.seed)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._window = deque()  # (time, tokens) of the requests in the last minute
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def openai_base_url(self):
+        return self.url + '/v1'
+
+    @property
+    def news_feed_url(self):
+        return self.url + '/rss/search'
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, name='fake-openai', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def record(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'counts': dict(self.counts), 'max_in_flight': self.max_in_flight}
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.max_in_flight = self.in_flight
+
+    def limit_headers(self, tokens):
+        """x-ratelimit-* headers for a sliding one-minute window"""
+        now = time.monotonic()
+        with self._lock:
+            self._window.append((now, tokens))
+            while self._window and now - self._window[0][0] > 60:
+                self._window.popleft()
+            used_requests = len(self._window)
+            used_tokens = sum(used for _, used in self._window)
+        return {
+            'x-ratelimit-limit-requests': str(self.config.requests_per_minute),
+            'x-ratelimit-remaining-requests': str(max(0, self.config.requests_per_minute - used_requests)),
+            'x-ratelimit-limit-tokens': str(self.config.tokens_per_minute),
+            'x-ratelimit-remaining-tokens': str(max(0, self.config.tokens_per_minute - used_tokens)),
+            'x-ratelimit-reset-requests': '60s',
+            'x-ratelimit-reset-tokens': '60s',
+        }
+
+    def rss_feed(self, items=10):
+        entries = ''.join(
+            f"<item><title>{escape(f'Benchmark headline {number} - Example News')}</title>"
+            f"<link>https://example.com/news/{number}</link>"
+            f"<pubDate>Mon, 05 Oct 2026 08:00:00 GMT</pubDate></item>"
+            for number in range(1, items + 1)
+        )
+        return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+                f'<title>Benchmark feed</title>{entries}</channel></rss>').encode()
@@ -0,0 +1,443 @@
+import json
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+import requests as http_requests
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from ..utils import metrics, tracing
+from ..utils.cassettes import get_cassette
+from ..utils.client_registry import get_pooled_client, hash_api_key
+from ..utils.pdf_extraction import extract_cv_text
+from ..utils.pipeline import run_generation
+from ..utils.rate_limiter import scheduler
+from .synthetic_cv import CV_SIZES, build_cv_pdf
+
+# Benchmark scenarios and reporting. End-to-end scenarios post synthetic CVs to
+# the generate-posts endpoints through the Django test client; stage scenarios
+# call run_generation directly and read per-stage timings from its trace spans;
+# replay scenarios send the OpenAI requests of a recorded cassette through the
+# scheduler, answered from the cassette; overhead scenarios time cheap API
+# requests to compare the request stack itself under two settings profiles.
+
+ENDPOINTS = {
+    'sync': '/api/generate-posts',
+    'async': '/api/async/generate-posts',
+    'stream': '/api/generate-posts/stream',
+}
+
+API_KEY = 'sk-benchmark'
+
+# Metrics compared against a baseline; True where higher is better
+COMPARED_METRICS = {
+    'latency.p50': False,
+    'latency.p95': False,
+    'throughput_rpm': True,
+    'calls_per_request': False,
+    'peak_traced_mb': False,
+    'queries_per_request': False,
+}
+
+class Scenario:
+    def __init__(self, mode, size, endpoint=None, multi_post=False):
+        self.mode = mode  # 'e2e' or 'stages'
+        self.size = size
+        self.endpoint = endpoint
+        self.multi_post = multi_post
+
+    @property
+    def name(self):
+        parts = [self.mode, self.endpoint or 'pipeline', self.size]
+        if self.multi_post:
+            parts.append('multi')
+        return '/'.join(parts)
+
+def percentiles(values):
+    """p50/p90/p95/p99 (nearest rank), mean and max of ``values``, in seconds"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        'p50': round(rank(50), 4),
+        'p90': round(rank(90), 4),
+        'p95': round(rank(95), 4),
+        'p99': round(rank(99), 4),
+        'mean': round(sum(ordered) / len(ordered), 4),
+        'max': round(ordered[-1], 4),
+    }
+
+@contextmanager
+def benchmark_settings(server):
+    """Point the OpenAI client and the news feed at the stand-in server"""
+    with override_settings(
+        OPENAI_BASE_URL=server.openai_base_url,
+        NEWS_BACKEND='google',
+        NEWS_FEED_URL=server.news_feed_url,
+        TRACE_ENABLED=True,
+        TRACE_SAMPLE_RATE=0.0,
+        TRACE_SLOW_THRESHOLD=float('inf'),
+        ALLOWED_HOSTS=['testserver'],
+        GENERATION_HISTORY_ENABLED=False,  # Keep benchmark runs out of the database
+        SIMILAR_CV_INDEX_PATH='',  # And the near-duplicate CV index off the disk
+    ):
+        yield
+
+def _post_cv(endpoint, pdf, index, multi_post):
+    """Send one CV; returns ``(ok, seconds to first event or None)``"""
+    data = {
+        'api_key': API_KEY,
+        'cv': SimpleUploadedFile(f'cv-{index}.pdf', pdf, 'application/pdf'),
+        'multi_post': 'true' if multi_post else 'false',
+    }
+    started = time.perf_counter()
+    response = Client().post(ENDPOINTS[endpoint], data)
+    if not response.streaming:
+        return response.status_code == 200, None
+
+    first_event = None
+    ok = response.status_code == 200
+    for chunk in response.streaming_content:
+        if first_event is None:
+            first_event = time.perf_counter() - started
+        event = json.loads(chunk)
+        if event['event'] == 'error' or (event['event'] == 'done' and event['data']['status'] != 'success'):
+            ok = False
+    return ok, first_event
+
+def _run_stages(pdf, multi_post):
+    """Run the pipeline directly; returns ``(ok, {stage: seconds})``"""
+    root = tracing.begin_trace('benchmark', sampled=False)
+    with tracing.activate(root):
+        cv_text = extract_cv_text(pdf).text
+        generation = run_generation(cv_text, API_KEY, multi_post=multi_post)
+    stages = {}
+    for record in root.trace.spans:
+        if record['name'].startswith('stage:') or record['name'] == 'pdf.extract':
+            stages[record['name'].replace('stage:', '')] = record['duration_ms'] / 1000
+    ok = bool(generation['cv_analysis'] and generation['content_ideas'])
+    return ok, stages
+
+def run_scenario(scenario, server, requests=10, concurrency=4, distinct_cvs=None, trace_memory=False, seed=0):
+    """Run one scenario and return its result dict.
+
+    Every request uses a different synthetic CV unless ``distinct_cvs`` is set,
+    in which case the CVs repeat and the result cache is exercised.
+    """
+    distinct_cvs = distinct_cvs or requests
+    pages = CV_SIZES[scenario.size]
+    # Seeds differ per scenario so one scenario never hits the caches warmed by another
+    base_seed = zlib.crc32(f'{scenario.name}:{seed}'.encode()) * 100000
+    pdfs = [build_cv_pdf(pages, seed=base_seed + index) for index in range(distinct_cvs)]
+
+    latencies = []
+    first_events = []
+    stage_times = {}
+    errors = 0
+    lock = threading.Lock()
+
+    def one(index):
+        nonlocal errors
+        pdf = pdfs[index % distinct_cvs]
+        started = time.perf_counter()
+        try:
+            if scenario.mode == 'stages':
+                ok, stages = _run_stages(pdf, scenario.multi_post)
+                first_event = None
+            else:
+                ok, first_event = _post_cv(scenario.endpoint, pdf, index, scenario.multi_post)
+                stages = {}
+        except Exception:
+            ok, first_event, stages = False, None, {}
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if first_event is not None:
+                first_events.append(first_event)
+            for name, seconds in stages.items():
+                stage_times.setdefault(name, []).append(seconds)
+            if not ok:
+                errors += 1
+
+    server.reset()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - started
+    calls = server.snapshot()
+
+    result = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'distinct_cvs': distinct_cvs,
+        'pages': pages,
+        'errors': errors,
+        'wall_seconds': round(wall, 3),
+        'throughput_rpm': round(requests * 60 / wall, 2) if wall else None,
+        'latency': percentiles(latencies),
+        'calls_per_request': round(sum(count for kind, count in calls['counts'].items()
+                                       if kind not in ('news', 'rate_limited')) / requests, 2),
+        'calls': calls['counts'],
+        'openai_max_in_flight': calls['max_in_flight'],
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if first_events:
+        result['first_event'] = percentiles(first_events)
+    if stage_times:
+        result['stages'] = {name: percentiles(values) for name, values in sorted(stage_times.items())}
+    if trace_memory:
+        result['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        tracemalloc.stop()
+    return result
+
+def _replay_one(client, entry):
+    request = dict(entry['request'])
+    token = metrics.current_operation.set(entry.get('operation', 'unknown'))
+    try:
+        if request.pop('stream', False):
+            with scheduler.stream(client, **request) as chunks:
+                for _ in chunks:
+                    pass
+        else:
+            scheduler.create(client, **request)
+    finally:
+        metrics.current_operation.reset(token)
+
+def run_replay(path, concurrency=4, latency_scale=1.0):
+    """Replay the OpenAI calls recorded in the cassette at ``path`` and return a result dict.
+
+    Calls are sent in recording order, ``concurrency`` at a time, and answered
+    after ``latency_scale`` times their recorded latency.
+    """
+    entries = get_cassette(path).entries('openai')
+    if not entries:
+        raise ValueError(f"No OpenAI calls recorded in {path}")
+    client = get_pooled_client(API_KEY)
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(entry):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            _replay_one(client, entry)
+            ok = True
+        except Exception:
+            ok = False
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    with override_settings(CASSETTE_MODE='replay', CASSETTE_PATH=str(path), CASSETTE_LATENCY_SCALE=latency_scale):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(one, entries))
+        wall = time.perf_counter() - started
+
+    return {
+        'requests': len(entries),
+        'concurrency': concurrency,
+        'errors': errors,
+        'wall_seconds': round(wall, 3),
+        'throughput_rpm': round(len(entries) * 60 / wall, 2) if wall else None,
+        'latency': percentiles(latencies),
+        'recorded_latency': percentiles([entry['latency'] for entry in entries]),
+        'scheduler': scheduler.stats().get(hash_api_key(API_KEY)[:12], {}),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+# Requests that do no model work, so their time is the middleware, session and
+# database cost of any API request: a rejected key check, and a job lookup (one query)
+OVERHEAD_REQUESTS = {
+    'verify': ('post', '/api/verify-api-key', {'api_key': 'not-a-key'}),
+    'job': ('get', '/api/jobs/00000000-0000-0000-0000-000000000000', None),
+}
+
+def _legacy_profile():
+    """Settings before the sessionless API path: DB sessions saved on every request, no persistent connections"""
+    middleware = [
+        'django.contrib.sessions.middleware.SessionMiddleware' if path == 'linkedin_api.middleware.ApiSessionMiddleware'
+        else path for path in settings.MIDDLEWARE
+    ]
+    return override_settings(
+        MIDDLEWARE=middleware,
+        SESSION_ENGINE='django.contrib.sessions.backends.db',
+        SESSION_SAVE_EVERY_REQUEST=True
+    ), 0
+
+OVERHEAD_PROFILES = {
+    'legacy': _legacy_profile,
+    'current': lambda: (override_settings(), settings.DATABASES['default'].get('CONN_MAX_AGE', 0)),
+}
+
+@contextmanager
+def scratch_database():
+    """Point the default database at a migrated SQLite file that is removed afterwards"""
+    connection = connections['default']
+    directory = tempfile.mkdtemp(prefix='benchmark-')
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class _PooledWSGIServer(WSGIServer):
+    """WSGI server answering on a fixed pool of threads, like a threaded gunicorn worker"""
+
+    def __init__(self, app, workers):
+        super().__init__(('127.0.0.1', 0), _QuietHandler)
+        self.set_app(app)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+def run_overhead(profile, request, requests=200, concurrency=4):
+    """Time ``requests`` cheap API requests under a settings profile and return a result dict.
+
+    Requests go over HTTP to Django's WSGI handler, so connection handling
+    (CONN_MAX_AGE) behaves as in production. Every client carries a session
+    cookie, as a browser that has visited the admin would, so the legacy
+    profile loads and saves that session per request.
+    """
+    from django.contrib.sessions.backends.db import SessionStore
+
+    settings_override, conn_max_age = OVERHEAD_PROFILES[profile]()
+    method, path, data = OVERHEAD_REQUESTS[request]
+    latencies = []
+    counts = {'queries': 0, 'connections': 0}
+    errors = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def count_query(execute, sql, params, many, context):
+        with lock:
+            counts['queries'] += 1
+        return execute(sql, params, many, context)
+
+    def count_connection(sender, **kwargs):
+        with lock:
+            counts['connections'] += 1
+
+    def app(environ, start_response):
+        with connections['default'].execute_wrapper(count_query):
+            return handler(environ, start_response)
+
+    def one(_):
+        nonlocal errors
+        if not hasattr(local, 'session'):
+            local.session = http_requests.Session()
+            with lock:
+                local.session.cookies.set(settings.SESSION_COOKIE_NAME, session_keys.pop())
+        started = time.perf_counter()
+        try:
+            ok = local.session.request(method, url + path, data=data, timeout=30).status_code < 500
+        except http_requests.RequestException:
+            ok = False
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    session_keys = []
+    for _ in range(concurrency):
+        session = SessionStore()
+        session['benchmark'] = True
+        session.create()
+        session_keys.append(session.session_key)
+
+    connection_settings = connections['default'].settings_dict
+    previous_max_age = connection_settings['CONN_MAX_AGE']
+    connection_settings['CONN_MAX_AGE'] = conn_max_age
+    connection_created.connect(count_connection)
+    try:
+        with settings_override:
+            handler = WSGIHandler()  # Builds the middleware chain from the profile's settings
+            server = _PooledWSGIServer(app, concurrency)
+            url = f'http://127.0.0.1:{server.server_port}'
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    list(executor.map(one, range(requests)))
+                wall = time.perf_counter() - started
+            finally:
+                server.shutdown()
+                server.server_close()
+    finally:
+        connection_created.disconnect(count_connection)
+        connection_settings['CONN_MAX_AGE'] = previous_max_age
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'wall_seconds': round(wall, 3),
+        'throughput_rpm': round(requests * 60 / wall, 2) if wall else None,
+        'latency': percentiles(latencies),
+        'queries_per_request': round(counts['queries'] / requests, 2),
+        'connections_per_request': round(counts['connections'] / requests, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def _metric(result, path):
+    value = result
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def compare(baseline, current, tolerance=0.1):
+    """Rows of ``(scenario, metric, baseline, current, change, regressed)`` for scenarios in both runs"""
+    rows = []
+    for name, result in current['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = _metric(previous, metric), _metric(result, metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            rows.append((name, metric, old, new, change, regressed))
+    return rows
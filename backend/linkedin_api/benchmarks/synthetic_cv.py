@@ -0,0 +1,89 @@
+import random
+
+# Synthetic CV PDFs for benchmarks. The PDF is written by hand (one Helvetica
+# text block per page) so no PDF library is needed beyond PyPDF2 for reading.
+
+# Approximate page counts of the CV sizes the benchmark can use
+CV_SIZES = {
+    'small': 1,
+    'medium': 3,
+    'large': 8,
+}
+
+LINES_PER_PAGE = 48
+
+ROLES = ['Software Engineer', 'Data Scientist', 'Product Manager', 'Engineering Manager',
+         'DevOps Engineer', 'Machine Learning Engineer', 'Solutions Architect', 'QA Lead']
+INDUSTRIES = ['fintech', 'healthcare', 'e-commerce', 'logistics', 'cybersecurity', 'education technology']
+SKILLS = ['Python', 'Django', 'PostgreSQL', 'Kubernetes', 'AWS', 'React', 'TypeScript', 'Terraform',
+          'Kafka', 'Spark', 'Go', 'Docker', 'GraphQL', 'Redis', 'TensorFlow', 'CI/CD']
+VERBS = ['Led', 'Built', 'Designed', 'Migrated', 'Scaled', 'Automated', 'Reduced', 'Launched', 'Mentored']
+OBJECTS = ['the payments platform', 'a real-time analytics pipeline', 'the customer onboarding flow',
+           'an internal developer portal', 'the search service', 'a fraud detection model',
+           'the mobile release process', 'the data warehouse']
+OUTCOMES = ['cutting latency by 40%', 'saving $200k per year', 'serving 3M users', 'halving incident volume',
+            'improving conversion by 12%', 'with a team of six engineers', 'ahead of schedule']
+
+def cv_lines(pages, seed=0):
+    """Text lines of a synthetic CV filling roughly ``pages`` pages"""
+    rng = random.Random(seed)
+    role = rng.choice(ROLES)
+    industry = rng.choice(INDUSTRIES)
+    lines = [
+        f"Candidate {seed}",
+        f"Senior {role} - {industry}",
+        "",
+        "Summary",
+        f"{role} with {rng.randint(4, 20)} years of experience in {industry}, focused on",
+        f"{', '.join(rng.sample(SKILLS, 3))} and delivery of customer-facing products.",
+        "",
+        "Skills",
+        ', '.join(rng.sample(SKILLS, 8)),
+        "",
+        "Experience",
+    ]
+    job = 0
+    while len(lines) < pages * LINES_PER_PAGE:
+        job += 1
+        lines.append(f"{rng.choice(ROLES)}, Company {seed}-{job} ({2024 - job * 2} - {2026 - job * 2})")
+        for _ in range(rng.randint(3, 6)):
+            lines.append(f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)}, {rng.choice(OUTCOMES)}")
+        lines.append("")
+    return lines[:pages * LINES_PER_PAGE]
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def build_cv_pdf(pages=1, seed=0):
+    """Return the bytes of a ``pages``-page CV PDF whose text varies with ``seed``"""
+    lines = cv_lines(pages, seed)
+    page_count = max(1, (len(lines) + LINES_PER_PAGE - 1) // LINES_PER_PAGE)
+
+    # 1: catalog, 2: page tree, 3: font, then a page object and a content stream per page
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for index in range(page_count):
+        page_lines = lines[index * LINES_PER_PAGE:(index + 1) * LINES_PER_PAGE]
+        text = ' '.join(f"({_escape(line)}) Tj T*" for line in page_lines)
+        stream = f"BT /F1 10 Tf 14 TL 50 780 Td {text} ET".encode('latin-1', 'replace')
+        content_number = len(objects) + 2
+        page_refs.append(f"{len(objects) + 1} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {content_number} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {page_count} >>".encode()
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
@@ -0,0 +1,188 @@
+import json
+import logging
+import platform
+from datetime import datetime, timezone
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...benchmarks.fake_openai import FakeOpenAIServer, LatencyModel, ServerConfig
+from ...benchmarks.runner import (
+    ENDPOINTS,
+    OVERHEAD_PROFILES,
+    OVERHEAD_REQUESTS,
+    Scenario,
+    benchmark_settings,
+    compare,
+    run_overhead,
+    run_replay,
+    run_scenario,
+    scratch_database,
+)
+from ...benchmarks.synthetic_cv import CV_SIZES
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+def _choices(value, allowed, option):
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise CommandError(f"Unknown {option}: {', '.join(unknown)} (choose from {', '.join(allowed)})")
+    return items
+
+class Command(BaseCommand):
+    help = ('Benchmark the generation pipeline offline against a local stand-in for the OpenAI API '
+            'and the news feed, using synthetic CV PDFs')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', default='e2e,stages', help="Comma-separated: e2e, stages, replay, overhead")
+        parser.add_argument('--cassette', help='Recorded cassette (CASSETTE_MODE=record) for the replay mode')
+        parser.add_argument('--endpoints', default='sync', help=f"Comma-separated: {', '.join(ENDPOINTS)}")
+        parser.add_argument('--sizes', default='small,large', help=f"Comma-separated: {', '.join(CV_SIZES)}")
+        parser.add_argument('--multi-post', action='store_true', help='Use the single-call multi-post mode')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--distinct-cvs', type=int, default=None,
+                            help='Cycle through this many CVs instead of a new one per request (warm caches)')
+        parser.add_argument('--latency-median', type=float, default=0.4, help='Median time to first token, seconds')
+        parser.add_argument('--latency-sigma', type=float, default=0.5, help='Log-normal sigma of the time to first token')
+        parser.add_argument('--tokens-per-second', type=float, default=80.0, help='Completion token rate')
+        parser.add_argument('--time-scale', type=float, default=1.0, help='Multiplies every simulated delay')
+        parser.add_argument('--rate-limit-probability', type=float, default=0.0, help='Share of calls answered with 429')
+        parser.add_argument('--retry-after-ms', type=int, default=250)
+        parser.add_argument('--news-latency', type=float, default=0.15, help='Seconds before the RSS feed answers')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='Track peak Python allocations with tracemalloc (slows the run down)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--save-baseline', action='store_true', help='Save the results as the baseline')
+        parser.add_argument('--compare', action='store_true', help='Compare the results with the baseline')
+        parser.add_argument('--baseline-file', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative change before a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        modes = _choices(options['mode'], ['e2e', 'stages', 'replay', 'overhead'], 'mode')
+        if 'replay' in modes and not options['cassette']:
+            raise CommandError("The replay mode needs --cassette")
+        endpoints = _choices(options['endpoints'], list(ENDPOINTS), 'endpoint')
+        sizes = _choices(options['sizes'], list(CV_SIZES), 'size')
+
+        scenarios = []
+        for size in sizes:
+            if 'e2e' in modes:
+                scenarios.extend(Scenario('e2e', size, endpoint, options['multi_post']) for endpoint in endpoints)
+            if 'stages' in modes:
+                scenarios.append(Scenario('stages', size, multi_post=options['multi_post']))
+
+        config = ServerConfig(
+            latency=LatencyModel(
+                options['latency_median'],
+                options['latency_sigma'],
+                options['tokens_per_second'],
+                options['time_scale']
+            ),
+            rate_limit_probability=options['rate_limit_probability'],
+            retry_after_ms=options['retry_after_ms'],
+            news_latency=options['news_latency'],
+            seed=options['seed'],
+        )
+        results = {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'config': {name: options[name] for name in (
+                'requests', 'concurrency', 'distinct_cvs', 'latency_median', 'latency_sigma', 'tokens_per_second',
+                'time_scale', 'rate_limit_probability', 'news_latency', 'multi_post', 'seed')},
+            'scenarios': {},
+        }
+
+        # httpx logs every request at INFO
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        with FakeOpenAIServer(config) as server, benchmark_settings(server):
+            for scenario in scenarios:
+                self.stdout.write(f"Running {scenario.name} ({options['requests']} requests, "
+                                  f"concurrency {options['concurrency']})...")
+                result = run_scenario(
+                    scenario,
+                    server,
+                    requests=options['requests'],
+                    concurrency=options['concurrency'],
+                    distinct_cvs=options['distinct_cvs'],
+                    trace_memory=options['trace_memory'],
+                    seed=options['seed']
+                )
+                results['scenarios'][scenario.name] = result
+                self._report(scenario.name, result)
+
+            if 'replay' in modes:
+                name = f"replay/{Path(options['cassette']).name.split('.')[0]}"
+                self.stdout.write(f"Running {name} (concurrency {options['concurrency']})...")
+                result = run_replay(options['cassette'], options['concurrency'], options['time_scale'])
+                results['scenarios'][name] = result
+                self._report(name, result)
+
+        if 'overhead' in modes:
+            # The overhead requests are rejected on purpose; don't log each one
+            logging.getLogger('django.request').setLevel(logging.ERROR)
+            # Session rows and job lookups need a database; use a scratch one
+            with scratch_database():
+                for request in OVERHEAD_REQUESTS:
+                    for profile in OVERHEAD_PROFILES:
+                        name = f'overhead/{profile}/{request}'
+                        self.stdout.write(f"Running {name} ({options['requests']} requests, "
+                                          f"concurrency {options['concurrency']})...")
+                        result = run_overhead(profile, request, options['requests'], options['concurrency'])
+                        results['scenarios'][name] = result
+                        self._report(name, result)
+
+        if options['output']:
+            self._write(options['output'], results)
+
+        baseline_file = Path(options['baseline_file'])
+        if options['compare']:
+            if not baseline_file.exists():
+                raise CommandError(f"No baseline at {baseline_file}; run with --save-baseline first")
+            rows = compare(json.loads(baseline_file.read_text()), results, options['tolerance'])
+            regressions = self._report_comparison(rows)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{regressions} metric(s) regressed by more than {options['tolerance']:.0%}")
+
+        if options['save_baseline']:
+            self._write(baseline_file, results)
+
+    def _write(self, path, results):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + '\n')
+        self.stdout.write(f"Results written to {path}")
+
+    def _report(self, name, result):
+        latency = result['latency']
+        self.stdout.write(
+            f"  latency p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s  "
+            f"throughput {result['throughput_rpm']} req/min  calls/request {result.get('calls_per_request', 1)}  "
+            f"errors {result['errors']}  peak RSS {result['peak_rss_mb']} MB"
+            + (f"  peak traced {result['peak_traced_mb']} MB" if 'peak_traced_mb' in result else '')
+        )
+        if 'queries_per_request' in result:
+            self.stdout.write(f"  DB queries/request {result['queries_per_request']}  "
+                              f"DB connections/request {result['connections_per_request']}")
+        if 'first_event' in result:
+            self.stdout.write(f"  first event p50 {result['first_event']['p50']:.3f}s  "
+                              f"p95 {result['first_event']['p95']:.3f}s")
+        for stage, timings in result.get('stages', {}).items():
+            self.stdout.write(f"    {stage:<28} p50 {timings['p50']:.3f}s  p95 {timings['p95']:.3f}s")
+
+    def _report_comparison(self, rows):
+        if not rows:
+            self.stdout.write('No scenarios in common with the baseline')
+            return 0
+        self.stdout.write('Compared with the baseline:')
+        regressions = 0
+        for name, metric, old, new, change, regressed in rows:
+            line = f"  {name:<28} {metric:<18} {old:>10} -> {new:<10} {change:+.1%}"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + '  REGRESSION'))
+            else:
+                self.stdout.write(line)
+        return regressions
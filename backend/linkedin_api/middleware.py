@@ -0,0 +1,80 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.utils.decorators import sync_and_async_middleware
+from .utils import tracing
+
+def _begin(request):
+    """Start the request's trace under a server-generated ID.
+
+    A client's X-Trace-Id is only recorded as ``client_trace_id``, so clients
+    cannot choose or collide with trace IDs; X-Trace-Sample is ignored unless
+    TRACE_ALLOW_CLIENT_SAMPLING is on, so they cannot force traces to be written.
+    """
+    attributes = {'method': request.method, 'path': request.path}
+    client_trace_id = request.headers.get('X-Trace-Id')
+    if tracing.is_trace_id(client_trace_id):
+        attributes['client_trace_id'] = client_trace_id
+    sampled = None
+    if settings.TRACE_ALLOW_CLIENT_SAMPLING and request.headers.get('X-Trace-Sample') == '1':
+        sampled = True
+    return tracing.begin_trace(f"{request.method} {request.path}", sampled=sampled, **attributes)
+
+def _finish(root, response):
+    """Tag the response with the trace ID and end the trace, or hand it to the streaming body"""
+    if root is None:
+        return response
+    response['X-Trace-Id'] = root.trace.trace_id
+    root.set(status_code=response.status_code)
+    if response.status_code >= 500:
+        root.trace.failed = True
+
+    if response.streaming:
+        if response.is_async:
+            response.streaming_content = tracing.atraced_stream(response.streaming_content, root)
+        else:
+            response.streaming_content = tracing.traced_stream(response.streaming_content, root)
+    else:
+        tracing.end_trace(root)
+    return response
+
+@sync_and_async_middleware
+def TracingMiddleware(get_response):
+    """Give every request a trace (``X-Trace-Id``) and make it the parent of the spans it records"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            root = _begin(request)
+            with tracing.activate(root):
+                response = await get_response(request)
+            return _finish(root, response)
+    else:
+        def middleware(request):
+            root = _begin(request)
+            with tracing.activate(root):
+                response = get_response(request)
+            return _finish(root, response)
+    return middleware
+
+def is_sessionless(request):
+    return any(request.path.startswith(prefix) for prefix in settings.SESSIONLESS_PATH_PREFIXES)
+
+class ApiSessionMiddleware(SessionMiddleware):
+    """SessionMiddleware that leaves the session alone on SESSIONLESS_PATH_PREFIXES.
+
+    API clients send their key with each request and never use the session,
+    so loading it (a database read) and saving it on every request (a write
+    that serializes SQLite) is pure overhead there. Those requests get an empty
+    session that is never read from the cookie or saved; other routes, such as
+    the admin, behave exactly as with SessionMiddleware.
+    """
+
+    def process_request(self, request):
+        if is_sessionless(request):
+            request.session = self.SessionStore()
+            return
+        super().process_request(request)
+
+    def process_response(self, request, response):
+        if is_sessionless(request):
+            return response
+        return super().process_response(request, response)
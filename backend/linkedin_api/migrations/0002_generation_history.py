@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:28
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linkedin_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Generation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('api_key_hash', models.CharField(max_length=64)),
+                ('cv_hash', models.CharField(max_length=64)),
+                ('cv_text', models.TextField()),
+                ('cv_analysis', models.JSONField(default=dict)),
+                ('skills_analysis', models.JSONField(blank=True, default=dict)),
+                ('content_ideas', models.JSONField(blank=True, default=dict)),
+                ('industry_trends', models.TextField(blank=True)),
+                ('news', models.JSONField(blank=True, default=list)),
+                ('content_calendar', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['api_key_hash', 'cv_hash', '-created_at'], name='linkedin_ap_api_key_a188b3_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GeneratedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_type', models.CharField(max_length=32)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(default='success', max_length=16)),
+                ('content', models.TextField()),
+                ('engagement_suggestions', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('generation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_versions', to='linkedin_api.generation')),
+            ],
+            options={
+                'ordering': ['post_type', '-version'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='generatedpost',
+            constraint=models.UniqueConstraint(fields=('generation', 'post_type', 'version'), name='unique_post_version'),
+        ),
+    ]
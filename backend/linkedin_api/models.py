@@ -0,0 +1,85 @@
+import uuid
+from django.db import models
+
+class GenerationJob(models.Model):
+    """A generate-posts run executed by the background worker pool"""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Only a hash is stored; the key itself is held in worker memory while the job runs
+    api_key_hash = models.CharField(max_length=64, db_index=True)
+    cv_text = models.TextField()
+    options = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    # Sections are added as their stages finish, so this holds partial results while running
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"GenerationJob {self.id} ({self.status})"
+
+class Generation(models.Model):
+    """The stored output of one generate-posts run, so single sections can be regenerated later"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    api_key_hash = models.CharField(max_length=64)
+    cv_hash = models.CharField(max_length=64)
+    # Kept because regenerated posts are written from the CV as well as its analysis
+    cv_text = models.TextField()
+    cv_analysis = models.JSONField(default=dict)
+    skills_analysis = models.JSONField(default=dict, blank=True)
+    content_ideas = models.JSONField(default=dict, blank=True)
+    industry_trends = models.TextField(blank=True)
+    news = models.JSONField(default=list, blank=True)
+    content_calendar = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['api_key_hash', 'cv_hash', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Generation {self.id}"
+
+class GeneratedPost(models.Model):
+    """One version of a post; the highest version per type is the current one"""
+
+    generation = models.ForeignKey(Generation, related_name='post_versions', on_delete=models.CASCADE)
+    post_type = models.CharField(max_length=32)
+    version = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=16, default='success')
+    content = models.TextField()
+    engagement_suggestions = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['post_type', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['generation', 'post_type', 'version'], name='unique_post_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_type} v{self.version} of {self.generation_id}"
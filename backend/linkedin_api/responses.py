@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from .utils import metrics
+
+try:
+    import brotli
+except ImportError:  # Optional; responses fall back to gzip without it
+    brotli = None
+
+# JSON responses for the generation endpoints: an ETag for revalidation, 304 for
+# a GET whose If-None-Match still matches, and a body compressed with the best
+# encoding the client accepts (br when the brotli package is installed, else
+# gzip). Responses under RESPONSE_COMPRESSION_MIN_BYTES are sent as they are.
+
+def _accepted_encodings(request):
+    """Encodings from Accept-Encoding with a non-zero quality"""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def _matches(request, etag):
+    """Weak comparison of ``etag`` against If-None-Match"""
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in parse_etags(if_none_match))
+
+def choose_encoding(request, size):
+    """The Content-Encoding to use for a body of ``size`` bytes, or None to send it uncompressed"""
+    if not settings.RESPONSE_COMPRESSION_ENABLED or size < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+        return None
+    accepted = _accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL, mtime=0)
+
+def json_response(request, data, status=200):
+    """A JSON HttpResponse with an ETag and negotiated compression.
+
+    The ETag is a hash of the uncompressed body, so it is weak: every encoding
+    of the same data shares it. Only GET and HEAD are answered with 304, since
+    a POST has already done its work by the time the body is known.
+    """
+    body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+    etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    if status == 200 and request.method in ('GET', 'HEAD') and _matches(request, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    encoding = choose_encoding(request, len(body))
+    metrics.RESPONSE_BYTES.inc(len(body), encoding=encoding or 'identity', stage='uncompressed')
+    if encoding:
+        body = compress(body, encoding)
+    metrics.RESPONSE_BYTES.inc(len(body), encoding=encoding or 'identity', stage='sent')
+
+    response = HttpResponse(body, status=status, content_type='application/json')
+    response['ETag'] = etag
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(len(body))
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
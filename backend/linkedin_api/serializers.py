@@ -0,0 +1,126 @@
+# Response shapes shared by the full generate-posts response and the streamed events
+
+def serialize_post(post):
+    formatted_post = {
+        'type': post['type'],
+        'content': post['content'],
+        'status': post['status'],
+    }
+    if post['status'] == 'success':
+        # Keep engagement_suggestions as string for frontend rendering
+        formatted_post.update({
+            'engagement_suggestions': post.get('engagement_suggestions', ''),
+            'industry_trends': post.get('industry_trends', ''),
+            'skills_analysis': post.get('skills_analysis', {}),
+            'related_news': post.get('related_news', []),
+        })
+    return formatted_post
+
+def serialize_cv_analysis(cv_analysis):
+    # Format CV analysis to match frontend expectations
+    return {
+        'key_areas_of_expertise': cv_analysis.get('key_areas_of_expertise', []),
+        'industry_focus': cv_analysis.get('industry_focus', ''),
+        'notable_achievements': cv_analysis.get('notable_achievements', ''),  # Keep as string
+        'technical_skills': cv_analysis.get('technical_skills', []),
+        'soft_skills': cv_analysis.get('soft_skills', []),
+        'career_level': cv_analysis.get('career_level', ''),
+        'content_topics': cv_analysis.get('content_topics', [])
+    }
+
+def serialize_content_ideas(content_ideas):
+    # Format content ideas as object with numbered keys
+    formatted_content_ideas = {}
+    if isinstance(content_ideas, dict):
+        for key, idea in content_ideas.items():
+            formatted_content_ideas[key] = {
+                'title': idea.get('title', ''),
+                'angle': idea.get('angle', ''),
+                'key_points': idea.get('key_points', [])
+            }
+    return formatted_content_ideas
+
+def serialize_industry_trends(industry_trends):
+    # Keep industry_trends as string for frontend rendering
+    return industry_trends if isinstance(industry_trends, str) else ''
+
+def serialize_news(news_results):
+    # Format news to match frontend display
+    formatted_news = []
+    for news_item in news_results or []:
+        formatted_news.append({
+            'title': news_item.get('title', ''),
+            'link': news_item.get('link', ''),
+            'published': news_item.get('published', '')
+        })
+    return formatted_news
+
+def serialize_generation(cv_analysis, content_ideas, posts, industry_trends, content_calendar, news_results):
+    # Direct response structure to match frontend expectations
+    return {
+        'status': 'success',
+        'cv_analysis': serialize_cv_analysis(cv_analysis),
+        'content_ideas': serialize_content_ideas(content_ideas),
+        'posts': [serialize_post(post) for post in posts],
+        'industry_trends': serialize_industry_trends(industry_trends),
+        'content_calendar': content_calendar,
+        'news': serialize_news(news_results),
+        'skills_analysis': posts[0].get('skills_analysis', {}) if posts else {}
+    }
+
+# Post field -> the top-level section of the generate-posts response it copies
+SHARED_POST_SECTIONS = {
+    'industry_trends': ('industry_trends', serialize_industry_trends),
+    'skills_analysis': ('skills_analysis', lambda value: value),
+    'related_news': ('news', serialize_news),
+}
+
+def compact_generation(data):
+    """The compact generate-posts shape: sections every post repeats are sent once, at the top level.
+
+    A post keeps its own copy of a section only when it differs from the shared one.
+    """
+    if not isinstance(data, dict) or not data.get('posts'):
+        return data
+    posts = []
+    for post in data['posts']:
+        posts.append({
+            key: value for key, value in post.items()
+            if key not in SHARED_POST_SECTIONS
+            or SHARED_POST_SECTIONS[key][1](value) != data.get(SHARED_POST_SECTIONS[key][0])
+        })
+    return dict(data, format='compact', posts=posts)
+
+def serialize_job(job, compact=False):
+    return {
+        'job_id': str(job.id),
+        'status': job.status,
+        'result': compact_generation(job.result) if compact else job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def serialize_stored_generation(generation, posts):
+    """A stored generation in the generate-posts response shape; ``posts`` are ``(post entry, version)`` pairs"""
+    data = serialize_generation(
+        generation.cv_analysis,
+        generation.content_ideas,
+        [entry for entry, _ in posts],
+        generation.industry_trends,
+        generation.content_calendar,
+        generation.news
+    )
+    data['posts'] = [dict(serialize_post(entry), version=version) for entry, version in posts]
+    data.update(serialize_generation_summary(generation))
+    return data
+
+def serialize_generation_summary(generation):
+    return {
+        'generation_id': str(generation.id),
+        'cv_hash': generation.cv_hash,
+        'industry_focus': generation.cv_analysis.get('industry_focus', ''),
+        'created_at': generation.created_at.isoformat(),
+        'updated_at': generation.updated_at.isoformat(),
+    }
@@ -0,0 +1,174 @@
+import asyncio
+import contextvars
+import json
+import logging
+import queue
+import threading
+from asgiref.sync import sync_to_async
+from django.db import connection
+from .serializers import (
+    serialize_content_ideas,
+    serialize_cv_analysis,
+    serialize_industry_trends,
+    serialize_news,
+    serialize_post,
+)
+from .utils.history import save_generation
+from .utils.pipeline import format_post, run_generation, run_generation_async
+from .utils.result_cache import cache_bypassed
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+
+def stream_format_for(request):
+    """Pick SSE or NDJSON from ``?format=`` or the Accept header"""
+    requested = request.GET.get('format')
+    if requested in CONTENT_TYPES:
+        return requested
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        return 'sse'
+    return 'ndjson'
+
+def encode_event(event, data, stream_format):
+    if stream_format == 'sse':
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({'event': event, 'data': data}) + "\n"
+
+def stage_event(name, result, error):
+    """Map a finished pipeline stage to the ``(event, data)`` sent to the client.
+
+    Payloads use the same shapes as the sections of the full generate-posts
+    response. Returns None for internal stages.
+    """
+    if name == 'cv_profile':
+        # Its sections are sent by the cv_analysis and skills_analysis stages
+        return ('error', {'error': 'Failed to analyze CV'}) if error else None
+    if name == 'cv_analysis':
+        if error:
+            return 'error', {'error': 'Failed to analyze CV'}
+        return 'cv_analysis', serialize_cv_analysis(result)
+    if name == 'content_ideas':
+        if error:
+            return 'error', {'error': 'Failed to generate content ideas'}
+        return 'content_ideas', serialize_content_ideas(result)
+    if name == 'industry_trends':
+        return 'industry_trends', serialize_industry_trends(result)
+    if name == 'news':
+        return 'news', serialize_news(result)
+    if name == 'content_calendar':
+        return 'content_calendar', result
+    if name == 'skills_analysis':
+        return 'skills_analysis', result or {}
+    if name.startswith('post:'):
+        post_type = name.split(':', 1)[1]
+        post_data = f"Error generating {post_type} post. Please try again." if error else result
+        return 'post', serialize_post(format_post(post_type, post_data))
+    return None
+
+def post_delta_event(post_type, phase, text):
+    """Partial post text; 'base' deltas are the draft, 'enhanced' deltas the final wording"""
+    return 'post_delta', {'type': post_type, 'phase': phase, 'delta': text}
+
+def done_event(generation, stored=None):
+    succeeded = generation['cv_analysis'] and generation['content_ideas']
+    data = {'status': 'success' if succeeded else 'error'}
+    if stored:
+        data['generation_id'] = str(stored.id)
+    return 'done', data
+
+def stream_generation(cv_text, api_key, stream_format='ndjson', no_cache=False, stream_tokens=False, multi_post=None):
+    """Run the pipeline on a background thread and yield encoded events as stages finish.
+
+    With ``stream_tokens`` the post text is also sent as ``post_delta`` events
+    while it is generated; the final ``post`` event still carries the full post.
+    When the client goes away (the generator is closed) no further stages start.
+    """
+    events = queue.Queue()
+    cancel_event = threading.Event()
+
+    def on_post_delta(post_type, phase, text):
+        events.put(post_delta_event(post_type, phase, text))
+
+    def on_stage_done(name, result, error):
+        event = stage_event(name, result, error)
+        if event:
+            events.put(event)
+
+    def run():
+        try:
+            with cache_bypassed(no_cache):
+                generation = run_generation(
+                    cv_text,
+                    api_key,
+                    on_stage_done=on_stage_done,
+                    on_post_delta=on_post_delta if stream_tokens else None,
+                    cancel_event=cancel_event,
+                    multi_post=multi_post
+                )
+            if cancel_event.is_set():
+                return  # Nobody is listening, and the generation is incomplete
+            events.put(done_event(generation, save_generation(cv_text, api_key, generation)))
+        except Exception as e:
+            logger.exception("Error in stream_generation")
+            events.put(('error', {'error': str(e), 'details': 'An unexpected error occurred'}))
+        finally:
+            events.put(None)
+            connection.close()  # Opened by this thread to store the generation
+
+    # Copy the context so the pipeline's spans join the request's trace
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+
+    try:
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield encode_event(*event, stream_format)
+    finally:
+        cancel_event.set()
+
+async def astream_generation(cv_text, api_key, stream_format='ndjson', no_cache=False, stream_tokens=False,
+                             multi_post=None):
+    """Async version of stream_generation; the pipeline is cancelled if the client goes away"""
+    events = asyncio.Queue()
+
+    def on_post_delta(post_type, phase, text):
+        events.put_nowait(post_delta_event(post_type, phase, text))
+
+    def on_stage_done(name, result, error):
+        event = stage_event(name, result, error)
+        if event:
+            events.put_nowait(event)
+
+    async def run():
+        try:
+            with cache_bypassed(no_cache):
+                generation = await run_generation_async(
+                    cv_text,
+                    api_key,
+                    on_stage_done=on_stage_done,
+                    on_post_delta=on_post_delta if stream_tokens else None,
+                    multi_post=multi_post
+                )
+            stored = await sync_to_async(save_generation)(cv_text, api_key, generation)
+            events.put_nowait(done_event(generation, stored))
+        except Exception as e:
+            logger.exception("Error in astream_generation")
+            events.put_nowait(('error', {'error': str(e), 'details': 'An unexpected error occurred'}))
+        finally:
+            events.put_nowait(None)
+
+    task = asyncio.ensure_future(run())
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                return
+            yield encode_event(*event, stream_format)
+    finally:
+        if not task.done():
+            task.cancel()
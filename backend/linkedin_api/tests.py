@@ -1,3 +1,2099 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import tempfile
+import threading
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+import httpx
+import openai
+from asgiref.sync import async_to_sync
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from . import batch, streaming, views
+from .middleware import ApiSessionMiddleware, TracingMiddleware
+from .batch import BatchUploadError, collect_batch_uploads, stream_batch
+from .benchmarks.fake_openai import FakeOpenAIServer, LatencyModel, ServerConfig
+from .benchmarks.runner import Scenario, benchmark_settings, run_scenario
+from .models import GeneratedPost, Generation, GenerationJob
+from .responses import json_response
+from .serializers import compact_generation
+from .streaming import astream_generation, encode_event, stream_generation
+from .utils import (
+    cassettes, client_registry, history, jobs, metrics, news, openai_helper, openai_helper_async, pdf_extraction, pipeline, prompt_budget, rate_limiter,
+    result_cache, tracing, warmer
+)
+from .utils.cv_profile import CVProfileError, parse_cv_profile
+from .utils.multi_post import parse_base_posts, parse_enhanced_posts
+from .utils.pdf_extraction import PDFExtractionError, extract_cv_text, extract_uploaded_cv
+from .utils.pipeline import Stage, StageCancelled, StageSkipped, run_stages
+from .utils.prompt_budget import budget_items, count_tokens, normalize_cv_text, truncate_to_budget
+from .utils.rate_limiter import CallScheduler, KeyLimiter, TokenBucket, parse_duration
+from .utils.result_cache import DjangoCacheBackend, MemoryBackend, ResultCache, cache_bypassed, cache_key
+from .utils.similarity import SimilarityIndex
+from .utils.single_flight import SingleFlight
 
-# Create your tests here.
+CV_PROFILE_ANSWER = {
+    'analysis': {
+        'key_areas_of_expertise': ['Payments', 'Risk'],
+        'industry_focus': 'Fintech',
+        'notable_achievements': ['Cut fraud losses by 30%'],
+        'technical_skills': ['Python'],
+        'soft_skills': ['Mentoring'],
+        'career_level': 'senior',
+        'content_topics': ['Open banking'],
+    },
+    'skills': {
+        'technical_skills': [{'name': 'Python', 'proficiency': 'Expert'}],
+        'soft_skills': [{'name': 'Mentoring', 'strength': 'Strong'}],
+        'domain_knowledge': [{'name': 'Payments', 'experience': 'Deep'}],
+        'tools_and_technologies': [{'name': 'Django', 'expertise': 'Proficient'}],
+        'certifications': [],
+    },
+}
+CV_PROFILE = parse_cv_profile(json.dumps(CV_PROFILE_ANSWER))
+CV_ANALYSIS = CV_PROFILE.analysis.to_dict()
+SKILLS_ANALYSIS = CV_PROFILE.skills.to_dict()
+
+class AnalysisContextTests(SimpleTestCase):
+    def setUp(self):
+        patchers = {
+            'analyze_cv_profile': mock.patch.object(openai_helper, 'analyze_cv_profile', return_value=CV_PROFILE),
+            'generate_content_ideas': mock.patch.object(openai_helper, 'generate_content_ideas', return_value='ideas'),
+            'analyze_industry_trends': mock.patch.object(openai_helper, 'analyze_industry_trends', return_value='trends'),
+            'search_news': mock.patch.object(openai_helper, 'search_news', return_value=[{'title': 'News'}]),
+        }
+        self.mocks = {name: patcher.start() for name, patcher in patchers.items()}
+        for patcher in patchers.values():
+            self.addCleanup(patcher.stop)
+
+    def test_runs_each_analysis_once(self):
+        context = openai_helper.build_analysis_context('cv', 'sk-test')
+        self.assertEqual(context.cv_analysis, CV_ANALYSIS)
+        self.assertEqual(context.skills_analysis, SKILLS_ANALYSIS)
+        self.assertEqual(context.content_ideas, 'ideas')
+        self.assertEqual(context.industry_trends, 'trends')
+        self.assertEqual(context.news_results, [{'title': 'News'}])
+        for function in self.mocks.values():
+            function.assert_called_once()
+        self.mocks['analyze_industry_trends'].assert_called_once_with('Fintech', 'Payments, Risk', 'sk-test')
+        self.mocks['search_news'].assert_called_once_with('Fintech Payments Risk')
+
+    def test_reuses_a_given_cv_analysis(self):
+        context = openai_helper.build_analysis_context('cv', 'sk-test', cv_analysis={'industry_focus': 'Retail'})
+        self.assertEqual(context.cv_analysis, {'industry_focus': 'Retail'})
+        self.assertEqual(context.skills_analysis, SKILLS_ANALYSIS)
+
+    def test_returns_none_when_the_cv_analysis_fails(self):
+        self.mocks['analyze_cv_profile'].return_value = None
+        self.assertIsNone(openai_helper.build_analysis_context('cv', 'sk-test'))
+        self.mocks['generate_content_ideas'].assert_not_called()
+
+class RunStagesTests(SimpleTestCase):
+    def test_runs_stages_with_their_dependencies(self):
+        stages = [
+            Stage('a', lambda deps: 1),
+            Stage('b', lambda deps: deps['a'] + 1, depends_on=['a']),
+            Stage('c', lambda deps: deps['a'] + deps['b'], depends_on=['a', 'b']),
+        ]
+        results, errors = run_stages(stages, max_workers=2)
+        self.assertEqual(results, {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(errors, {})
+
+    def test_runs_independent_stages_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        stages = [Stage(name, lambda deps: barrier.wait() is not None) for name in ('a', 'b')]
+        results, errors = run_stages(stages, max_workers=2)
+        self.assertEqual(results, {'a': True, 'b': True})
+        self.assertEqual(errors, {})
+
+    def test_skips_stages_whose_dependency_failed(self):
+        ran = []
+
+        def fail(deps):
+            raise ValueError('boom')
+
+        stages = [
+            Stage('analysis', fail),
+            Stage('ideas', lambda deps: ran.append('ideas'), depends_on=['analysis']),
+            Stage('posts', lambda deps: ran.append('posts'), depends_on=['ideas']),
+            Stage('news', lambda deps: 'news'),
+        ]
+        results, errors = run_stages(stages, max_workers=2)
+
+        self.assertEqual(results, {'news': 'news'})
+        self.assertIsInstance(errors['analysis'], ValueError)
+        self.assertIsInstance(errors['ideas'], StageSkipped)
+        self.assertIsInstance(errors['posts'], StageSkipped)
+        self.assertEqual(ran, [])
+
+    def test_cancel_stops_further_stages(self):
+        cancel_event = threading.Event()
+        ran = []
+
+        def first(deps):
+            ran.append('first')
+            cancel_event.set()
+            return 'done'
+
+        stages = [
+            Stage('first', first),
+            Stage('second', lambda deps: ran.append('second'), depends_on=['first']),
+            Stage('third', lambda deps: ran.append('third'), depends_on=['second']),
+        ]
+        results, errors = run_stages(stages, max_workers=1, cancel_event=cancel_event)
+
+        self.assertEqual(ran, ['first'])
+        self.assertEqual(results, {'first': 'done'})
+        self.assertIsInstance(errors['second'], StageCancelled)
+        self.assertIsInstance(errors['third'], StageCancelled)
+
+    def test_reports_each_stage_that_ran(self):
+        def fail(deps):
+            raise ValueError('boom')
+
+        done = []
+        stages = [Stage('a', fail), Stage('b', lambda deps: 1, depends_on=['a']), Stage('c', lambda deps: 2)]
+        run_stages(stages, max_workers=2, on_stage_done=lambda *args: done.append(args))
+        self.assertCountEqual([(name, result, type(error)) for name, result, error in done],
+                              [('a', None, ValueError), ('c', 2, type(None))])
+
+    def test_rejects_unknown_dependencies_and_cycles(self):
+        with self.assertRaises(ValueError):
+            run_stages([Stage('a', lambda deps: 1, depends_on=['missing'])], max_workers=1)
+        stages = [
+            Stage('a', lambda deps: 1, depends_on=['b']),
+            Stage('b', lambda deps: 1, depends_on=['a']),
+        ]
+        with self.assertRaises(ValueError):
+            run_stages(stages, max_workers=1)
+
+HELPER_RESULTS = {
+    'analyze_cv_profile': CV_PROFILE,
+    'generate_content_ideas': 'ideas',
+    'analyze_industry_trends': 'trends',
+    'search_news': [],
+    'generate_content_calendar': 'calendar',
+    'generate_linkedin_content': {'content': 'post'},
+}
+
+def patch_helpers(test, helpers, **overrides):
+    """Replace the model-calling helpers of ``helpers``; patch picks AsyncMock for async ones"""
+    mocks = {}
+    for name, result in {**HELPER_RESULTS, **overrides}.items():
+        patcher = mock.patch.object(helpers, name, return_value=result)
+        mocks[name] = patcher.start()
+        test.addCleanup(patcher.stop)
+    return mocks
+
+class RunGenerationTests(SimpleTestCase):
+    def test_generates_every_post_from_one_analysis(self):
+        mocks = patch_helpers(self, openai_helper)
+        generation = pipeline.run_generation('cv', 'sk-test', max_workers=4)
+        self.assertEqual(generation['cv_analysis'], CV_ANALYSIS)
+        self.assertEqual(generation['content_calendar'], 'calendar')
+        self.assertEqual([post['status'] for post in generation['posts']], ['success'] * len(pipeline.POST_TYPES))
+        mocks['analyze_cv_profile'].assert_called_once()
+
+    def test_failed_analysis_fails_every_post(self):
+        mocks = patch_helpers(self, openai_helper, analyze_cv_profile=None)
+        generation = pipeline.run_generation('cv', 'sk-test', max_workers=4)
+        self.assertIsNone(generation['cv_analysis'])
+        self.assertEqual([post['status'] for post in generation['posts']], ['error'] * len(pipeline.POST_TYPES))
+        mocks['generate_linkedin_content'].assert_not_called()
+
+    def test_async_runner_matches_the_sync_one(self):
+        patch_helpers(self, openai_helper)
+        mocks = patch_helpers(self, openai_helper_async)
+        generation = async_to_sync(pipeline.run_generation_async)('cv', 'sk-test', max_concurrency=4)
+        self.assertEqual(generation, pipeline.run_generation('cv', 'sk-test', max_workers=4))
+        mocks['analyze_cv_profile'].assert_awaited_once()
+
+class RunStagesAsyncTests(SimpleTestCase):
+    def test_caps_concurrency_per_request(self):
+        running = 0
+        peak = 0
+
+        async def work(deps):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return 'done'
+
+        stages = [Stage(f's{i}', work) for i in range(6)]
+        results, errors = async_to_sync(pipeline.run_stages_async)(stages, max_concurrency=2)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(errors, {})
+        self.assertEqual(peak, 2)
+
+    def test_skips_stages_whose_dependency_failed(self):
+        async def fail(deps):
+            raise ValueError('boom')
+
+        stages = [Stage('a', fail), Stage('b', lambda deps: 'b', depends_on=['a'])]
+        results, errors = async_to_sync(pipeline.run_stages_async)(stages, max_concurrency=2)
+        self.assertEqual(results, {})
+        self.assertIsInstance(errors['b'], StageSkipped)
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class ClientRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(client_registry.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = client_registry.ClientRegistry(lambda api_key: SimpleNamespace(api_key=api_key), max_size=2, ttl=60)
+
+    def test_reuses_the_client_of_a_key(self):
+        first = self.registry.get('sk-a')
+        self.assertIs(self.registry.get('sk-a'), first)
+        self.assertIsNot(self.registry.get('sk-b'), first)
+        stats = self.registry.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 2, 2))
+
+    def test_scopes_partition_the_cache(self):
+        self.assertIsNot(self.registry.get('sk-a', scope=1), self.registry.get('sk-a', scope=2))
+
+    def test_idle_clients_expire(self):
+        first = self.registry.get('sk-a')
+        self.clock.now += 59
+        self.assertIs(self.registry.get('sk-a'), first)
+        self.clock.now += 60
+        self.assertIsNot(self.registry.get('sk-a'), first)
+        self.assertEqual(self.registry.stats()['evictions'], 1)
+
+    def test_evicts_the_least_recently_used_client(self):
+        a = self.registry.get('sk-a')
+        b = self.registry.get('sk-b')
+        self.registry.get('sk-a')
+        self.registry.get('sk-c')
+        self.assertIs(self.registry.get('sk-a'), a)
+        self.assertIsNot(self.registry.get('sk-b'), b)
+        self.assertEqual(self.registry.stats()['size'], 2)
+
+    def test_discard_drops_matching_scopes(self):
+        kept = self.registry.get('sk-a', scope=1)
+        dropped = self.registry.get('sk-a', scope=2)
+        self.registry.discard(lambda scope: scope == 2)
+        self.assertIs(self.registry.get('sk-a', scope=1), kept)
+        self.assertIsNot(self.registry.get('sk-a', scope=2), dropped)
+
+    def test_evicted_clients_are_handed_to_on_evict(self):
+        evicted = []
+        registry = client_registry.ClientRegistry(
+            lambda api_key: SimpleNamespace(api_key=api_key), max_size=1, ttl=60,
+            on_evict=lambda scope, client: evicted.append((scope, client.api_key))
+        )
+        registry.get('sk-a', scope=1)
+        registry.get('sk-b', scope=1)  # LRU
+        self.clock.now += 60
+        registry.get('sk-c', scope=2)  # sk-b expired
+        registry.discard(lambda scope: scope == 2)
+        registry.get('sk-d')
+        registry.clear()
+        self.assertEqual(evicted, [(1, 'sk-a'), (1, 'sk-b'), (2, 'sk-c'), (None, 'sk-d')])
+
+    def test_async_clients_are_cached_per_event_loop(self):
+        async def get():
+            return client_registry.get_pooled_async_client('sk-test'), client_registry.get_pooled_async_client('sk-test')
+
+        evicted = []
+        registry = client_registry.ClientRegistry(
+            lambda api_key: SimpleNamespace(api_key=api_key), max_size=4, ttl=60,
+            on_evict=lambda scope, client: evicted.append((scope.is_closed(), client))
+        )
+        with mock.patch.object(client_registry, 'async_client_registry', registry), \
+                mock.patch.object(client_registry, '_loops', set()):
+            first, again = asyncio.run(get())
+            second, _ = asyncio.run(get())
+        self.assertIs(first, again)
+        self.assertIsNot(first, second)
+        # The first loop's client was dropped once that loop had closed
+        self.assertEqual(evicted, [(True, first)])
+
+    @override_settings(OPENAI_CLIENT_CLOSE_DELAY=0)
+    def test_evicted_async_clients_are_closed_on_their_own_loop(self):
+        closed_on = []
+
+        async def evict():
+            loop = asyncio.get_running_loop()
+            closed = asyncio.Event()
+
+            class Client:
+                async def close(self):
+                    closed_on.append(asyncio.get_running_loop())
+                    closed.set()
+
+            # Evictions can happen on any thread
+            await asyncio.to_thread(client_registry._close_async_client, loop, Client())
+            await closed.wait()
+            return loop
+
+        loop = asyncio.run(evict())
+        self.assertEqual(closed_on, [loop])
+        client_registry._close_async_client(loop, mock.Mock())  # Closed loop: nothing to do
+        self.assertEqual(closed_on, [loop])
+
+def fake_client(create):
+    """A stand-in OpenAI client whose completions (raw or not) are served by ``create``"""
+    def raw_create(**request):
+        response = create(**request)
+        return SimpleNamespace(headers={}, parse=lambda: response)
+
+    completions = SimpleNamespace(create=create, with_raw_response=SimpleNamespace(create=raw_create))
+    return SimpleNamespace(api_key='sk-test', chat=SimpleNamespace(completions=completions))
+
+def completion_client(*contents):
+    """A stand-in OpenAI client whose chat completions return ``contents`` in turn"""
+    responses = [SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=c))]) for c in contents]
+    return fake_client(mock.Mock(side_effect=responses))
+
+REQUEST = {'model': 'gpt-4o', 'messages': [{'role': 'user', 'content': 'Analyze this CV'}], 'temperature': 0.7}
+
+class CacheKeyTests(SimpleTestCase):
+    def test_depends_on_model_prompt_and_parameters(self):
+        key = cache_key('cv_analysis', REQUEST)
+        self.assertEqual(key, cache_key('cv_analysis', dict(reversed(list(REQUEST.items())))))
+        self.assertNotEqual(key, cache_key('cv_analysis', {**REQUEST, 'model': 'gpt-4o-mini'}))
+        self.assertNotEqual(key, cache_key('cv_analysis', {**REQUEST, 'messages': [{'role': 'user', 'content': 'Other CV'}]}))
+        self.assertNotEqual(key, cache_key('cv_analysis', {**REQUEST, 'temperature': 0.2}))
+        self.assertNotEqual(key, cache_key('skills', REQUEST))
+
+    def test_depends_on_prompt_version(self):
+        key = cache_key('cv_analysis', REQUEST)
+        with mock.patch.object(result_cache, 'PROMPT_VERSION', result_cache.PROMPT_VERSION + 1):
+            self.assertNotEqual(cache_key('cv_analysis', REQUEST), key)
+
+@override_settings(RESULT_CACHE_ENABLED=True)
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ResultCache(MemoryBackend(max_entries=10, ttl=60))
+
+    def test_serves_stored_results(self):
+        self.assertIsNone(self.cache.get('cv_analysis', REQUEST))
+        self.cache.set('cv_analysis', REQUEST, 'analysis')
+        self.assertEqual(self.cache.get('cv_analysis', REQUEST), 'analysis')
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_bypass_skips_reads_but_refreshes_entries(self):
+        self.cache.set('cv_analysis', REQUEST, 'old')
+        with cache_bypassed():
+            self.assertIsNone(self.cache.get('cv_analysis', REQUEST))
+            self.cache.set('cv_analysis', REQUEST, 'new')
+        self.assertEqual(self.cache.get('cv_analysis', REQUEST), 'new')
+
+    def test_bypass_reaches_pipeline_stages(self):
+        self.cache.set('cv_analysis', REQUEST, 'analysis')
+        stages = [Stage('read', lambda deps: self.cache.get('cv_analysis', REQUEST))]
+        with cache_bypassed():
+            self.assertEqual(run_stages(stages, max_workers=1)[0], {'read': None})
+        self.assertEqual(run_stages(stages, max_workers=1)[0], {'read': 'analysis'})
+
+    @override_settings(RESULT_CACHE_ENABLED=False)
+    def test_disabled_cache_stores_nothing(self):
+        self.cache.set('cv_analysis', REQUEST, 'analysis')
+        self.assertIsNone(self.cache.get('cv_analysis', REQUEST))
+
+    def test_completions_are_served_from_the_cache(self):
+        client = completion_client('first', 'second')
+        with mock.patch.object(openai_helper, 'result_cache', self.cache):
+            self.assertEqual(openai_helper._cached_completion(client, REQUEST, 'cv_analysis'), 'first')
+            self.assertEqual(openai_helper._cached_completion(client, REQUEST, 'cv_analysis'), 'first')
+            with cache_bypassed():
+                self.assertEqual(openai_helper._cached_completion(client, REQUEST, 'cv_analysis'), 'second')
+        self.assertEqual(client.chat.completions.create.call_count, 2)
+
+class CacheBackendTests(SimpleTestCase):
+    def test_memory_backend_expires_and_evicts(self):
+        clock = FakeClock()
+        backend = MemoryBackend(max_entries=2, ttl=60)
+        with mock.patch.object(result_cache.time, 'monotonic', clock):
+            backend.set('a', 1)
+            backend.set('b', 2)
+            backend.get('a')
+            backend.set('c', 3)
+            self.assertIsNone(backend.get('b'))
+            self.assertEqual(backend.get('a'), 1)
+            clock.now += 60
+            self.assertIsNone(backend.get('a'))
+
+    @override_settings(CACHES={'results': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}})
+    def test_django_backend_uses_the_ttl(self):
+        clock = FakeClock(now=1_700_000_000.0)
+        with mock.patch('time.time', clock):
+            backend = DjangoCacheBackend('results', ttl=60)
+            backend.set('key', 'value')
+            clock.now += 59
+            self.assertEqual(backend.get('key'), 'value')
+            clock.now += 2
+            self.assertIsNone(backend.get('key'))
+
+def ndjson_events(chunks):
+    return [json.loads(chunk) for chunk in chunks]
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+@override_settings(GENERATION_HISTORY_ENABLED=False)
+class StreamGenerationTests(SimpleTestCase):
+    def assert_complete_stream(self, events):
+        names = [event['event'] for event in events]
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(events[-1]['data'], {'status': 'success'})
+        self.assertEqual(names.count('post'), len(pipeline.POST_TYPES))
+        for name in ('cv_analysis', 'skills_analysis', 'content_ideas', 'industry_trends', 'news', 'content_calendar'):
+            self.assertEqual(names.count(name), 1, name)
+        # Dependent sections never arrive before the analysis they are built from
+        self.assertLess(names.index('cv_analysis'), names.index('content_ideas'))
+        self.assertLess(names.index('cv_analysis'), names.index('post'))
+
+    def test_streams_each_section_then_done(self):
+        patch_helpers(self, openai_helper)
+        events = ndjson_events(stream_generation('cv', 'sk-test'))
+        self.assert_complete_stream(events)
+        self.assertEqual(events[[e['event'] for e in events].index('cv_analysis')]['data']['industry_focus'], 'Fintech')
+
+    def test_failed_analysis_streams_an_error(self):
+        patch_helpers(self, openai_helper, analyze_cv_profile=None)
+        events = ndjson_events(stream_generation('cv', 'sk-test'))
+        self.assertIn({'event': 'error', 'data': {'error': 'Failed to analyze CV'}}, events)
+        self.assertEqual(events[-1], {'event': 'done', 'data': {'status': 'error'}})
+
+    def test_encodes_server_sent_events(self):
+        self.assertEqual(encode_event('news', [], 'sse'), 'event: news\ndata: []\n\n')
+        self.assertEqual(encode_event('news', [], 'ndjson'), '{"event": "news", "data": []}\n')
+
+    def test_async_stream_matches_the_sync_one(self):
+        patch_helpers(self, openai_helper_async)
+        self.assert_complete_stream(ndjson_events(async_to_sync(collect)(astream_generation('cv', 'sk-test'))))
+
+    def test_closing_the_sync_stream_cancels_the_pipeline(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_calendar(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return {}
+
+        patch_helpers(self, openai_helper)['generate_content_calendar'].side_effect = slow_calendar
+        finished = threading.Event()
+        real_run_generation = streaming.run_generation
+
+        def run_until_finished(*args, **kwargs):
+            try:
+                return real_run_generation(*args, **kwargs)
+            finally:
+                finished.set()
+
+        patcher = mock.patch.object(streaming, 'run_generation', side_effect=run_until_finished)
+        run_generation = patcher.start()
+        self.addCleanup(patcher.stop)
+        stream = stream_generation('cv', 'sk-test')
+        received = []
+        while not started.is_set():
+            received.append(json.loads(next(stream)))
+        stream.close()
+        release.set()
+        self.assertTrue(run_generation.call_args.kwargs['cancel_event'].is_set())
+        # Let the stages already running finish while the helpers are still patched
+        self.assertTrue(finished.wait(5))
+        self.assertNotIn('done', [event['event'] for event in received])
+
+    def test_closing_the_async_stream_cancels_the_pipeline(self):
+        patch_helpers(self, openai_helper_async)
+        cancelled = []
+
+        async def consume_until_calendar_starts():
+            started = asyncio.Event()
+
+            async def slow_calendar(*args, **kwargs):
+                started.set()
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+
+            stream = astream_generation('cv', 'sk-test')
+            received = []
+            with mock.patch.object(openai_helper_async, 'generate_content_calendar', slow_calendar):
+                while not started.is_set():
+                    received.append(json.loads(await stream.__anext__()))
+                await stream.aclose()
+                for _ in range(5):
+                    await asyncio.sleep(0)
+            return received
+
+        received = async_to_sync(consume_until_calendar_starts)()
+        self.assertNotIn('done', [event['event'] for event in received])
+        self.assertEqual(cancelled, [True])
+
+def chunk(text=None, choices=True):
+    if not choices:
+        return SimpleNamespace(choices=[])
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+@override_settings(GENERATION_HISTORY_ENABLED=False)
+class TokenStreamingTests(SimpleTestCase):
+    def test_streamed_completion_forwards_each_delta(self):
+        create = mock.Mock(return_value=iter([chunk('Hel'), chunk(None), chunk(choices=False), chunk('lo')]))
+        client = fake_client(create)
+        deltas = []
+        self.assertEqual(openai_helper._streamed_completion(client, REQUEST, deltas.append), 'Hello')
+        self.assertEqual(deltas, ['Hel', 'lo'])
+        self.assertTrue(create.call_args.kwargs['stream'])
+
+    def generate_post(self, cv_text, post_type, tone, api_key=None, context=None, on_delta=None, base_content=None):
+        if on_delta:
+            on_delta('base', 'Draft')
+            on_delta('enhanced', 'Final')
+        return {'content': 'Final'}
+
+    def test_stream_tokens_sends_deltas_before_each_post(self):
+        patch_helpers(self, openai_helper, generate_linkedin_content=None)
+        openai_helper.generate_linkedin_content.side_effect = self.generate_post
+        events = ndjson_events(stream_generation('cv', 'sk-test', stream_tokens=True))
+
+        deltas = [event['data'] for event in events if event['event'] == 'post_delta']
+        self.assertEqual(len(deltas), 2 * len(pipeline.POST_TYPES))
+        self.assertIn({'type': 'achievement', 'phase': 'base', 'delta': 'Draft'}, deltas)
+        names = [event['event'] for event in events]
+        self.assertLess(names.index('post_delta'), names.index('post'))
+        post = next(event['data'] for event in events if event['event'] == 'post')
+        self.assertEqual(post['content'], 'Final')
+
+    def test_deltas_are_off_by_default(self):
+        patch_helpers(self, openai_helper, generate_linkedin_content=None)
+        openai_helper.generate_linkedin_content.side_effect = self.generate_post
+        events = ndjson_events(stream_generation('cv', 'sk-test'))
+        self.assertNotIn('post_delta', [event['event'] for event in events])
+        for call in openai_helper.generate_linkedin_content.call_args_list:
+            self.assertIsNone(call.kwargs['on_delta'])
+
+    def test_async_stream_sends_deltas(self):
+        patch_helpers(self, openai_helper_async, generate_linkedin_content=None)
+
+        async def generate_post(*args, **kwargs):
+            return self.generate_post(*args, **kwargs)
+
+        openai_helper_async.generate_linkedin_content.side_effect = generate_post
+        events = ndjson_events(async_to_sync(collect)(astream_generation('cv', 'sk-test', stream_tokens=True)))
+        self.assertEqual([event['event'] for event in events].count('post_delta'), 2 * len(pipeline.POST_TYPES))
+
+class InlineExecutor:
+    """Runs submitted jobs immediately, or holds them until run_pending() when ``hold`` is set"""
+
+    def __init__(self, hold=False):
+        self.hold = hold
+        self.pending = []
+
+    def submit(self, func, *args):
+        if self.hold:
+            self.pending.append((func, args))
+        else:
+            func(*args)
+
+    def run_pending(self):
+        while self.pending:
+            func, args = self.pending.pop(0)
+            func(*args)
+
+# Transactional, since cancellations arrive from other threads than the one running the job
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class GenerationJobTests(TransactionTestCase):
+    def setUp(self):
+        self.mocks = patch_helpers(self, openai_helper)
+        self.executor = InlineExecutor()
+        patchers = [mock.patch.object(jobs, name, return_value=value)
+                    for name, value in (('_get_executor', self.executor), ('_start_heartbeat', None))]
+        patchers += [mock.patch.dict(jobs._api_keys), mock.patch.dict(jobs._cancel_events)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def beat_once(self):
+        class Stop(Exception):
+            pass
+
+        with mock.patch.object(jobs.time, 'sleep', side_effect=[None, Stop]), self.assertRaises(Stop):
+            jobs._beat()
+
+    def test_enqueued_job_runs_to_completion(self):
+        job = jobs.enqueue_generation('cv', 'sk-test')
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.result['cv_analysis']['industry_focus'], 'Fintech')
+        self.assertEqual(len(job.result['posts']), len(pipeline.POST_TYPES))
+        self.assertEqual(job.api_key_hash, client_registry.hash_api_key('sk-test'))
+        self.assertNotIn('sk-test', str(GenerationJob.objects.values().get(pk=job.pk)))
+        self.assertEqual(job.cv_text, '')
+
+    def test_failed_analysis_fails_the_job(self):
+        self.mocks['analyze_cv_profile'].return_value = None
+        job = jobs.enqueue_generation('cv', 'sk-test')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (GenerationJob.STATUS_FAILED, 'Failed to analyze CV'))
+
+    def test_cancelled_queued_job_never_runs(self):
+        self.executor.hold = True
+        job = jobs.enqueue_generation('cv', 'sk-test')
+        self.assertTrue(jobs.cancel_job(job.id))
+        self.executor.run_pending()
+        self.assertEqual(jobs.get_job(job.id).status, GenerationJob.STATUS_CANCELLED)
+        self.mocks['analyze_cv_profile'].assert_not_called()
+        self.assertFalse(jobs.cancel_job(job.id))
+
+    def test_cancel_stops_a_running_job(self):
+        self.executor.hold = True
+        job = jobs.enqueue_generation('cv', 'sk-test')
+        self.mocks['generate_content_ideas'].side_effect = lambda *args: jobs.cancel_job(job.id) and 'ideas'
+        self.executor.run_pending()
+        self.assertEqual(jobs.get_job(job.id).status, GenerationJob.STATUS_CANCELLED)
+        self.mocks['generate_linkedin_content'].assert_not_called()
+        self.assertEqual(GenerationJob.objects.get(pk=job.pk).cv_text, '')
+
+    def test_cancel_from_another_process_stops_a_running_job(self):
+        # Another process can only change the row; this one's cancel event stays unset
+        self.executor.hold = True
+        job = jobs.enqueue_generation('cv', 'sk-test')
+
+        def cancel_elsewhere(*args):
+            GenerationJob.objects.filter(pk=job.pk).update(status=GenerationJob.STATUS_CANCELLED)
+            return 'ideas'
+
+        self.mocks['generate_content_ideas'].side_effect = cancel_elsewhere
+        self.executor.run_pending()
+        self.assertEqual(jobs.get_job(job.id).status, GenerationJob.STATUS_CANCELLED)
+        self.mocks['generate_linkedin_content'].assert_not_called()
+
+    def test_stale_jobs_are_reported_as_interrupted(self):
+        job = GenerationJob.objects.create(api_key_hash='hash', cv_text='cv', status=GenerationJob.STATUS_RUNNING)
+        stale = timezone.now() - timedelta(seconds=settings.GENERATION_JOB_STALE_AFTER + 1)
+        GenerationJob.objects.filter(pk=job.pk).update(updated_at=stale)
+        job = jobs.get_job(job.id)
+        self.assertEqual((job.status, job.error, job.cv_text), (GenerationJob.STATUS_FAILED, jobs.INTERRUPTED_ERROR, ''))
+
+    def test_job_without_its_key_fails_instead_of_running(self):
+        # As after a restart: the row survived, the key held in memory did not
+        self.executor.hold = True
+        job = jobs.enqueue_generation('cv', 'sk-test')
+        jobs._api_keys.clear()
+        self.executor.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (GenerationJob.STATUS_FAILED, jobs.INTERRUPTED_ERROR))
+        self.mocks['analyze_cv_profile'].assert_not_called()
+
+    def test_heartbeat_keeps_this_process_jobs_alive(self):
+        self.executor.hold = True
+        job = jobs.enqueue_generation('cv', 'sk-test')
+        finished = GenerationJob.objects.create(api_key_hash='hash', cv_text='', status=GenerationJob.STATUS_SUCCEEDED)
+        stale = timezone.now() - timedelta(seconds=settings.GENERATION_JOB_STALE_AFTER + 1)
+        GenerationJob.objects.update(updated_at=stale)
+        jobs._cancel_events[str(finished.id)] = threading.Event()
+        self.beat_once()
+        self.assertEqual(jobs.get_job(job.id).status, GenerationJob.STATUS_QUEUED)
+        self.assertEqual(GenerationJob.objects.get(pk=finished.pk).updated_at, stale)
+        # A job of this process that finished or was cancelled elsewhere gets its cancel event set
+        self.assertTrue(jobs._cancel_events[str(finished.id)].is_set())
+        self.assertFalse(jobs._cancel_events[str(job.id)].is_set())
+
+    def test_heartbeat_fails_jobs_left_by_other_processes(self):
+        orphan = GenerationJob.objects.create(api_key_hash='hash', cv_text='cv', status=GenerationJob.STATUS_QUEUED)
+        stale = timezone.now() - timedelta(seconds=settings.GENERATION_JOB_STALE_AFTER + 1)
+        GenerationJob.objects.filter(pk=orphan.pk).update(updated_at=stale)
+        self.beat_once()
+        orphan.refresh_from_db()
+        self.assertEqual((orphan.status, orphan.error), (GenerationJob.STATUS_FAILED, jobs.INTERRUPTED_ERROR))
+
+    def test_jobs_are_scoped_to_their_key(self):
+        self.executor.hold = True
+        job = jobs.enqueue_generation('cv', 'sk-test')
+        self.assertIsNone(jobs.get_job(job.id, 'sk-other'))
+        self.assertFalse(jobs.cancel_job(job.id, 'sk-other'))
+        self.assertFalse(jobs._cancel_events[str(job.id)].is_set())
+        self.assertEqual(jobs.get_job(job.id, 'sk-test').status, GenerationJob.STATUS_QUEUED)
+
+    def test_background_request_returns_a_job_to_poll(self):
+        with mock.patch.object(views, 'read_cv_text', return_value='cv'):
+            response = self.client.post('/api/generate-posts', {
+                'api_key': 'sk-test',
+                'background': 'true',
+                'cv': SimpleUploadedFile('cv.pdf', b'%PDF', 'application/pdf'),
+            })
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        cancel_url = f"/api/jobs/{response.json()['job_id']}/cancel"
+        status = self.client.get(status_url, HTTP_X_API_KEY='sk-test')
+        self.assertEqual(status.json()['status'], GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(self.client.get(status_url).status_code, 400)
+        self.assertEqual(self.client.get(status_url, HTTP_X_API_KEY='sk-other').status_code, 404)
+        self.assertEqual(self.client.post(cancel_url, {'api_key': 'sk-other'}).status_code, 404)
+        self.assertEqual(self.client.post(cancel_url, {'api_key': 'sk-test'}).status_code, 409)
+
+def pdf_bytes(pages):
+    """A minimal PDF with one line of text per page"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for number in range(1, pages + 1):
+        stream = b'BT /F1 12 Tf 50 700 Td (Page text %d) Tj ET' % number
+        kids.append(f'{len(objects) + 1} 0 R')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects) + 2} 0 R '
+                       f'/Resources << /Font << /F1 3 0 R >> >> >>'.encode())
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    out = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return out
+
+@override_settings(PDF_MAX_BYTES=1024 * 1024, PDF_MAX_PAGES=12, PDF_PARALLEL_MIN_PAGES=8, PDF_EXTRACTION_WORKERS=2)
+class PDFExtractionTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(pdf_extraction, '_text_cache', MemoryBackend(16, 60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def page_texts(self, result):
+        return [line for line in result.text.splitlines() if line.startswith('Page text')]
+
+    def test_extracts_every_page_in_order(self):
+        result = extract_cv_text(pdf_bytes(3))
+        self.assertEqual(self.page_texts(result), ['Page text 1', 'Page text 2', 'Page text 3'])
+        self.assertEqual(result.text.count('\f'), 2)  # Page breaks, for normalize_cv_text
+        self.assertEqual(result.page_count, 3)
+        self.assertEqual(len(result.page_timings), 3)
+        self.assertFalse(result.cached)
+
+    def test_caches_text_by_file_hash(self):
+        data = pdf_bytes(2)
+        first = extract_cv_text(data)
+        with mock.patch.object(pdf_extraction.PyPDF2, 'PdfReader') as reader:
+            second = extract_cv_text(data)
+        reader.assert_not_called()
+        self.assertTrue(second.cached)
+        self.assertEqual((second.text, second.sha256), (first.text, first.sha256))
+
+    def test_rejects_oversized_files(self):
+        with override_settings(PDF_MAX_BYTES=100):
+            with self.assertRaisesMessage(PDFExtractionError, 'larger than'):
+                extract_cv_text(pdf_bytes(1))
+            upload = mock.Mock(size=101)
+            with self.assertRaises(PDFExtractionError):
+                extract_uploaded_cv(upload)
+            upload.read.assert_not_called()
+
+    def test_rejects_too_many_pages(self):
+        with self.assertRaisesMessage(PDFExtractionError, 'the limit is 12'):
+            extract_cv_text(pdf_bytes(13))
+
+    def test_rejects_unreadable_files(self):
+        with self.assertRaises(PDFExtractionError):
+            extract_cv_text(b'not a pdf')
+
+    def test_large_pdfs_are_split_across_processes(self):
+        def shutdown():
+            if pdf_extraction._executor is not None:
+                pdf_extraction._executor.shutdown()
+                pdf_extraction._executor = None
+
+        self.addCleanup(shutdown)
+        with mock.patch.object(pdf_extraction, '_extract_parallel', wraps=pdf_extraction._extract_parallel) as parallel:
+            result = extract_cv_text(pdf_bytes(9))
+        parallel.assert_called_once()
+        self.assertEqual(self.page_texts(result), [f'Page text {number}' for number in range(1, 10)])
+
+        with mock.patch.object(pdf_extraction, '_extract_parallel') as parallel:
+            extract_cv_text(pdf_bytes(7))
+        parallel.assert_not_called()
+
+    def test_falls_back_to_serial_extraction_when_the_pool_breaks(self):
+        executor = mock.Mock()
+        executor.submit.side_effect = BrokenProcessPool('worker died')
+        with mock.patch.object(pdf_extraction, '_get_executor', return_value=executor):
+            result = extract_cv_text(pdf_bytes(8))
+        self.assertEqual(len(self.page_texts(result)), 8)
+
+class NormalizeCVTextTests(SimpleTestCase):
+    def test_collapses_whitespace_and_blank_lines(self):
+        self.assertEqual(normalize_cv_text('  Jane   Doe \r\n\n\tEngineer at  Acme\n'), 'Jane Doe\nEngineer at Acme')
+
+    def test_drops_page_markers(self):
+        text = 'Jane Doe\nPage 1 of 2\nExperience\n1/2\nEducation\npage 2\n2 of 2'
+        self.assertEqual(normalize_cv_text(text), 'Jane Doe\nExperience\nEducation')
+
+    def test_keeps_one_copy_of_headers_and_footers(self):
+        pages = [
+            'Jane Doe - CV\nExperience\nAcme\nInitech\nHooli\njane@example.com\n1',
+            'JANE DOE - CV\nEducation\nMIT\nStanford\nBerkeley\njane@example.com\n2',
+        ]
+        self.assertEqual(
+            normalize_cv_text('\f'.join(pages)),
+            'Jane Doe - CV\nExperience\nAcme\nInitech\nHooli\njane@example.com\nEducation\nMIT\nStanford\nBerkeley'
+        )
+
+    def test_keeps_years_and_repeated_body_lines(self):
+        text = 'Experience\nEngineer\n2019\nPython\nEngineer\n2021\nPython\nEducation'
+        self.assertEqual(normalize_cv_text(text), text)
+
+@mock.patch.object(prompt_budget, '_get_encoding', return_value=None)
+class PromptBudgetTests(SimpleTestCase):
+    def test_estimates_four_characters_per_token(self, encoding):
+        self.assertEqual(count_tokens(''), 0)
+        self.assertEqual(count_tokens('abcd'), 1)
+        self.assertEqual(count_tokens('abcde'), 2)
+
+    def test_truncates_at_whole_lines(self, encoding):
+        text = 'a' * 8 + '\n' + 'b' * 8 + '\n' + 'c' * 8
+        self.assertEqual(truncate_to_budget(text, 6), 'a' * 8 + '\n' + 'b' * 8)
+        self.assertEqual(truncate_to_budget(text, 100), text)
+        self.assertEqual(truncate_to_budget(text, None), text)
+
+    def test_cuts_a_first_line_longer_than_the_budget(self, encoding):
+        self.assertEqual(truncate_to_budget('x' * 40, 2), 'x' * 8)
+
+    @override_settings(PROMPT_TOKEN_BUDGETS={'news': 10})
+    def test_keeps_the_leading_items_that_fit(self, encoding):
+        items = [{'t': 'aaaa'}, {'t': 'bbbb'}, {'t': 'cccc'}]
+        self.assertEqual(budget_items(items, 'news'), items[:2])
+        self.assertEqual(budget_items(items, 'unbudgeted'), items)
+
+class TokenEncodingTests(SimpleTestCase):
+    def setUp(self):
+        for name, value in [('_encoding', None), ('_estimate_logged', False)]:
+            patcher = mock.patch.object(prompt_budget, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('tiktoken.get_encoding')
+        self.get_encoding = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_estimate_without_loading_the_encoding(self):
+        with self.assertLogs(prompt_budget.logger, 'INFO') as logs:
+            self.assertEqual(count_tokens('abcde'), 2)
+            self.assertEqual(count_tokens('abcdefgh'), 2)
+        self.get_encoding.assert_not_called()
+        self.assertEqual(len(logs.output), 1)  # The fallback is logged once
+
+    @override_settings(PROMPT_TOKEN_ENCODING='')
+    def test_nothing_is_loaded_without_an_encoding(self):
+        self.assertIsNone(prompt_budget.load_encoding())
+        self.get_encoding.assert_not_called()
+
+    @override_settings(PROMPT_TOKEN_ENCODING='o200k_base')
+    def test_a_failed_load_keeps_the_estimate(self):
+        self.get_encoding.side_effect = ValueError('download failed')
+        with self.assertLogs(prompt_budget.logger, 'WARNING'):
+            self.assertIsNone(prompt_budget.load_encoding())
+        self.assertEqual(count_tokens('abcde'), 2)
+
+    @override_settings(PROMPT_TOKEN_ENCODING='o200k_base')
+    def test_counts_with_the_loaded_encoding(self):
+        self.get_encoding.return_value.encode.return_value = [1, 2, 3]
+        prompt_budget.load_encoding()
+        self.get_encoding.assert_called_once_with('o200k_base')
+        self.assertEqual(count_tokens('abcde'), 3)
+
+@override_settings(NEWS_BACKEND='fixture')
+class NewsFixtureTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(news, '_news_cache', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stops_after_num_results(self):
+        self.assertEqual(len(news.search_news('python', num_results=2)), 2)
+        self.assertEqual(len(news.search_news('python', num_results=100)), 6)  # Items in the fixture
+
+    def test_stops_reading_once_enough_items_are_parsed(self):
+        feed = [b'<rss><channel>', b'<item><title>One</title></item>', b'<item><title>Two</title></item>']
+        chunks = iter(feed)
+        self.assertEqual([item['title'] for item in news.parse_feed(chunks, 1)], ['One'])
+        self.assertEqual(next(chunks), feed[2])
+
+    def test_results_are_cached_per_normalized_query(self):
+        fetch = mock.Mock(side_effect=news.fetch_fixture_news)
+        with mock.patch.dict(news.NEWS_BACKENDS, fixture=fetch):
+            first = news.search_news('Machine  Learning', num_results=3)
+            second = news.search_news('machine learning', num_results=3)
+            self.assertEqual(fetch.call_count, 1)
+            self.assertEqual(first, second)
+
+            news.search_news('machine learning', num_results=4)
+            self.assertEqual(fetch.call_count, 2)
+            news.search_news('machine learning', num_results=3, refresh=True)
+            self.assertEqual(fetch.call_count, 3)
+
+    def test_cached_results_are_copies(self):
+        news.search_news('python', num_results=3).clear()
+        self.assertEqual(len(news.search_news('python', num_results=3)), 3)
+
+    def test_failures_return_no_news_and_are_not_cached(self):
+        fetch = mock.Mock(side_effect=news.NewsTimeout('slow feed'))
+        with mock.patch.dict(news.NEWS_BACKENDS, fixture=fetch):
+            self.assertEqual(news.search_news('python'), [])
+            self.assertEqual(news.search_news('python'), [])
+        self.assertEqual(fetch.call_count, 2)
+
+    @override_settings(NEWS_TOTAL_TIMEOUT=5)
+    def test_slow_feeds_time_out(self):
+        response = mock.Mock()
+        response.iter_content.return_value = [b'<rss>', b'<item>']
+        with mock.patch.object(news.time, 'monotonic', side_effect=[1, 10]):
+            with self.assertRaises(news.NewsTimeout):
+                list(news._read_chunks(response, deadline=5))
+
+def _zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return SimpleUploadedFile('cvs.zip', buffer.getvalue())
+
+@override_settings(BATCH_MAX_CVS=3, BATCH_MAX_BYTES=10 * 1024, PDF_MAX_BYTES=8 * 1024)
+class CollectBatchUploadsTests(SimpleTestCase):
+    def test_collects_pdfs_and_zipped_pdfs(self):
+        archive = _zip([('a.pdf', b'%PDF a'), ('notes.txt', b'x'), ('__MACOSX/._a.pdf', b'x'), ('dir/b.PDF', b'%PDF b')])
+        cvs = collect_batch_uploads([SimpleUploadedFile('c.pdf', b'%PDF c'), archive])
+        self.assertEqual(cvs, [('c.pdf', b'%PDF c'), ('a.pdf', b'%PDF a'), ('dir/b.PDF', b'%PDF b')])
+
+    def test_rejects_empty_batches(self):
+        with self.assertRaisesMessage(BatchUploadError, 'No CV files'):
+            collect_batch_uploads([_zip([('notes.txt', b'x')])])
+
+    def test_rejects_too_many_cvs(self):
+        archive = _zip([(f'{i}.pdf', b'%PDF') for i in range(4)])
+        with self.assertRaisesMessage(BatchUploadError, 'at most 3 CVs'):
+            collect_batch_uploads([archive])
+
+    def test_rejects_batches_over_the_byte_limit(self):
+        archive = _zip([(f'{i}.pdf', b'\0' * (4 * 1024)) for i in range(3)])
+        with self.assertRaisesMessage(BatchUploadError, 'A batch can be at most'):
+            collect_batch_uploads([archive])
+
+    def test_rejects_oversized_entries_before_inflating_them(self):
+        archive = _zip([('big.pdf', b'\0' * (9 * 1024))])
+        with mock.patch.object(zipfile.ZipFile, 'read') as read:
+            with self.assertRaisesMessage(BatchUploadError, 'big.pdf is larger than'):
+                collect_batch_uploads([archive])
+        read.assert_not_called()
+
+    def test_stops_inflating_at_the_first_entry_over_the_limits(self):
+        archive = _zip([(f'{i}.pdf', b'\0' * (4 * 1024)) for i in range(5)])
+        with mock.patch.object(zipfile.ZipFile, 'read', return_value=b'%PDF') as read:
+            with self.assertRaisesMessage(BatchUploadError, 'A batch can be at most'):
+                collect_batch_uploads([archive])
+        self.assertEqual(read.call_count, 2)
+
+    def test_rejects_bad_zips(self):
+        with self.assertRaisesMessage(BatchUploadError, 'cvs.zip'):
+            collect_batch_uploads([SimpleUploadedFile('cvs.zip', b'not a zip')])
+
+class StreamBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.generation = {
+            'cv_analysis': CV_ANALYSIS, 'content_ideas': ['idea'], 'industry_trends': None,
+            'content_calendar': None, 'news': [], 'posts': [],
+        }
+        extract = mock.patch.object(batch, 'extract_cv_text', side_effect=lambda data: SimpleNamespace(text=data.decode()))
+        extract.start()
+        self.addCleanup(extract.stop)
+
+    def test_yields_one_result_per_cv_and_a_summary(self):
+        def generate(cv_text, api_key, **kwargs):
+            if cv_text == 'broken':
+                raise ValueError('unreadable')
+            return self.generation
+
+        with mock.patch.object(batch, 'run_generation', side_effect=generate):
+            events = ndjson_events(stream_batch([('a.pdf', b'good'), ('b.pdf', b'broken')], 'key'))
+
+        results = {event['data']['filename']: event['data'] for event in events if event['event'] == 'cv_result'}
+        self.assertEqual(results['a.pdf']['status'], 'success')
+        self.assertEqual(results['b.pdf'], {**results['b.pdf'], 'status': 'error', 'error': 'unreadable'})
+        self.assertEqual(events[-1]['event'], 'batch_done')
+        self.assertEqual((events[-1]['data']['succeeded'], events[-1]['data']['failed']), (1, 1))
+
+    def test_closing_the_stream_cancels_the_remaining_cvs(self):
+        cancelled = []
+        started = threading.Event()
+        finished = threading.Event()
+
+        def generate(cv_text, api_key, cancel_event, **kwargs):
+            if cv_text == 'slow':
+                started.set()
+                cancelled.append(cancel_event.wait(timeout=5))
+                finished.set()
+            return self.generation
+
+        with mock.patch.object(batch, 'run_generation', side_effect=generate):
+            stream = stream_batch([('a.pdf', b'fast'), ('b.pdf', b'slow')], 'key')
+            self.assertEqual(json.loads(next(stream))['data']['filename'], 'a.pdf')
+            self.assertTrue(started.wait(timeout=5))
+            stream.close()
+            self.assertTrue(finished.wait(timeout=5))
+
+        self.assertEqual(cancelled, [True])
+
+def rate_limit_error(headers=None, code='rate_limit_exceeded'):
+    request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return openai.RateLimitError('Rate limited', response=response, body={'code': code})
+
+@override_settings(
+    OPENAI_REQUESTS_PER_MINUTE=60, OPENAI_TOKENS_PER_MINUTE=600, OPENAI_INITIAL_CONCURRENCY=4,
+    OPENAI_MAX_CONCURRENCY=5, OPENAI_MAX_RETRIES=2, OPENAI_BACKOFF_BASE=0.5, OPENAI_BACKOFF_MAX=30,
+    OPENAI_SCHEDULER_POLL_INTERVAL=0.05
+)
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for target, attribute, value in [(rate_limiter.time, 'monotonic', self.clock), (rate_limiter.random, 'uniform', lambda a, b: 1)]:
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_parses_reset_durations(self):
+        self.assertEqual(parse_duration('1s'), 1)
+        self.assertEqual(parse_duration('6m0s'), 360)
+        self.assertEqual(parse_duration('120ms'), 0.12)
+        self.assertEqual(parse_duration('2.5'), 2.5)
+        self.assertIsNone(parse_duration(''))
+        self.assertIsNone(parse_duration('soon'))
+
+    def test_token_bucket_refills_continuously(self):
+        bucket = TokenBucket(60)
+        bucket.take(60)
+        self.assertEqual(bucket.wait_time(1, self.clock.now), 1)
+        self.clock.now += 0.5
+        self.assertEqual(bucket.wait_time(1, self.clock.now), 0.5)
+        self.clock.now += 100
+        self.assertEqual(bucket.wait_time(1, self.clock.now), 0)
+        self.assertEqual(bucket.level, 60)  # Never above capacity
+
+    def test_token_bucket_lets_oversized_requests_through_once_full(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.wait_time(500, self.clock.now), 0)
+        bucket.take(500)
+        self.assertEqual(bucket.level, 0)
+
+    def test_token_bucket_adopts_the_server_limits(self):
+        bucket = TokenBucket(60)
+        bucket.sync(120, 10, self.clock.now)
+        self.assertEqual((bucket.capacity, bucket.level), (120, 10))
+        bucket.sync(None, 50, self.clock.now)  # Never raised by the headers
+        self.assertEqual((bucket.capacity, bucket.level), (120, 10))
+
+    def test_acquire_takes_from_both_buckets(self):
+        limiter = KeyLimiter()
+        self.assertEqual(limiter.try_acquire(300), 0)
+        self.assertEqual((limiter.requests.level, limiter.tokens.level, limiter.in_flight), (59, 300, 1))
+        self.assertEqual(limiter.try_acquire(600), 30)  # 300 tokens short at 10 tokens a second
+        limiter.release()
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_acquire_waits_for_a_slot_in_the_concurrency_window(self):
+        limiter = KeyLimiter()
+        for _ in range(4):
+            self.assertEqual(limiter.try_acquire(1), 0)
+        self.assertEqual(limiter.try_acquire(1), 0.05)
+        limiter.release()
+        self.assertEqual(limiter.try_acquire(1), 0)
+
+    def test_window_grows_additively_and_halves_once_per_burst(self):
+        limiter = KeyLimiter()
+        limiter.on_response({})
+        self.assertEqual(limiter.concurrency, 4.25)
+        for _ in range(20):
+            limiter.on_response({})
+        self.assertEqual(limiter.concurrency, 5)  # OPENAI_MAX_CONCURRENCY
+
+        limiter.on_throttled({'retry-after': '0'}, 0)
+        limiter.on_throttled({'retry-after': '0'}, 0)
+        self.assertEqual(limiter.concurrency, 2.5)
+        self.assertEqual(limiter.throttle_events, 2)
+
+        self.clock.now += 2
+        limiter.on_throttled({'retry-after': '0'}, 0)
+        self.assertEqual(limiter.concurrency, 1.25)
+        self.clock.now += 2
+        limiter.on_throttled({'retry-after': '0'}, 0)
+        self.assertEqual(limiter.concurrency, 1)
+
+    def test_throttling_blocks_every_caller_until_the_shared_deadline(self):
+        limiter = KeyLimiter()
+        limiter.on_throttled({'retry-after': '2'}, 0)
+        limiter.on_throttled({'retry-after': '1'}, 0)  # Never moves the deadline earlier
+        self.assertEqual(limiter.try_acquire(1), 2)
+        self.clock.now += 1.5
+        self.assertEqual(limiter.try_acquire(1), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(limiter.try_acquire(1), 0)
+
+    def test_backoff_follows_the_rate_limit_headers(self):
+        cases = [
+            ({'retry-after-ms': '250', 'retry-after': '9'}, 0, 0.25),
+            ({'retry-after': '3'}, 0, 3),
+            ({'x-ratelimit-reset-requests': '6m0s', 'x-ratelimit-reset-tokens': '1.5s'}, 0, 1.5),
+            ({}, 2, 2),  # OPENAI_BACKOFF_BASE * 2 ** attempt
+            ({'retry-after': '600'}, 0, 30),  # Capped at OPENAI_BACKOFF_MAX
+        ]
+        for headers, attempt, expected in cases:
+            with self.subTest(headers=headers):
+                limiter = KeyLimiter()
+                limiter.on_throttled(headers, attempt)
+                self.assertEqual(limiter.blocked_until - self.clock.now, expected)
+
+    def test_retries_rate_limits_through_the_shared_backoff(self):
+        scheduler = CallScheduler()
+        client = mock.Mock(api_key='key')
+        create = client.chat.completions.with_raw_response.create
+        raw = mock.Mock(headers={})
+        raw.parse.return_value = SimpleNamespace(usage=None)
+        create.side_effect = [rate_limit_error({'retry-after': '0'}), raw]
+
+        self.assertIs(scheduler.create(client, model='gpt-4o', messages=[]), raw.parse.return_value)
+        self.assertEqual(create.call_count, 2)
+        limiter = scheduler.limiter_for(client)
+        self.assertEqual((limiter.throttle_events, limiter.in_flight), (1, 0))
+
+    def test_does_not_retry_an_exhausted_quota(self):
+        scheduler = CallScheduler()
+        client = mock.Mock(api_key='key')
+        create = client.chat.completions.with_raw_response.create
+        create.side_effect = rate_limit_error({'retry-after': '0'}, code='insufficient_quota')
+
+        with self.assertRaises(openai.RateLimitError):
+            scheduler.create(client, model='gpt-4o', messages=[])
+
+        self.assertEqual(create.call_count, 1)
+        limiter = scheduler.limiter_for(client)
+        self.assertEqual((limiter.throttle_events, limiter.blocked_until, limiter.in_flight), (0, 0, 0))
+
+    def test_gives_up_after_the_configured_retries(self):
+        scheduler = CallScheduler()
+        client = mock.Mock(api_key='key')
+        create = client.chat.completions.with_raw_response.create
+        create.side_effect = rate_limit_error({'retry-after': '0'})
+
+        with self.assertRaises(openai.RateLimitError):
+            scheduler.create(client, model='gpt-4o', messages=[])
+        self.assertEqual(create.call_count, 3)  # The call and OPENAI_MAX_RETRIES retries
+
+class CVProfileTests(SimpleTestCase):
+    def answer(self, **changes):
+        answer = json.loads(json.dumps(CV_PROFILE_ANSWER))
+        for path, value in changes.items():
+            section, key = path.split('__')
+            if value is None:
+                del answer[section][key]
+            else:
+                answer[section][key] = value
+        return json.dumps(answer)
+
+    def test_parses_a_valid_answer(self):
+        profile = parse_cv_profile(self.answer(analysis__soft_skills=[' Mentoring ', '']))
+        analysis = profile.analysis.to_dict()
+        self.assertEqual(analysis['key_areas_of_expertise'], ['Payments', 'Risk'])
+        self.assertEqual(analysis['soft_skills'], ['Mentoring'])
+        self.assertEqual(analysis['notable_achievements'], 'Cut fraud losses by 30%')
+        self.assertEqual(profile.skills.to_dict()['technical_skills'], [{'name': 'Python', 'proficiency': 'Expert'}])
+        self.assertEqual(profile.skills.to_dict()['certifications'], [])
+
+    def test_rejects_a_missing_key(self):
+        with self.assertRaisesMessage(CVProfileError, "'industry_focus' is missing"):
+            parse_cv_profile(self.answer(analysis__industry_focus=None))
+        with self.assertRaisesMessage(CVProfileError, "'domain_knowledge' is missing"):
+            parse_cv_profile(self.answer(skills__domain_knowledge=None))
+
+    def test_rejects_a_wrong_type(self):
+        with self.assertRaisesMessage(CVProfileError, "'content_topics' is missing or not a list"):
+            parse_cv_profile(self.answer(analysis__content_topics='Open banking'))
+        with self.assertRaisesMessage(CVProfileError, "'technical_skills' must be a list of strings"):
+            parse_cv_profile(self.answer(analysis__technical_skills=[{'name': 'Python'}]))
+
+    def test_rejects_values_outside_the_schema(self):
+        with self.assertRaisesMessage(CVProfileError, "Unknown career level 'guru'"):
+            parse_cv_profile(self.answer(analysis__career_level='guru'))
+        with self.assertRaisesMessage(CVProfileError, "Unknown proficiency 'Wizard'"):
+            parse_cv_profile(self.answer(skills__technical_skills=[{'name': 'Python', 'proficiency': 'Wizard'}]))
+
+    def test_rejects_invalid_json(self):
+        with self.assertRaisesMessage(CVProfileError, 'not valid JSON'):
+            parse_cv_profile('{"analysis": ')
+
+def long_post(word):
+    return ' '.join([word] * 50)
+
+class MultiPostTests(SimpleTestCase):
+    post_types = pipeline.POST_TYPES[:2]
+
+    def test_parses_every_valid_base_post(self):
+        content = json.dumps({'achievement': f'  {long_post("won")}  ', 'skill_highlight': 'Too short'})
+        self.assertEqual(parse_base_posts(content, self.post_types), {'achievement': long_post('won')})
+
+    def test_unparseable_output_yields_no_posts(self):
+        self.assertEqual(parse_base_posts('{"achievement": ', self.post_types), {})
+        self.assertEqual(parse_base_posts('["a list"]', self.post_types), {})
+        self.assertEqual(parse_enhanced_posts(None, self.post_types), {})
+
+    def test_enhanced_posts_need_engagement_suggestions(self):
+        content = json.dumps({
+            'achievement': {'content': long_post('won'), 'engagement_suggestions': 'Ask about it'},
+            'skill_highlight': {'content': long_post('python'), 'engagement_suggestions': ' '},
+        })
+        self.assertEqual(parse_enhanced_posts(content, self.post_types), {'achievement': (long_post('won'), 'Ask about it')})
+
+    def test_generates_and_enhances_all_posts_with_two_calls(self):
+        client = completion_client(
+            json.dumps({'achievement': long_post('won'), 'skill_highlight': long_post('python')}),
+            json.dumps({
+                'achievement': {'content': long_post('WON'), 'engagement_suggestions': 'Ask'},
+                'skill_highlight': {'content': 'Too short', 'engagement_suggestions': 'Ask'},
+            }),
+        )
+        context = openai_helper.AnalysisContext('cv', CV_ANALYSIS, industry_trends='trends', news_results=[])
+        with mock.patch.object(openai_helper, 'get_openai_client', return_value=client):
+            batch = openai_helper.generate_multi_posts(context, self.post_types, 'sk-test')
+
+        self.assertEqual(client.chat.completions.create.call_count, 2)
+        self.assertEqual(list(batch['posts']), ['achievement'])
+        self.assertEqual(batch['posts']['achievement']['content'], long_post('WON'))
+        self.assertEqual(batch['base']['skill_highlight'], long_post('python'))
+
+    def test_failed_posts_fall_back_to_their_own_calls(self):
+        batch = {
+            'posts': {'achievement': {'content': 'batched'}},
+            'base': {'achievement': long_post('won'), 'skill_highlight': long_post('python')},
+        }
+        mocks = patch_helpers(self, openai_helper, generate_multi_posts=batch)
+        generation = pipeline.run_generation('cv', 'sk-test', multi_post=True, max_workers=4)
+
+        contents = {post['type']: post['content'] for post in generation['posts']}
+        self.assertEqual(contents['achievement'], 'batched')
+        self.assertEqual(contents['skill_highlight'], 'post')
+        calls = {call.args[1]: call.kwargs['base_content'] for call in mocks['generate_linkedin_content'].call_args_list}
+        self.assertEqual(calls, {'skill_highlight': long_post('python'), 'career_journey': None, 'industry_insight': None})
+
+    @override_settings(GENERATION_MULTI_POST=True)
+    def test_streaming_post_text_uses_the_per_post_path(self):
+        mocks = patch_helpers(self, openai_helper, generate_multi_posts=None)
+        pipeline.run_generation('cv', 'sk-test', on_post_delta=lambda *args: None, max_workers=4)
+        mocks['generate_multi_posts'].assert_not_called()
+        self.assertEqual(mocks['generate_linkedin_content'].call_count, len(pipeline.POST_TYPES))
+
+class MetricsTests(SimpleTestCase):
+    def test_renders_counters_in_the_text_format(self):
+        counter = metrics.Counter('calls_total', 'Calls made', ['operation'])
+        counter.inc(operation='analyze_cv')
+        counter.inc(2, operation='analyze_cv')
+        counter.inc(operation='say "hi"')
+        self.assertEqual(counter.collect(), [
+            '# HELP calls_total Calls made',
+            '# TYPE calls_total counter',
+            'calls_total{operation="analyze_cv"} 3',
+            'calls_total{operation="say \\"hi\\""} 1',
+        ])
+
+    def test_histograms_are_cumulative(self):
+        histogram = metrics.Histogram('latency_seconds', 'Latency', buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        self.assertEqual(histogram.collect()[2:], [
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            'latency_seconds_sum 5.55',
+            'latency_seconds_count 3',
+        ])
+
+    def test_counts_tokens_per_helper(self):
+        tokens = metrics.Counter('tokens_total', 'Tokens', ['operation', 'kind'])
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+        client = fake_client(mock.Mock(return_value=SimpleNamespace(usage=usage)))
+
+        @metrics.instrumented
+        def analyze_cv():
+            return CallScheduler().create(client, model='gpt-4o', messages=[])
+
+        with mock.patch.object(metrics, 'OPENAI_TOKENS', tokens):
+            analyze_cv()
+        self.assertEqual(tokens.collect()[2:], [
+            'tokens_total{operation="analyze_cv",kind="cached"} 64',
+            'tokens_total{operation="analyze_cv",kind="completion"} 20',
+            'tokens_total{operation="analyze_cv",kind="prompt"} 100',
+        ])
+
+    def test_counts_failed_stages(self):
+        errors = metrics.Counter('stage_errors_total', 'Stage errors', ['stage'])
+        with mock.patch.object(metrics, 'STAGE_ERRORS', errors):
+            run_stages([Stage('ideas', lambda deps: None, required='No ideas'), Stage('news', lambda deps: [1])])
+        self.assertEqual(errors.collect()[2:], ['stage_errors_total{stage="ideas"} 1'])
+
+@override_settings(ALLOWED_HOSTS=['testserver'], METRICS_ENABLED=True, METRICS_TOKEN='')
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(DEBUG=True)
+    def test_serves_the_text_format(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE generation_stage_seconds histogram', response.content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_the_bearer_token_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_is_hidden_without_a_token_outside_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_ENABLED=False, DEBUG=True)
+    def test_can_be_disabled(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_only_allows_get(self):
+        self.assertEqual(self.client.post('/metrics').status_code, 405)
+
+@override_settings(TRACE_ENABLED=True, TRACE_SAMPLE_RATE=0, TRACE_SLOW_THRESHOLD=20, TRACE_MAX_SPANS=1000)
+class TracingTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(tracing, '_get_writer')
+        self.writer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def written(self):
+        return [json.loads(call.args[0]) for call in self.writer.return_value.info.call_args_list]
+
+    def test_spans_link_to_their_parent(self):
+        with tracing.trace('job', sampled=True) as root:
+            with tracing.span('stage', stage='ideas') as stage:
+                with tracing.span('openai.request'):
+                    pass
+        spans = {record['name']: record for record in self.written()}
+        self.assertEqual(spans['openai.request']['parent_id'], stage.span_id)
+        self.assertEqual(spans['stage']['parent_id'], root.span_id)
+        self.assertIsNone(spans['job']['parent_id'])
+        self.assertEqual({record['trace_id'] for record in spans.values()}, {root.trace.trace_id})
+        self.assertEqual(spans['stage']['attributes'], {'stage': 'ideas'})
+
+    def test_unsampled_fast_traces_are_not_written(self):
+        with tracing.trace('job'):
+            with tracing.span('stage'):
+                pass
+        self.writer.assert_not_called()
+
+    def test_failed_traces_are_always_written(self):
+        with self.assertRaises(ValueError), tracing.trace('job'):
+            with tracing.span('stage'):
+                raise ValueError('boom')
+        stage = next(record for record in self.written() if record['name'] == 'stage')
+        self.assertEqual((stage['status'], stage['attributes']['error']), ('error', 'ValueError: boom'))
+
+    @override_settings(TRACE_SLOW_THRESHOLD=0)
+    def test_slow_traces_are_always_written(self):
+        with tracing.trace('job'):
+            pass
+        self.assertEqual([record['name'] for record in self.written()], ['job'])
+
+    @override_settings(TRACE_MAX_SPANS=2)
+    def test_caps_the_spans_kept_per_trace(self):
+        with tracing.trace('job', sampled=True):
+            for _ in range(3):
+                with tracing.span('stage'):
+                    pass
+        records = self.written()
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[-1]['attributes'], {'count': 2})
+
+    def test_spans_outside_a_trace_do_nothing(self):
+        with tracing.span('stage') as span:
+            span.set(stage='ideas')
+        self.assertIsNone(tracing.current_trace_id())
+        self.writer.assert_not_called()
+
+    @override_settings(TRACE_ENABLED=False)
+    def test_can_be_disabled(self):
+        with tracing.trace('job', sampled=True) as root:
+            self.assertIsNone(root.span_id)
+        self.writer.assert_not_called()
+
+@override_settings(TRACE_ENABLED=True, TRACE_SAMPLE_RATE=0, TRACE_SLOW_THRESHOLD=20)
+class TracingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(tracing, '_get_writer')
+        self.writer = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.seen = []
+
+    def view(self, request):
+        self.seen.append(tracing.current_trace_id())
+        return HttpResponse('ok')
+
+    def test_tags_the_response_with_the_trace_id(self):
+        response = TracingMiddleware(self.view)(RequestFactory().get('/api/posts/'))
+        self.assertEqual(response['X-Trace-Id'], self.seen[0])
+        self.writer.assert_not_called()
+
+    def written_root(self):
+        return json.loads(self.writer.return_value.info.call_args.args[0])
+
+    @override_settings(TRACE_SAMPLE_RATE=1)
+    def test_client_trace_ids_are_only_recorded(self):
+        trace_id = 'a1b2c3d4e5f6a7b8'
+        response = TracingMiddleware(self.view)(RequestFactory().get('/', HTTP_X_TRACE_ID=trace_id))
+        self.assertNotEqual(response['X-Trace-Id'], trace_id)
+        self.assertEqual(self.written_root()['attributes']['client_trace_id'], trace_id)
+        TracingMiddleware(self.view)(RequestFactory().get('/', HTTP_X_TRACE_ID='<script>'))
+        self.assertNotIn('client_trace_id', self.written_root()['attributes'])
+
+    def test_client_sampling_is_ignored_by_default(self):
+        TracingMiddleware(self.view)(RequestFactory().get('/', HTTP_X_TRACE_SAMPLE='1'))
+        self.writer.assert_not_called()
+
+    @override_settings(TRACE_ALLOW_CLIENT_SAMPLING=True)
+    def test_client_can_ask_for_a_sampled_trace_when_allowed(self):
+        TracingMiddleware(self.view)(RequestFactory().get('/', HTTP_X_TRACE_SAMPLE='1'))
+        self.writer.return_value.info.assert_called_once()
+
+    def test_streaming_responses_end_the_trace_once_consumed(self):
+        def view(request):
+            return StreamingHttpResponse(iter([b'a', b'b']))
+
+        with override_settings(TRACE_SAMPLE_RATE=1):
+            response = TracingMiddleware(view)(RequestFactory().get('/'))
+            self.writer.assert_not_called()
+            self.assertEqual(b''.join(response.streaming_content), b'ab')
+        self.assertEqual(self.written_root()['attributes']['status_code'], 200)
+
+class BenchmarkSmokeTests(SimpleTestCase):
+    """One end-to-end request against the stand-in OpenAI server, so the benchmark harness keeps working"""
+
+    def test_sync_request_against_fake_server(self):
+        config = ServerConfig(latency=LatencyModel(time_scale=0.001), news_latency=0)
+        with FakeOpenAIServer(config) as server, benchmark_settings(server):
+            result = run_scenario(Scenario('e2e', 'small', 'sync'), server, requests=1, concurrency=1)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['calls_per_request'], 0)
+
+def chat_completion(content):
+    return ChatCompletion.model_validate({
+        'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4o',
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': 10, 'completion_tokens': 2, 'total_tokens': 12},
+    })
+
+def completion_chunk(content):
+    return ChatCompletionChunk.model_validate({
+        'id': 'chatcmpl-1', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'gpt-4o',
+        'choices': [{'index': 0, 'delta': {'content': content}}],
+    })
+
+def live_client(*responses):
+    """A client whose raw responses carry rate-limit headers, as recorded from the API"""
+    headers = httpx.Headers({'x-ratelimit-remaining-requests': '499', 'set-cookie': 'secret'})
+    raws = [SimpleNamespace(headers=headers, parse=lambda response=response: response) for response in responses]
+    create = mock.Mock(side_effect=raws)
+    completions = SimpleNamespace(with_raw_response=SimpleNamespace(create=create))
+    return SimpleNamespace(api_key='sk-test', chat=SimpleNamespace(completions=completions))
+
+def offline_client():
+    create = mock.Mock(side_effect=AssertionError('Replay must not reach the network'))
+    completions = SimpleNamespace(with_raw_response=SimpleNamespace(create=create))
+    return SimpleNamespace(api_key='sk-test', chat=SimpleNamespace(completions=completions))
+
+class CassetteTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'traffic.jsonl.gz'
+        settings_override = override_settings(CASSETTE_PATH=str(self.path), CASSETTE_LATENCY_SCALE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch.dict(cassettes._cassettes, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reload(self):
+        """Forget the loaded cassette, as a new process would"""
+        cassettes._cassettes.clear()
+
+    def test_request_key_ignores_order_whitespace_and_transport_fields(self):
+        key = cassettes.request_key('openai', REQUEST)
+        self.assertEqual(key, cassettes.request_key('openai', dict(reversed(list(REQUEST.items())))))
+        spaced = {**REQUEST, 'messages': [{'role': 'user', 'content': 'Analyze   this\nCV'}], 'timeout': 5}
+        self.assertEqual(key, cassettes.request_key('openai', spaced))
+        self.assertNotEqual(key, cassettes.request_key('openai', {**REQUEST, 'temperature': 0}))
+        self.assertNotEqual(key, cassettes.request_key('news', REQUEST))
+
+    def test_replays_a_recorded_completion(self):
+        with override_settings(CASSETTE_MODE='record'):
+            recorded = CallScheduler().create(live_client(chat_completion('Hello')), **REQUEST)
+        self.assertEqual(recorded.choices[0].message.content, 'Hello')
+
+        self.reload()
+        with override_settings(CASSETTE_MODE='replay'):
+            replayed = CallScheduler().create(offline_client(), **REQUEST)
+        self.assertEqual(replayed.choices[0].message.content, 'Hello')
+        self.assertEqual(replayed.usage.total_tokens, 12)
+
+        entry = cassettes.get_cassette().entries('openai')[0]
+        self.assertEqual(entry['headers'], {'x-ratelimit-remaining-requests': '499'})
+
+    def test_replays_a_recorded_stream(self):
+        with override_settings(CASSETTE_MODE='record'):
+            with CallScheduler().stream(live_client(iter([completion_chunk('Hel'), completion_chunk('lo')])), **REQUEST) as chunks:
+                self.assertEqual(''.join(chunk.choices[0].delta.content for chunk in chunks), 'Hello')
+
+        self.reload()
+        with override_settings(CASSETTE_MODE='replay'):
+            with CallScheduler().stream(offline_client(), **REQUEST) as chunks:
+                self.assertEqual(''.join(chunk.choices[0].delta.content for chunk in chunks), 'Hello')
+
+    def test_repeated_recordings_replay_in_turn(self):
+        with override_settings(CASSETTE_MODE='record'):
+            client = live_client(chat_completion('first'), chat_completion('second'))
+            CallScheduler().create(client, **REQUEST)
+            CallScheduler().create(client, **REQUEST)
+
+        self.reload()
+        with override_settings(CASSETTE_MODE='replay'):
+            contents = [CallScheduler().create(offline_client(), **REQUEST).choices[0].message.content for _ in range(3)]
+        self.assertEqual(contents, ['first', 'second', 'first'])
+
+    @override_settings(CASSETTE_MODE='replay')
+    def test_unrecorded_requests_fail_in_replay(self):
+        with self.assertRaises(cassettes.CassetteMiss):
+            cassettes.create(offline_client(), REQUEST)
+
+    def test_records_and_replays_news(self):
+        fetch = mock.Mock(return_value=[{'title': 'News'}])
+        with override_settings(CASSETTE_MODE='record'):
+            self.assertEqual(cassettes.call('news', {'query': 'fintech'}, fetch), [{'title': 'News'}])
+        self.reload()
+        with override_settings(CASSETTE_MODE='replay'):
+            self.assertEqual(cassettes.call('news', {'query': 'fintech'}, fetch), [{'title': 'News'}])
+        fetch.assert_called_once()
+
+    def test_a_truncated_last_record_keeps_the_rest(self):
+        with override_settings(CASSETTE_MODE='record'):
+            cassettes.call('news', {'query': 'fintech'}, lambda: ['kept'])
+        with gzip.open(self.path, 'ab') as out:
+            out.write(b'{"key": "trunc')
+        self.reload()
+        with override_settings(CASSETTE_MODE='replay'):
+            self.assertEqual(cassettes.call('news', {'query': 'fintech'}, mock.Mock()), ['kept'])
+
+    @override_settings(CASSETTE_MODE='sometimes')
+    def test_rejects_unknown_modes(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown CASSETTE_MODE'):
+            cassettes.call('news', {}, mock.Mock())
+
+def finished_generation(**changes):
+    generation = {
+        'cv_analysis': CV_ANALYSIS,
+        'skills_analysis': SKILLS_ANALYSIS,
+        'content_ideas': 'ideas',
+        'industry_trends': 'trends',
+        'news': [{'title': 'News'}],
+        'content_calendar': 'calendar',
+        'posts': [pipeline.format_post(post_type['type'], {'content': f"{post_type['type']} v1"}) for post_type in pipeline.POST_TYPES],
+    }
+    generation.update(changes)
+    return generation
+
+@override_settings(GENERATION_HISTORY_ENABLED=True, ALLOWED_HOSTS=['testserver'])
+class GenerationHistoryTests(TestCase):
+    def setUp(self):
+        self.generation = history.save_generation('Jane  Doe\nEngineer', 'sk-owner', finished_generation())
+
+    def test_stores_the_generation_and_its_posts(self):
+        self.assertEqual(self.generation.cv_hash, history.cv_hash('Jane Doe Engineer'))
+        self.assertEqual(self.generation.api_key_hash, client_registry.hash_api_key('sk-owner'))
+        posts = history.current_posts(self.generation)
+        self.assertEqual([post.post_type for post in posts], [post_type['type'] for post_type in pipeline.POST_TYPES])
+        self.assertEqual({post.version for post in posts}, {1})
+
+    def test_failed_or_disabled_runs_are_not_stored(self):
+        self.assertIsNone(history.save_generation('cv', 'sk-owner', finished_generation(content_ideas=None)))
+        with override_settings(GENERATION_HISTORY_ENABLED=False):
+            self.assertIsNone(history.save_generation('cv', 'sk-owner', finished_generation()))
+        self.assertEqual(Generation.objects.count(), 1)
+
+    def test_lookups_are_scoped_to_the_owner_key(self):
+        self.assertEqual(history.get_generation(self.generation.id, 'sk-owner'), self.generation)
+        self.assertIsNone(history.get_generation(self.generation.id, 'sk-other'))
+        self.assertEqual(list(history.list_generations('sk-owner')), [self.generation])
+        self.assertEqual(list(history.list_generations('sk-other')), [])
+
+    def test_regenerating_a_post_adds_a_version(self):
+        with mock.patch.object(openai_helper, 'generate_linkedin_content', return_value={'content': 'achievement v2'}) as generate:
+            post = history.regenerate_post(self.generation, 'achievement', 'sk-owner')
+        self.assertEqual((post.version, post.content), (2, 'achievement v2'))
+        self.assertEqual(generate.call_args.kwargs['context'].cv_analysis, CV_ANALYSIS)
+        latest = {post.post_type: post.content for post in history.current_posts(self.generation)}
+        self.assertEqual(latest['achievement'], 'achievement v2')
+        self.assertEqual(latest['skill_highlight'], 'skill_highlight v1')
+
+    def test_retries_a_version_taken_by_a_concurrent_regeneration(self):
+        create = GeneratedPost.objects.create
+        attempts = []
+
+        def racing_create(**fields):
+            attempts.append(fields['version'])
+            if len(attempts) == 1:
+                raise IntegrityError('unique_post_version')
+            return create(**fields)
+
+        with mock.patch.object(openai_helper, 'generate_linkedin_content', return_value={'content': 'v2'}), \
+                mock.patch.object(GeneratedPost.objects, 'create', side_effect=racing_create):
+            post = history.regenerate_post(self.generation, 'achievement', 'sk-owner')
+        self.assertEqual(post.version, 2)
+        self.assertEqual(attempts, [2, 2])
+
+    def test_gives_up_when_every_version_is_taken(self):
+        with mock.patch.object(openai_helper, 'generate_linkedin_content', return_value={'content': 'v2'}), \
+                mock.patch.object(GeneratedPost.objects, 'create', side_effect=IntegrityError('taken')):
+            with self.assertRaises(RuntimeError):
+                history.regenerate_post(self.generation, 'achievement', 'sk-owner')
+
+    def test_failed_regeneration_keeps_the_current_post(self):
+        with mock.patch.object(openai_helper, 'generate_linkedin_content', return_value='Error generating post'):
+            self.assertIsNone(history.regenerate_post(self.generation, 'achievement', 'sk-owner'))
+        self.assertEqual(self.generation.post_versions.filter(post_type='achievement').count(), 1)
+
+    def test_regenerate_view_only_serves_the_owner(self):
+        url = f'/api/generations/{self.generation.id}/regenerate'
+        with mock.patch.object(openai_helper, 'generate_content_calendar', return_value='new calendar'):
+            response = self.client.post(url, {'api_key': 'sk-other', 'section': 'content_calendar'})
+            self.assertEqual(response.status_code, 404)
+            response = self.client.post(url, {'api_key': 'sk-owner', 'section': 'nonsense'})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post(url, {'api_key': 'sk-owner', 'section': 'content_calendar'})
+        self.assertEqual(response.status_code, 200)
+        self.generation.refresh_from_db()
+        self.assertEqual(self.generation.content_calendar, 'new calendar')
+
+    def test_detail_view_only_serves_the_owner(self):
+        url = f'/api/generations/{self.generation.id}'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, HTTP_X_API_KEY='sk-other').status_code, 404)
+        response = self.client.get(url, HTTP_X_API_KEY='sk-owner')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['generation_id'], str(self.generation.id))
+
+@override_settings(SINGLE_FLIGHT_ENABLED=True, SINGLE_FLIGHT_TIMEOUT=5)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.flight = SingleFlight('test')
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.calls = 0
+
+    def slow(self, result=None, error=None):
+        def work():
+            self.calls += 1
+            self.started.release()
+            self.release.wait(timeout=5)
+            if error:
+                raise error
+            return result
+        return work
+
+    def run_callers(self, count, func, timeout=None):
+        """Start ``count`` callers of the same key; the first one leads, the others join it"""
+        outcomes = [None] * count
+
+        def caller(index):
+            try:
+                outcomes[index] = self.flight.do('key', func, timeout)
+            except Exception as e:
+                outcomes[index] = e
+
+        joined = threading.Semaphore(0)
+        join = self.flight._join
+
+        def counting_join(key):
+            try:
+                return join(key)
+            finally:
+                joined.release()
+
+        threads = [threading.Thread(target=caller, args=(index,)) for index in range(count)]
+        with mock.patch.object(self.flight, '_join', counting_join):
+            for thread in threads:
+                thread.start()
+                self.assertTrue(joined.acquire(timeout=5))
+        return threads, outcomes
+
+    def finish(self, threads):
+        self.release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def test_concurrent_callers_share_one_result(self):
+        threads, outcomes = self.run_callers(4, self.slow(result={'posts': ['a']}))
+        self.finish(threads)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(outcomes, [{'posts': ['a']}] * 4)
+        outcomes[1]['posts'].append('b')  # Each follower has its own copy
+        self.assertEqual(outcomes[2], {'posts': ['a']})
+
+    def test_an_exception_reaches_every_waiter(self):
+        error = ValueError('model unavailable')
+        threads, outcomes = self.run_callers(3, self.slow(error=error))
+        self.finish(threads)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(outcomes, [error] * 3)
+
+    def test_the_key_is_released_afterwards(self):
+        self.release.set()
+        self.assertEqual(self.flight.do('key', self.slow(result=1)), 1)
+        self.assertEqual(self.flight.in_flight(), 0)
+        self.assertEqual(self.flight.do('key', self.slow(result=2)), 2)
+        with self.assertRaises(ValueError):
+            self.flight.do('key', self.slow(error=ValueError('boom')))
+        self.assertEqual(self.flight.in_flight(), 0)
+        self.assertEqual(self.calls, 3)
+
+    def test_followers_run_the_work_after_the_timeout(self):
+        threads, outcomes = self.run_callers(2, self.slow(result='done'), timeout=0.01)
+        for _ in threads:
+            self.assertTrue(self.started.acquire(timeout=5))  # The leader, then the follower giving up on it
+        self.finish(threads)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(outcomes, ['done', 'done'])
+
+    @override_settings(SINGLE_FLIGHT_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.release.set()
+        self.flight.do('key', self.slow(result=1))
+        self.flight.do('key', self.slow(result=1))
+        self.assertEqual(self.calls, 2)
+
+    def test_async_callers_share_one_result(self):
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 'done'
+
+        async def callers():
+            return await asyncio.gather(*[self.flight.ado('key', work) for _ in range(3)])
+
+        self.assertEqual(async_to_sync(callers)(), ['done'] * 3)
+        self.assertEqual(calls, 1)
+        self.assertEqual(self.flight.in_flight(), 0)
+
+@override_settings(GENERATION_HISTORY_ENABLED=True, SINGLE_FLIGHT_ENABLED=True, SINGLE_FLIGHT_TIMEOUT=5)
+class GenerateAndStoreTests(TestCase):
+    def post(self, view):
+        request = RequestFactory().post('/api/generate-posts', {
+            'api_key': 'sk-test',
+            'cv': SimpleUploadedFile('cv.pdf', b'%PDF', 'application/pdf'),
+        })
+        with mock.patch.object(views, 'read_cv_text', return_value='cv'):
+            return view(request)
+
+    def test_function_view_stores_its_generation(self):
+        mocks = patch_helpers(self, openai_helper)
+        response = self.post(views.generate_posts)
+        self.assertEqual(response.status_code, 200)
+        stored = Generation.objects.get(id=response.data['generation_id'])
+        self.assertIsNone(stored.content_calendar)
+        mocks['generate_content_calendar'].assert_not_called()
+
+    def test_duplicate_requests_join_the_run_in_flight(self):
+        release = threading.Event()
+        runs = []
+
+        def run_and_store(*args):
+            runs.append(args)
+            release.wait(timeout=5)
+            return {'cv_analysis': CV_ANALYSIS, 'content_ideas': 'ideas', 'posts': [{}]}, None
+
+        patcher = mock.patch.object(views, 'run_and_store_generation', side_effect=run_and_store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        joined = threading.Semaphore(0)
+        join = views.generation_flights._join
+
+        def counting_join(key):
+            try:
+                return join(key)
+            finally:
+                joined.release()
+
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(self.post(views.generate_posts)))
+                   for _ in range(2)]
+        with mock.patch.object(views.generation_flights, '_join', counting_join):
+            for thread in threads:
+                thread.start()
+                self.assertTrue(joined.acquire(timeout=5))
+        release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(runs, [('cv', 'sk-test', False, None, False)])
+
+@override_settings(
+    WARMER_ENABLED=True, WARMER_API_KEY='sk-server', RESULT_CACHE_ENABLED=True, WARMER_MAX_INDUSTRIES=2,
+    WARMER_MIN_REQUESTS=2, WARMER_MAX_TRACKED=3, WARMER_MAX_AGE=100
+)
+class IndustryWarmerTests(SimpleTestCase):
+    def setUp(self):
+        self.warmer = warmer.IndustryWarmer()
+        self.clock = FakeClock()
+        for target, attribute, value in [
+            (self.warmer, '_ensure_thread', mock.Mock()),
+            (warmer.time, 'monotonic', self.clock),
+        ]:
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def record(self, *industries):
+        for industry in industries:
+            self.warmer.record(warmer.industry_profile({'industry_focus': industry, 'key_areas_of_expertise': ['Payments']}))
+
+    def test_profiles_are_normalized(self):
+        analysis = {'industry_focus': ' fintech ', 'key_areas_of_expertise': ['payments ', 'Risk', 'Payments', '']}
+        profile = warmer.industry_profile(analysis)
+        self.assertEqual(profile, ('Fintech', ('payments', 'Risk')))
+        self.assertEqual(warmer.profile_expertise(profile), 'payments, Risk')
+        self.assertEqual(warmer.profile_news_query(profile), 'Fintech payments Risk')
+
+    def test_popular_profiles_are_the_most_frequent_seen_often_enough(self):
+        self.record('fintech', ' FinTech ', 'Fintech', 'health care', 'Health  Care', 'retail')
+        self.assertEqual(self.warmer.popular(), [('Fintech', ('Payments',)), ('Health Care', ('Payments',))])
+        self.warmer._ensure_thread.assert_called()
+
+    def test_expertise_is_part_of_the_profile(self):
+        for areas in (['Payments'], ['Payments'], ['Lending']):
+            self.warmer.record(warmer.industry_profile({'industry_focus': 'Fintech', 'key_areas_of_expertise': areas}))
+        self.assertEqual(self.warmer.popular(), [('Fintech', ('Payments',))])
+
+    def test_tracking_stays_bounded(self):
+        self.record('Fintech', 'Fintech', 'Fintech', 'Retail', 'Energy', 'Mining')
+        self.assertEqual(dict(self.warmer._counts), {('Fintech', ('Payments',)): 1})
+
+    @override_settings(WARMER_ENABLED=False)
+    def test_does_nothing_when_disabled(self):
+        self.record('Fintech', 'Fintech')
+        self.assertEqual(self.warmer.popular(), [])
+        self.warmer._ensure_thread.assert_not_called()
+
+    def test_refreshed_profiles_are_warm_until_they_go_stale(self):
+        self.record('Fintech', 'Fintech', 'Retail', 'Retail')
+        fintech, retail = self.warmer.popular()
+        with mock.patch.object(openai_helper, 'analyze_industry_trends', side_effect=['trends', None]) as trends, \
+                mock.patch.object(openai_helper, 'search_news') as search:
+            self.assertEqual(self.warmer.refresh(), [fintech])
+        trends.assert_any_call('Fintech', 'Payments', 'sk-server')
+        search.assert_any_call('Fintech Payments', refresh=True)
+
+        self.assertTrue(self.warmer.is_warm(fintech))
+        self.assertFalse(self.warmer.is_warm(retail))  # Its refresh failed
+        self.clock.now += 101
+        self.assertFalse(self.warmer.is_warm(fintech))
+
+    def test_requests_ask_for_what_the_warmer_refreshes(self):
+        # Same arguments as the warmer's calls, so a warm profile is a cache hit
+        mocks = patch_helpers(self, openai_helper)
+        with mock.patch.object(pipeline, 'warmer', self.warmer):
+            pipeline.run_generation('cv', 'sk-test', max_workers=4)
+        profile = warmer.industry_profile(CV_ANALYSIS)
+        self.assertEqual(self.warmer.popular(), [])  # Seen once
+        self.assertEqual(dict(self.warmer._counts), {profile: 1})
+        mocks['analyze_industry_trends'].assert_called_once_with('Fintech', warmer.profile_expertise(profile), 'sk-test')
+        self.assertTrue(warmer.profile_expertise(profile))
+        mocks['search_news'].assert_called_once_with(warmer.profile_news_query(profile))
+
+def similar_cv(name='Jane Doe', email='jane@example.com', change=None):
+    lines = [f'Worked on project {i} building distributed systems in Python for team {i % 7}' for i in range(40)]
+    if change is not None:
+        lines[change] = lines[change].replace('distributed', 'distrbuted')
+    return '\n'.join([name, f'{email} | +1 555 123 4567', *lines])
+
+@override_settings(SIMILAR_CV_ENABLED=True, RESULT_CACHE_ENABLED=True, SIMILAR_CV_THRESHOLD=0.9)
+class SimilarityIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = SimilarityIndex('test', 'v1', path='', max_entries=10)
+
+    def test_matches_near_duplicates(self):
+        self.index.add(similar_cv(), 'profile', 'key-a')
+        value, score = self.index.lookup(similar_cv(change=3), 'key-a')
+        self.assertEqual(value, 'profile')
+        self.assertGreaterEqual(score, 0.9)
+        self.assertLess(score, 1.0)
+        self.assertEqual(self.index.lookup(similar_cv(), 'key-a'), ('profile', 1.0))
+
+    def test_misses_distinct_cvs(self):
+        self.index.add(similar_cv(), 'profile', 'key-a')
+        other = '\n'.join(['Jane Doe', 'jane@example.com'] + [f'Taught course {i} on medieval history' for i in range(40)])
+        self.assertIsNone(self.index.lookup(other, 'key-a'))
+
+    def test_entries_are_scoped_to_their_key(self):
+        self.index.add(similar_cv(), 'profile', 'key-a')
+        self.assertIsNone(self.index.lookup(similar_cv(), 'key-b'))
+        self.assertIsNone(self.index.lookup(similar_cv(change=3), 'key-b'))
+
+    def test_identity_must_match(self):
+        self.index.add(similar_cv(), 'profile', 'key-a')
+        self.assertIsNone(self.index.lookup(similar_cv(name='John Smith'), 'key-a'))
+        self.assertIsNone(self.index.lookup(similar_cv(email='john@example.com'), 'key-a'))
+
+    def test_evicts_least_recently_matched(self):
+        index = SimilarityIndex('test', 'v1', path='', max_entries=2)
+        cvs = {topic: '\n'.join(f'Worked on {topic} project {i} for client {i % 5}' for i in range(40)) for topic in ('robotics', 'payroll', 'genomics')}
+        index.add(cvs['robotics'], 'robotics', 'key-a')
+        index.add(cvs['payroll'], 'payroll', 'key-a')
+        index.lookup(cvs['robotics'], 'key-a')
+        index.add(cvs['genomics'], 'genomics', 'key-a')
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.lookup(cvs['payroll'], 'key-a'))
+        self.assertEqual(index.lookup(cvs['robotics'], 'key-a'), ('robotics', 1.0))
+
+    def test_no_cache_skips_lookups(self):
+        self.index.add(similar_cv(), 'profile', 'key-a')
+        with cache_bypassed():
+            self.assertIsNone(self.index.lookup(similar_cv(), 'key-a'))
+
+    @override_settings(SIMILAR_CV_ENABLED=False)
+    def test_does_nothing_when_disabled(self):
+        self.index.add(similar_cv(), 'profile', 'key-a')
+        self.assertEqual(len(self.index), 0)
+        self.assertIsNone(self.index.lookup(similar_cv(), 'key-a'))
+
+    def test_persists_across_processes_for_the_same_version(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / 'index.json.gz')
+            index = SimilarityIndex('test', 'v1', path=path, save_interval=60)
+            index.add(similar_cv(), 'profile', 'key-a')
+            index.save_pending()
+
+            self.assertEqual(SimilarityIndex('test', 'v1', path=path).lookup(similar_cv(change=3), 'key-a')[0], 'profile')
+            self.assertIsNone(SimilarityIndex('test', 'v2', path=path).lookup(similar_cv(), 'key-a'))
+
+@override_settings(RESPONSE_COMPRESSION_ENABLED=True, RESPONSE_COMPRESSION_MIN_BYTES=100)
+class JsonResponseTests(SimpleTestCase):
+    data = {'posts': [{'content': 'word ' * 100}]}
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_etag_is_weak_and_shared_by_every_encoding(self):
+        plain = json_response(self.factory.get('/'), self.data)
+        gzipped = json_response(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'), self.data)
+        self.assertTrue(plain['ETag'].startswith('W/"'))
+        self.assertEqual(plain['ETag'], gzipped['ETag'])
+        self.assertEqual(json.loads(plain.content), self.data)
+
+    def test_get_with_a_matching_etag_gets_304(self):
+        etag = json_response(self.factory.get('/'), self.data)['ETag']
+        for method in ('get', 'head'):
+            response = json_response(getattr(self.factory, method)('/', HTTP_IF_NONE_MATCH=etag.removeprefix('W/')), self.data)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_post_is_never_answered_with_304(self):
+        etag = json_response(self.factory.get('/'), self.data)['ETag']
+        response = json_response(self.factory.post('/', HTTP_IF_NONE_MATCH=etag), self.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), self.data)
+
+    def test_changed_data_is_sent_again(self):
+        etag = json_response(self.factory.get('/'), self.data)['ETag']
+        response = json_response(self.factory.get('/', HTTP_IF_NONE_MATCH=etag), {'posts': []})
+        self.assertEqual(response.status_code, 200)
+
+    def test_gzip_is_negotiated_from_accept_encoding(self):
+        response = json_response(self.factory.get('/', HTTP_ACCEPT_ENCODING='br;q=0, gzip'), self.data)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.data)
+
+    def test_gzip_with_zero_quality_is_not_used(self):
+        response = json_response(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip;q=0'), self.data)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_brotli_is_preferred_when_installed(self):
+        fake_brotli = mock.Mock(compress=lambda body, quality: b'br:' + body)
+        with mock.patch('linkedin_api.responses.brotli', fake_brotli):
+            response = json_response(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br'), self.data)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertTrue(response.content.startswith(b'br:'))
+
+    def test_small_bodies_are_sent_uncompressed(self):
+        response = json_response(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'), {'ok': True})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+
+class CompactGenerationTests(SimpleTestCase):
+    def test_sections_every_post_repeats_are_dropped(self):
+        skills = {'technical_skills': []}
+        data = {'skills_analysis': skills, 'posts': [
+            {'content': 'a', 'skills_analysis': skills},
+            {'content': 'b', 'skills_analysis': {'technical_skills': ['Go']}},
+        ]}
+        compact = compact_generation(data)
+        self.assertEqual(compact['format'], 'compact')
+        self.assertEqual(compact['posts'][0], {'content': 'a'})
+        self.assertEqual(compact['posts'][1]['skills_analysis'], {'technical_skills': ['Go']})
+
+@override_settings(SESSIONLESS_PATH_PREFIXES=['/api/'], SESSION_ENGINE='django.contrib.sessions.backends.db', SESSION_SAVE_EVERY_REQUEST=True)
+class ApiSessionMiddlewareTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+
+        def view(request):
+            self.seen.append(request.session)
+            request.session['visited'] = True
+            return HttpResponse('ok')
+
+        self.middleware = ApiSessionMiddleware(view)
+
+    def request(self, path):
+        request = self.factory.get(path)
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = 'stale-session-key'
+        return self.middleware(request)
+
+    def test_api_requests_never_touch_the_session_store(self):
+        with self.assertNumQueries(0):
+            response = self.request('/api/jobs/1')
+        self.assertIsNone(self.seen[0].session_key)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_other_routes_keep_their_sessions(self):
+        response = self.request('/admin/')
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertIsNotNone(self.seen[0].session_key)
@@ -7,5 +7,15 @@ router = DefaultRouter()
 urlpatterns = [
     path('generate-posts', views.GeneratePostsView.as_view(), name='generate-posts'),
     path('verify-api-key', views.verify_api_key, name='verify_api_key'),
+    path('generate-posts/stream', views.generate_posts_stream, name='generate-posts-stream'),
+    path('generate-posts/batch', views.generate_posts_batch, name='generate-posts-batch'),
+    path('jobs/<uuid:job_id>', views.job_status, name='job-status'),
+    path('jobs/<uuid:job_id>/cancel', views.job_cancel, name='job-cancel'),
+    path('generations', views.generation_history, name='generation-history'),
+    path('generations/<uuid:generation_id>', views.generation_detail, name='generation-detail'),
+    path('generations/<uuid:generation_id>/regenerate', views.regenerate_section, name='generation-regenerate'),
+    path('async/generate-posts', views.generate_posts_async, name='generate-posts-async'),
+    path('async/generate-posts/stream', views.generate_posts_stream_async, name='generate-posts-stream-async'),
+    path('async/verify-api-key', views.verify_api_key_async, name='verify_api_key_async'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
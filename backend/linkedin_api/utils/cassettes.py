@@ -0,0 +1,287 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+import httpx
+from django.conf import settings
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from . import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# Record/replay of OpenAI and news traffic. With CASSETTE_MODE=record every
+# chat completion and news lookup is appended to CASSETTE_PATH (gzipped JSON
+# lines) with its timing, usage and rate-limit headers; with CASSETTE_MODE=replay
+# the same requests are answered from the file instead of the network, after
+# CASSETTE_LATENCY_SCALE times the recorded latency. Replayed calls still go
+# through the scheduler, so recorded traffic can be run against new scheduling
+# or caching code offline.
+
+# Request fields that don't change the answer
+_TRANSPORT_FIELDS = ('stream_options', 'timeout', 'user')
+_KEPT_HEADERS = ('x-ratelimit-', 'retry-after')
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a request the cassette has no recording of"""
+
+def _normalize(value):
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {name: _normalize(item) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+def normalize_request(request):
+    """The request without transport-only fields, with whitespace runs collapsed"""
+    return _normalize({name: value for name, value in request.items() if name not in _TRANSPORT_FIELDS})
+
+def request_key(kind, request):
+    """Hash of a normalized request; insensitive to key order and whitespace"""
+    payload = json.dumps([kind, normalize_request(request)], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+class Cassette:
+    """Recorded entries of one cassette file, loaded on first use.
+
+    A request recorded several times is replayed round-robin, so sampled
+    answers keep their variety.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._entries = None  # key -> [entry, ...]
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not self.path.exists():
+            return
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as lines:
+                for line in lines:
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry['key'], []).append(entry)
+        except (EOFError, OSError, ValueError) as e:
+            # A process killed mid-write leaves a truncated last record; keep the rest
+            logger.warning("Cassette %s is damaged, using the entries read so far: %s", self.path, e)
+
+    def entries(self, kind=None):
+        """Every entry in recording order"""
+        with self._lock:
+            self._load()
+            found = [entry for recorded in self._entries.values() for entry in recorded
+                     if kind is None or entry['kind'] == kind]
+        return sorted(found, key=lambda entry: entry['recorded_at'])
+
+    def next(self, key):
+        with self._lock:
+            self._load()
+            recorded = self._entries.get(key)
+            if not recorded:
+                return None
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = index + 1
+            return recorded[index % len(recorded)]
+
+    def append(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._load()
+            self._entries.setdefault(entry['key'], []).append(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Each append is its own gzip member; readers see one continuous stream
+            with gzip.open(self.path, 'at', encoding='utf-8') as out:
+                out.write(line)
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+def get_cassette(path=None):
+    path = str(path or settings.CASSETTE_PATH)
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+def _mode():
+    mode = settings.CASSETTE_MODE
+    if mode not in ('off', 'record', 'replay'):
+        raise ValueError(f"Unknown CASSETTE_MODE: {mode}")
+    return mode
+
+def _entry(kind, key, request, started_at, **fields):
+    return dict(
+        key=key,
+        kind=kind,
+        operation=metrics.current_operation.get(),
+        recorded_at=round(started_at, 3),
+        request=normalize_request(request),
+        **fields
+    )
+
+def _lookup(kind, request):
+    key = request_key(kind, request)
+    entry = get_cassette().next(key)
+    if entry is None:
+        raise CassetteMiss(f"No recorded {kind} response for request {key} in {settings.CASSETTE_PATH}")
+    tracing.current_span().set(cassette='replay')
+    return entry
+
+def _delay(seconds):
+    return max(0.0, seconds * settings.CASSETTE_LATENCY_SCALE)
+
+def _kept_headers(headers):
+    return {name: value for name, value in headers.items() if name.lower().startswith(_KEPT_HEADERS)}
+
+class _RecordingResponse:
+    """Wraps a live raw response and appends it to the cassette once parsed (or, for streams, consumed)"""
+
+    def __init__(self, raw, key, request, started_at, started):
+        self.raw = raw
+        self.headers = raw.headers
+        self._key = key
+        self._request = request
+        self._started_at = started_at
+        self._started = started
+        self._first_byte = time.perf_counter() - started
+
+    def _record(self, **fields):
+        get_cassette().append(_entry(
+            'openai', self._key, self._request, self._started_at,
+            first_byte=round(self._first_byte, 4),
+            latency=round(time.perf_counter() - self._started, 4),
+            headers=_kept_headers(self.headers),
+            **fields
+        ))
+
+    def parse(self):
+        parsed = self.raw.parse()
+        if not self._request.get('stream'):
+            usage = parsed.usage.model_dump(exclude_none=True) if parsed.usage else None
+            self._record(response=parsed.model_dump(mode='json', exclude_unset=True), usage=usage)
+            return parsed
+        if hasattr(parsed, '__aiter__'):
+            return self._arecord_stream(parsed)
+        return self._record_stream(parsed)
+
+    def _chunk(self, chunks, chunk):
+        chunks.append([round(time.perf_counter() - self._started, 4), chunk.model_dump(mode='json', exclude_unset=True)])
+
+    def _stream_usage(self, chunks):
+        return next((chunk['usage'] for _, chunk in reversed(chunks) if chunk.get('usage')), None)
+
+    def _record_stream(self, stream):
+        chunks = []
+        for chunk in stream:
+            self._chunk(chunks, chunk)
+            yield chunk
+        # Only streams read to the end are recorded
+        self._record(chunks=chunks, usage=self._stream_usage(chunks))
+
+    async def _arecord_stream(self, stream):
+        chunks = []
+        async for chunk in stream:
+            self._chunk(chunks, chunk)
+            yield chunk
+        self._record(chunks=chunks, usage=self._stream_usage(chunks))
+
+class _ReplayedResponse:
+    """Stands in for a raw OpenAI response, built from a cassette entry"""
+
+    def __init__(self, entry, asynchronous=False):
+        self.entry = entry
+        self.headers = httpx.Headers(entry.get('headers') or {})
+        self._asynchronous = asynchronous
+
+    def parse(self):
+        if 'chunks' not in self.entry:
+            return ChatCompletion.model_validate(self.entry['response'])
+        if self._asynchronous:
+            return self._areplay_stream()
+        return self._replay_stream()
+
+    def _gaps(self):
+        previous = self.entry['first_byte']
+        for offset, chunk in self.entry['chunks']:
+            yield _delay(offset - previous), ChatCompletionChunk.model_validate(chunk)
+            previous = offset
+
+    def _replay_stream(self):
+        for gap, chunk in self._gaps():
+            if gap:
+                time.sleep(gap)
+            yield chunk
+
+    async def _areplay_stream(self):
+        for gap, chunk in self._gaps():
+            if gap:
+                await asyncio.sleep(gap)
+            yield chunk
+
+def _replay_wait(entry):
+    # Streams wait for the first byte here and for each chunk while being read
+    return _delay(entry['first_byte'] if 'chunks' in entry else entry['latency'])
+
+def create(client, request):
+    """``client.chat.completions.with_raw_response.create(**request)``, through the cassette"""
+    mode = _mode()
+    if mode == 'replay':
+        entry = _lookup('openai', request)
+        wait = _replay_wait(entry)
+        if wait:
+            time.sleep(wait)
+        return _ReplayedResponse(entry)
+
+    if mode == 'off':
+        return client.chat.completions.with_raw_response.create(**request)
+
+    started_at, started = time.time(), time.perf_counter()
+    raw = client.chat.completions.with_raw_response.create(**request)
+    return _RecordingResponse(raw, request_key('openai', request), request, started_at, started)
+
+async def acreate(client, request):
+    mode = _mode()
+    if mode == 'replay':
+        entry = _lookup('openai', request)
+        wait = _replay_wait(entry)
+        if wait:
+            await asyncio.sleep(wait)
+        return _ReplayedResponse(entry, asynchronous=True)
+
+    if mode == 'off':
+        return await client.chat.completions.with_raw_response.create(**request)
+
+    started_at, started = time.time(), time.perf_counter()
+    raw = await client.chat.completions.with_raw_response.create(**request)
+    return _RecordingResponse(raw, request_key('openai', request), request, started_at, started)
+
+def call(kind, request, fetch):
+    """Run ``fetch()`` through the cassette; its result must be JSON-serializable"""
+    mode = _mode()
+    if mode == 'replay':
+        entry = _lookup(kind, request)
+        wait = _delay(entry['latency'])
+        if wait:
+            time.sleep(wait)
+        return entry['response']
+
+    if mode == 'off':
+        return fetch()
+
+    started_at, started = time.time(), time.perf_counter()
+    result = fetch()
+    get_cassette().append(_entry(
+        kind, request_key(kind, request), request, started_at,
+        latency=round(time.perf_counter() - started, 4),
+        response=result
+    ))
+    return result
@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+import httpx
+from django.conf import settings
+from openai import OpenAI, AsyncOpenAI
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+class _PooledHttpClient(httpx.Client):
+    """httpx client that closes its connections once the last user drops it.
+
+    Evicted clients may still be serving an in-flight call on another thread,
+    so they are not closed on eviction but when they are garbage collected.
+    """
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+def hash_api_key(api_key):
+    """Return a stable, non-reversible identifier for an API key"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+def _connection_limits():
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS_PER_CLIENT,
+        max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS_PER_CLIENT,
+        keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY
+    )
+
+class ClientRegistry:
+    """Process-wide LRU/TTL cache of long-lived OpenAI clients keyed by hashed API key.
+
+    ``on_evict(scope, client)`` is called, outside the registry's lock, for every
+    client dropped by expiry, LRU eviction, ``discard`` or ``clear``.
+    """
+
+    def __init__(self, factory, max_size, ttl, on_evict=None):
+        self.factory = factory
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._clients = OrderedDict()  # key -> (client, last_used)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, api_key, scope=None):
+        """Return the cached client for ``api_key``, creating it on a miss.
+
+        ``scope`` further partitions the cache, e.g. by event loop for async clients.
+        """
+        key = (hash_api_key(api_key), scope)
+        now = time.monotonic()
+        evicted = []
+        try:
+            with self._lock:
+                self._evict_expired(now, evicted)
+                entry = self._clients.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    self._clients[key] = (entry[0], now)
+                    self._clients.move_to_end(key)
+                    return entry[0]
+
+                self.misses += 1
+                client = self.factory(api_key)
+                self._clients[key] = (client, now)
+                while len(self._clients) > self.max_size:
+                    evicted.append(self._pop(next(iter(self._clients))))
+                return client
+        finally:
+            self._evicted(evicted)
+
+    def discard(self, predicate):
+        """Drop every entry whose scope matches ``predicate``"""
+        with self._lock:
+            evicted = [self._pop(key) for key in [k for k in self._clients if predicate(k[1])]]
+        self._evicted(evicted)
+
+    def clear(self):
+        with self._lock:
+            evicted = [self._pop(key) for key in list(self._clients)]
+        self._evicted(evicted)
+
+    def _pop(self, key):
+        client, _ = self._clients.pop(key)
+        self.evictions += 1
+        return key[1], client
+
+    def _evict_expired(self, now, evicted):
+        while self._clients:
+            key, (client, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.ttl:
+                break
+            evicted.append(self._pop(key))
+
+    def _evicted(self, evicted):
+        if self.on_evict is None:
+            return
+        for scope, client in evicted:
+            try:
+                self.on_evict(scope, client)
+            except Exception:
+                logger.exception("Closing an evicted OpenAI client failed")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._clients),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+def _create_client(api_key):
+    logger.info("Creating pooled OpenAI client")
+    return OpenAI(
+        api_key=api_key,
+        base_url=settings.OPENAI_BASE_URL,
+        timeout=30.0,
+        max_retries=0,  # Retries are scheduled by rate_limiter.scheduler
+        http_client=_PooledHttpClient(timeout=30.0, limits=_connection_limits(), follow_redirects=True)
+    )
+
+def _create_async_client(api_key):
+    logger.info("Creating pooled AsyncOpenAI client")
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=settings.OPENAI_BASE_URL,
+        timeout=30.0,
+        max_retries=0,  # Retries are scheduled by rate_limiter.scheduler
+        http_client=httpx.AsyncClient(timeout=30.0, limits=_connection_limits(), follow_redirects=True)
+    )
+
+client_registry = ClientRegistry(
+    _create_client,
+    max_size=settings.OPENAI_CLIENT_POOL_MAX_SIZE,
+    ttl=settings.OPENAI_CLIENT_POOL_TTL
+)
+
+_loops = set()  # Event loops that have async clients in the registry
+_loops_lock = threading.Lock()
+_closing = set()  # Close tasks of evicted async clients, kept referenced until done
+
+def _close_async_client(loop, client):
+    """Close an evicted async client on the loop it belongs to.
+
+    An evicted client may still be serving a call, so it is closed
+    OPENAI_CLIENT_CLOSE_DELAY seconds later. A client whose loop is already
+    closed is simply dropped: its connections went with the loop.
+    """
+    if loop.is_closed():
+        return
+
+    def close():
+        task = loop.create_task(client.close())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+    try:
+        loop.call_soon_threadsafe(loop.call_later, settings.OPENAI_CLIENT_CLOSE_DELAY, close)
+    except RuntimeError:
+        pass  # The loop closed in the meantime
+
+# Async clients are bound to the event loop they first ran on, so they are
+# cached per loop (the loop is the scope); clients of closed loops are dropped
+# when a new loop first asks for a client.
+async_client_registry = ClientRegistry(
+    _create_async_client,
+    max_size=settings.OPENAI_CLIENT_POOL_MAX_SIZE,
+    ttl=settings.OPENAI_CLIENT_POOL_TTL,
+    on_evict=_close_async_client
+)
+
+def get_pooled_client(api_key):
+    return client_registry.get(api_key)
+
+def get_pooled_async_client(api_key):
+    loop = asyncio.get_running_loop()
+    stale = None
+    with _loops_lock:
+        if loop not in _loops:
+            stale = {known for known in _loops if known.is_closed()}
+            _loops.difference_update(stale)
+            _loops.add(loop)
+    if stale:
+        async_client_registry.discard(lambda scope: scope in stale)
+    return async_client_registry.get(api_key, scope=loop)
+
+def client_pool_stats():
+    """Size, hit/miss and eviction counters for both registries"""
+    return {
+        'sync': client_registry.stats(),
+        'async': async_client_registry.stats(),
+    }
+
+def _client_pool_gauge(field):
+    return lambda: [({'pool': pool}, stats[field]) for pool, stats in client_pool_stats().items()]
+
+for _field, _documentation in [
+    ('size', 'Pooled OpenAI clients'),
+    ('evictions', 'Pooled OpenAI clients evicted since start'),
+]:
+    metrics.register(metrics.Gauges(f'openai_client_pool_{_field}', _documentation, _client_pool_gauge(_field)))
@@ -0,0 +1,157 @@
+import json
+from dataclasses import asdict, dataclass, field
+
+# Typed result of the fused CV analysis call. The model answers with JSON that
+# follows CV_PROFILE_SCHEMA (strict structured output); from_dict validates it
+# again so a malformed or truncated answer fails loudly instead of half-parsing.
+
+CAREER_LEVELS = ['junior', 'mid-level', 'senior', 'executive']
+PROFICIENCY_LEVELS = ['Expert', 'Advanced', 'Intermediate', 'Beginner']
+STRENGTH_LEVELS = ['Strong', 'Moderate', 'Developing']
+EXPERIENCE_LEVELS = ['Deep', 'Moderate', 'Basic']
+EXPERTISE_LEVELS = ['Expert', 'Proficient', 'Familiar']
+CERTIFICATION_STATUSES = ['Active', 'Expired', 'In Progress']
+
+# Skill category -> (name of the level field, allowed levels)
+SKILL_CATEGORIES = {
+    'technical_skills': ('proficiency', PROFICIENCY_LEVELS),
+    'soft_skills': ('strength', STRENGTH_LEVELS),
+    'domain_knowledge': ('experience', EXPERIENCE_LEVELS),
+    'tools_and_technologies': ('expertise', EXPERTISE_LEVELS),
+    'certifications': ('status', CERTIFICATION_STATUSES),
+}
+
+class CVProfileError(ValueError):
+    """Raised when the model's answer doesn't match the CV profile schema"""
+
+def _string_list():
+    return {'type': 'array', 'items': {'type': 'string'}}
+
+def _object(properties):
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': list(properties),
+        'additionalProperties': False,
+    }
+
+def _skill_list(level_field, levels):
+    return {'type': 'array', 'items': _object({
+        'name': {'type': 'string'},
+        level_field: {'type': 'string', 'enum': levels},
+    })}
+
+CV_PROFILE_SCHEMA = _object({
+    'analysis': _object({
+        'key_areas_of_expertise': _string_list(),
+        'industry_focus': {'type': 'string'},
+        'notable_achievements': _string_list(),
+        'technical_skills': _string_list(),
+        'soft_skills': _string_list(),
+        'career_level': {'type': 'string', 'enum': CAREER_LEVELS},
+        'content_topics': _string_list(),
+    }),
+    'skills': _object({
+        category: _skill_list(level_field, levels)
+        for category, (level_field, levels) in SKILL_CATEGORIES.items()
+    }),
+})
+
+def _require(data, key, kind):
+    value = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(value, kind):
+        raise CVProfileError(f"'{key}' is missing or not a {kind.__name__}")
+    return value
+
+def _require_strings(data, key):
+    values = _require(data, key, list)
+    if not all(isinstance(value, str) for value in values):
+        raise CVProfileError(f"'{key}' must be a list of strings")
+    return [value.strip() for value in values if value.strip()]
+
+@dataclass
+class CVAnalysis:
+    key_areas_of_expertise: list = field(default_factory=list)
+    industry_focus: str = ''
+    notable_achievements: list = field(default_factory=list)
+    technical_skills: list = field(default_factory=list)
+    soft_skills: list = field(default_factory=list)
+    career_level: str = ''
+    content_topics: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data):
+        career_level = _require(data, 'career_level', str)
+        if career_level not in CAREER_LEVELS:
+            raise CVProfileError(f"Unknown career level '{career_level}'")
+        return cls(
+            key_areas_of_expertise=_require_strings(data, 'key_areas_of_expertise'),
+            industry_focus=_require(data, 'industry_focus', str).strip(),
+            notable_achievements=_require_strings(data, 'notable_achievements'),
+            technical_skills=_require_strings(data, 'technical_skills'),
+            soft_skills=_require_strings(data, 'soft_skills'),
+            career_level=career_level,
+            content_topics=_require_strings(data, 'content_topics'),
+        )
+
+    def to_dict(self):
+        """The ``cv_analysis`` dict used by the prompts and the API response"""
+        data = asdict(self)
+        # The frontend renders achievements from a newline-separated string
+        data['notable_achievements'] = '\n'.join(self.notable_achievements)
+        return data
+
+@dataclass
+class Skill:
+    name: str
+    level: str
+
+@dataclass
+class SkillsAnalysis:
+    technical_skills: list = field(default_factory=list)
+    soft_skills: list = field(default_factory=list)
+    domain_knowledge: list = field(default_factory=list)
+    tools_and_technologies: list = field(default_factory=list)
+    certifications: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data):
+        categories = {}
+        for category, (level_field, levels) in SKILL_CATEGORIES.items():
+            skills = []
+            for entry in _require(data, category, list):
+                name = _require(entry, 'name', str).strip()
+                level = _require(entry, level_field, str)
+                if level not in levels:
+                    raise CVProfileError(f"Unknown {level_field} '{level}' in {category}")
+                if name:
+                    skills.append(Skill(name, level))
+            categories[category] = skills
+        return cls(**categories)
+
+    def to_dict(self):
+        """The ``skills_analysis`` dict: category -> list of ``{name, <level field>}``"""
+        return {
+            category: [{'name': skill.name, level_field: skill.level} for skill in getattr(self, category)]
+            for category, (level_field, _) in SKILL_CATEGORIES.items()
+        }
+
+@dataclass
+class CVProfile:
+    analysis: CVAnalysis
+    skills: SkillsAnalysis
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            analysis=CVAnalysis.from_dict(_require(data, 'analysis', dict)),
+            skills=SkillsAnalysis.from_dict(_require(data, 'skills', dict)),
+        )
+
+def parse_cv_profile(content):
+    """Validate the model's JSON answer into a CVProfile"""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise CVProfileError(f"CV profile is not valid JSON: {str(e)}")
+    return CVProfile.from_dict(data)
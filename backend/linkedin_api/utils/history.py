@@ -0,0 +1,148 @@
+import hashlib
+import logging
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from ..models import Generation, GeneratedPost
+from . import openai_helper, tracing
+from .client_registry import hash_api_key
+from .openai_helper import AnalysisContext
+from .pipeline import POST_TYPES, format_post
+from .result_cache import cache_bypassed
+
+logger = logging.getLogger(__name__)
+
+# Generation history: every successful generate-posts run is stored with the
+# upstream state its posts were written from (CV text, analysis, skills, ideas,
+# trends and news), so one post type or the calendar can be regenerated without
+# running the whole pipeline again.
+
+SECTION_CALENDAR = 'content_calendar'
+POST_TONES = {post_type['type']: post_type['tone'] for post_type in POST_TYPES}
+
+def cv_hash(cv_text):
+    """Hash of the CV text with whitespace runs collapsed"""
+    return hashlib.sha256(' '.join(cv_text.split()).encode('utf-8')).hexdigest()
+
+def save_generation(cv_text, api_key, generation):
+    """Store a finished generation; returns the Generation, or None when history is off or the run failed.
+
+    Errors are logged rather than raised so a storage problem never fails the generation itself.
+    """
+    if not settings.GENERATION_HISTORY_ENABLED or not generation['cv_analysis'] or not generation['content_ideas']:
+        return None
+    try:
+        with transaction.atomic():
+            stored = Generation.objects.create(
+                api_key_hash=hash_api_key(api_key),
+                cv_hash=cv_hash(cv_text),
+                cv_text=cv_text,
+                cv_analysis=generation['cv_analysis'],
+                skills_analysis=generation['skills_analysis'] or {},
+                content_ideas=generation['content_ideas'],
+                industry_trends=generation['industry_trends'] or '',
+                news=generation['news'] or [],
+                content_calendar=generation['content_calendar']
+            )
+            GeneratedPost.objects.bulk_create([
+                GeneratedPost(
+                    generation=stored,
+                    post_type=post['type'],
+                    status=post['status'],
+                    content=post['content'] or '',
+                    engagement_suggestions=post.get('engagement_suggestions') or ''
+                )
+                for post in generation['posts']
+            ])
+        return stored
+    except Exception:
+        logger.exception("Failed to store the generation")
+        return None
+
+def get_generation(generation_id, api_key=None):
+    """The stored generation, or None. With ``api_key`` only that key's generations are found."""
+    generations = Generation.objects.filter(pk=generation_id)
+    if api_key is not None:
+        generations = generations.filter(api_key_hash=hash_api_key(api_key))
+    return generations.first()
+
+def list_generations(api_key, cv_text_hash=None, limit=50):
+    generations = Generation.objects.filter(api_key_hash=hash_api_key(api_key))
+    if cv_text_hash:
+        generations = generations.filter(cv_hash=cv_text_hash)
+    return generations.defer('cv_text')[:limit]
+
+def current_posts(generation):
+    """The latest version of each post type, in pipeline order"""
+    latest = {}
+    for post in generation.post_versions.all():
+        if post.post_type not in latest or post.version > latest[post.post_type].version:
+            latest[post.post_type] = post
+    order = list(POST_TONES)
+    return sorted(latest.values(), key=lambda post: order.index(post.post_type) if post.post_type in order else len(order))
+
+def post_entry(generation, post):
+    """A stored post in the shape returned by format_post"""
+    if post.status != 'success':
+        return format_post(post.post_type, post.content)
+    return format_post(post.post_type, {
+        'content': post.content,
+        'engagement_suggestions': post.engagement_suggestions,
+        'industry_trends': generation.industry_trends,
+        'skills_analysis': generation.skills_analysis,
+        'related_news': generation.news,
+    })
+
+def _context(generation):
+    return AnalysisContext(
+        generation.cv_text,
+        generation.cv_analysis,
+        skills_analysis=generation.skills_analysis,
+        content_ideas=generation.content_ideas,
+        industry_trends=generation.industry_trends,
+        news_results=generation.news
+    )
+
+def regenerate_post(generation, post_type, api_key):
+    """Write a new version of one post from the stored analysis (three model calls).
+
+    Returns the new GeneratedPost, or None if generation failed.
+    """
+    with tracing.span('history.regenerate', section=post_type), cache_bypassed():
+        post_data = openai_helper.generate_linkedin_content(
+            generation.cv_text,
+            post_type,
+            POST_TONES[post_type],
+            api_key=api_key,
+            context=_context(generation)
+        )
+    if isinstance(post_data, str):
+        return None
+
+    # Two regenerations of the same post can race for the next version number
+    for _ in range(3):
+        version = (generation.post_versions.filter(post_type=post_type).aggregate(Max('version'))['version__max'] or 0) + 1
+        try:
+            with transaction.atomic():
+                post = GeneratedPost.objects.create(
+                    generation=generation,
+                    post_type=post_type,
+                    version=version,
+                    content=post_data['content'],
+                    engagement_suggestions=post_data.get('engagement_suggestions') or ''
+                )
+            generation.save(update_fields=['updated_at'])
+            return post
+        except IntegrityError:
+            continue
+    raise RuntimeError(f"Could not store a new version of the {post_type} post")
+
+def regenerate_calendar(generation, api_key):
+    """Replace the content calendar (one model call); returns it, or None if generation failed"""
+    with tracing.span('history.regenerate', section=SECTION_CALENDAR), cache_bypassed():
+        calendar = openai_helper.generate_content_calendar(generation.cv_analysis, api_key=api_key)
+    if not calendar:
+        return None
+    generation.content_calendar = calendar
+    generation.save(update_fields=['content_calendar', 'updated_at'])
+    return calendar
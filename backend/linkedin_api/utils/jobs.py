@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from ..models import GenerationJob
+from ..serializers import serialize_generation
+from ..streaming import stage_event
+from . import tracing
+from .client_registry import hash_api_key
+from .history import save_generation
+from .pipeline import run_generation
+from .result_cache import cache_bypassed
+
+logger = logging.getLogger(__name__)
+
+# Local worker pool: jobs are persisted in the database, but the API key needed to
+# run them never is, so it is handed to the worker through process memory. A job
+# therefore cannot outlive its process: once a restarted or crashed process stops
+# sending heartbeats, its unfinished jobs are failed with INTERRUPTED_ERROR and
+# have to be submitted again.
+_executor = None
+_executor_lock = threading.Lock()
+_api_keys = {}
+_cancel_events = {}  # Jobs queued or running in this process
+_heartbeat = None
+
+INTERRUPTED_ERROR = 'Job was interrupted before it finished (the server restarted or its worker stopped); submit it again'
+UNFINISHED_STATUSES = (GenerationJob.STATUS_QUEUED, GenerationJob.STATUS_RUNNING)
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.GENERATION_JOB_WORKERS,
+                thread_name_prefix='generation-job'
+            )
+        return _executor
+
+def _beat():
+    """Touch ``updated_at`` of this process' unfinished jobs so no process takes them for interrupted.
+
+    Jobs of this process that another process cancelled get their cancel event
+    set, and jobs left behind by a process that went away are failed.
+    """
+    while True:
+        time.sleep(settings.GENERATION_JOB_HEARTBEAT)
+        job_ids = list(_cancel_events)
+        try:
+            if job_ids:
+                jobs = GenerationJob.objects.filter(pk__in=job_ids, status__in=UNFINISHED_STATUSES)
+                jobs.update(updated_at=timezone.now())
+                alive = {str(job_id) for job_id in jobs.values_list('pk', flat=True)}
+                for job_id in set(job_ids) - alive:
+                    _signal_cancel(job_id)
+            fail_stale_jobs()
+        except Exception:
+            logger.exception("Generation job heartbeat failed")
+        finally:
+            connection.close()
+
+def _start_heartbeat():
+    global _heartbeat
+    with _executor_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_beat, name='generation-job-heartbeat', daemon=True)
+            _heartbeat.start()
+
+def enqueue_generation(cv_text, api_key, no_cache=False, multi_post=None):
+    """Persist a generation job and hand it to the worker pool; returns the job"""
+    job = GenerationJob.objects.create(
+        api_key_hash=hash_api_key(api_key),
+        cv_text=cv_text,
+        options={'no_cache': no_cache, 'multi_post': multi_post}
+    )
+    job_id = str(job.id)
+    _api_keys[job_id] = api_key
+    _cancel_events[job_id] = threading.Event()
+    _start_heartbeat()
+    # The job's spans share the trace ID of the request that queued it
+    _get_executor().submit(_run_job, job_id, tracing.current_trace_id())
+    return job
+
+def _signal_cancel(job_id):
+    event = _cancel_events.get(str(job_id))
+    if event:
+        event.set()
+
+def _update_running(job_id, **fields):
+    # Filtering on status keeps a concurrent cancellation from being overwritten
+    fields['updated_at'] = timezone.now()
+    return GenerationJob.objects.filter(pk=job_id, status=GenerationJob.STATUS_RUNNING).update(**fields)
+
+def _finish(job_id, status, **fields):
+    # The CV text is only needed to run the job; don't keep it once the job is done
+    return _update_running(job_id, status=status, finished_at=timezone.now(), cv_text='', **fields)
+
+def _run_job(job_id, trace_id=None):
+    with tracing.trace('generation_job', trace_id=trace_id, job_id=job_id):
+        _run_traced_job(job_id)
+
+def _run_traced_job(job_id):
+    api_key = _api_keys.pop(job_id, None)
+    cancel_event = _cancel_events.get(job_id, threading.Event())
+    try:
+        started = GenerationJob.objects.filter(pk=job_id, status=GenerationJob.STATUS_QUEUED).update(
+            status=GenerationJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            updated_at=timezone.now()
+        )
+        if not started:
+            return  # Cancelled while queued
+
+        job = GenerationJob.objects.get(pk=job_id)
+        if api_key is None:
+            _finish(job_id, GenerationJob.STATUS_FAILED, error=INTERRUPTED_ERROR)
+            return
+        partial = {}
+
+        def on_stage_done(name, result, error):
+            # Runs between stages. A cancellation may have come from another
+            # process, which can only change the row, so the status is re-read.
+            event = stage_event(name, result, error)
+            if event and event[0] != 'error':
+                section, data = event
+                if section == 'post':
+                    partial.setdefault('posts', []).append(data)
+                else:
+                    partial[section] = data
+                still_running = _update_running(job_id, result=partial)
+            else:
+                still_running = GenerationJob.objects.filter(pk=job_id, status=GenerationJob.STATUS_RUNNING).exists()
+            if not still_running:
+                cancel_event.set()
+
+        with cache_bypassed(job.options.get('no_cache', False)):
+            generation = run_generation(
+                job.cv_text,
+                api_key,
+                on_stage_done=on_stage_done,
+                cancel_event=cancel_event,
+                multi_post=job.options.get('multi_post')
+            )
+
+        if cancel_event.is_set():
+            return
+
+        if not generation['cv_analysis']:
+            _finish(job_id, GenerationJob.STATUS_FAILED, error='Failed to analyze CV')
+        elif not generation['content_ideas']:
+            _finish(job_id, GenerationJob.STATUS_FAILED, error='Failed to generate content ideas')
+        else:
+            result = serialize_generation(
+                generation['cv_analysis'],
+                generation['content_ideas'],
+                generation['posts'],
+                generation['industry_trends'],
+                generation['content_calendar'],
+                generation['news']
+            )
+            stored = save_generation(job.cv_text, api_key, generation)
+            if stored:
+                result['generation_id'] = str(stored.id)
+            _finish(job_id, GenerationJob.STATUS_SUCCEEDED, result=result)
+
+    except Exception as e:
+        logger.exception("Error in generation job %s", job_id)
+        tracing.current_span().record_error(e)
+        _finish(job_id, GenerationJob.STATUS_FAILED, error=str(e))
+    finally:
+        _cancel_events.pop(job_id, None)
+        # Worker threads are long-lived; don't keep their DB connection open between jobs
+        connection.close()
+
+def _jobs(job_id, api_key=None):
+    jobs = GenerationJob.objects.filter(pk=job_id)
+    if api_key is not None:
+        jobs = jobs.filter(api_key_hash=hash_api_key(api_key))
+    return jobs
+
+def fail_stale_jobs(jobs=None):
+    """Fail unfinished jobs whose process stopped sending heartbeats (see _beat); returns how many"""
+    jobs = GenerationJob.objects.all() if jobs is None else jobs
+    now = timezone.now()
+    return jobs.filter(
+        status__in=UNFINISHED_STATUSES,
+        updated_at__lt=now - timedelta(seconds=settings.GENERATION_JOB_STALE_AFTER)
+    ).update(
+        status=GenerationJob.STATUS_FAILED,
+        error=INTERRUPTED_ERROR,
+        cv_text='',
+        finished_at=now,
+        updated_at=now
+    )
+
+def get_job(job_id, api_key=None):
+    """Return the job, or None. With ``api_key`` only that key's jobs are found.
+
+    A job whose process stopped sending heartbeats is reported as failed.
+    """
+    job = _jobs(job_id, api_key).first()
+    if job is None or job.status in GenerationJob.FINISHED_STATUSES:
+        return job
+    if fail_stale_jobs(_jobs(job_id)):
+        job.refresh_from_db()
+    return job
+
+def cancel_job(job_id, api_key=None):
+    """Cancel a queued or running job. Returns False if it had already finished (or isn't the key's)."""
+    now = timezone.now()
+    cancelled = _jobs(job_id, api_key).filter(
+        status__in=[GenerationJob.STATUS_QUEUED, GenerationJob.STATUS_RUNNING]
+    ).update(status=GenerationJob.STATUS_CANCELLED, cv_text='', finished_at=now, updated_at=now)
+
+    # A job running in another process notices the status change after its current stage
+    if cancelled:
+        _signal_cancel(job_id)
+    return bool(cancelled)
@@ -0,0 +1,220 @@
+import contextvars
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Minimal in-process Prometheus registry: counters and histograms with labels,
+# rendered in the text exposition format by render(). Values are per process;
+# scrape every worker (or run one) when serving with several processes.
+
+# Name of the helper currently running, used to label the OpenAI calls it makes
+current_operation = contextvars.ContextVar('metrics_operation', default='unknown')
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets or settings.METRICS_LATENCY_BUCKETS)) + (math.inf,)
+        self._values = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def collect(self):
+        with self._lock:
+            values = {key: list(entry) for key, entry in self._values.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, entry in sorted(values.items()):
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, entry):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {entry[-1]}")
+        return lines
+
+class Gauges:
+    """Gauges whose values are read from ``callback()`` at scrape time: ``[(labels dict, value)]``"""
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = self.callback()
+        except Exception as e:
+            logger.warning("Error collecting %s: %s", self.name, e)
+            samples = []
+        for labels, value in samples:
+            lines.append(f"{self.name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return lines
+
+_registry = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+def render():
+    """All registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+STAGE_SECONDS = register(Histogram(
+    'generation_stage_seconds', 'Wall time of a generation pipeline stage', ['stage']))
+STAGE_QUEUE_SECONDS = register(Histogram(
+    'generation_stage_queue_seconds', 'Time a ready stage waited for a concurrency slot', ['stage']))
+STAGE_ERRORS = register(Counter(
+    'generation_stage_errors_total', 'Generation pipeline stages that failed', ['stage']))
+
+HELPER_SECONDS = register(Histogram(
+    'openai_helper_seconds', 'Wall time of an openai_helper function, including cache hits', ['operation']))
+HELPER_ERRORS = register(Counter(
+    'openai_helper_errors_total', 'openai_helper calls that raised or returned no result', ['operation']))
+
+OPENAI_REQUEST_SECONDS = register(Histogram(
+    'openai_request_seconds', 'Latency of one OpenAI API request (until the stream is consumed)', ['operation']))
+OPENAI_QUEUE_SECONDS = register(Histogram(
+    'openai_queue_seconds', 'Time an OpenAI request waited in the rate-limit scheduler', ['operation']))
+OPENAI_TOKENS = register(Counter(
+    'openai_tokens_total', 'Tokens reported in response.usage', ['operation', 'kind']))
+OPENAI_RETRIES = register(Counter(
+    'openai_retries_total', 'OpenAI requests retried by the scheduler', ['operation', 'reason']))
+OPENAI_ERRORS = register(Counter(
+    'openai_errors_total', 'OpenAI requests that failed after retries', ['operation', 'error']))
+
+RESULT_CACHE_REQUESTS = register(Counter(
+    'result_cache_requests_total', 'Result cache lookups', ['namespace', 'result']))
+
+SINGLE_FLIGHT_CALLS = register(Counter(
+    'single_flight_calls_total',
+    'Coalescible calls by role: leader ran the work, follower shared it, fallback ran its own after waiting',
+    ['name', 'role']))
+
+SIMILAR_CV_LOOKUPS = register(Counter(
+    'similar_cv_lookups_total', 'Near-duplicate CV index lookups (hit reuses a stored analysis)', ['index', 'result']))
+SIMILAR_CV_LOOKUP_SECONDS = register(Histogram(
+    'similar_cv_lookup_seconds', 'Time to search the near-duplicate CV index', ['index'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)))
+
+WARMER_REFRESHES = register(Counter(
+    'warmer_refreshes_total', 'Industry trends and news refreshed by the background warmer', ['result']))
+
+PDF_EXTRACTION_SECONDS = register(Histogram(
+    'pdf_extraction_seconds', 'Wall time of CV PDF text extraction', ['mode']))
+PDF_PAGES = register(Histogram(
+    'pdf_pages', 'Pages per extracted CV PDF', buckets=(1, 2, 3, 5, 8, 13, 20, 30, 50)))
+
+NEWS_SECONDS = register(Histogram(
+    'news_search_seconds', 'Wall time of search_news', ['result']))
+
+RESPONSE_BYTES = register(Counter(
+    'http_response_bytes_total', 'JSON response bytes of the generation endpoints, before and after compression',
+    ['encoding', 'stage']))
+
+def record_usage(operation, usage):
+    """Count prompt, completion and cached prompt tokens from a ``response.usage``"""
+    if usage is None:
+        return
+    OPENAI_TOKENS.inc(getattr(usage, 'prompt_tokens', 0) or 0, operation=operation, kind='prompt')
+    OPENAI_TOKENS.inc(getattr(usage, 'completion_tokens', 0) or 0, operation=operation, kind='completion')
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', 0) if details is not None else 0
+    if cached:
+        OPENAI_TOKENS.inc(cached, operation=operation, kind='cached')
+
+def instrumented(func):
+    """Time an openai_helper function and label the OpenAI calls it makes with its name.
+
+    The helpers report failures by returning None (or an error string for
+    posts), so those count as errors as well as exceptions.
+    """
+    operation = func.__name__
+
+    def finish(started, result):
+        HELPER_SECONDS.observe(time.perf_counter() - started, operation=operation)
+        if result is None or isinstance(result, str) and result.startswith('Error '):
+            HELPER_ERRORS.inc(operation=operation)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = current_operation.set(operation)
+            started = time.perf_counter()
+            result = None
+            try:
+                result = await func(*args, **kwargs)
+                return result
+            finally:
+                finish(started, result)
+                current_operation.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_operation.set(operation)
+        started = time.perf_counter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            finish(started, result)
+            current_operation.reset(token)
+    return wrapper
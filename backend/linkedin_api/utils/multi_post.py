@@ -0,0 +1,72 @@
+import json
+import logging
+
+# Schemas and validation for the single-call multi-post mode: one call writes
+# every base post, a second one enhances them and adds engagement suggestions.
+# Posts that fail validation are left out so the caller can regenerate just
+# those through the per-post path.
+
+logger = logging.getLogger(__name__)
+
+MIN_POST_WORDS = 40
+
+def _object(properties):
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': list(properties),
+        'additionalProperties': False,
+    }
+
+def base_posts_schema(post_types):
+    return _object({
+        post_type['type']: {'type': 'string'} for post_type in post_types
+    })
+
+def enhanced_posts_schema(post_types):
+    return _object({
+        post_type['type']: _object({
+            'content': {'type': 'string'},
+            'engagement_suggestions': {'type': 'string'},
+        })
+        for post_type in post_types
+    })
+
+def _load(content):
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as e:
+        logger.warning("Multi-post output is not valid JSON: %s", e)
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def _valid_post(text):
+    return isinstance(text, str) and len(text.split()) >= MIN_POST_WORDS
+
+def parse_base_posts(content, post_types):
+    """Return ``{post_type: text}`` for the base posts that passed validation"""
+    data = _load(content)
+    posts = {}
+    for post_type in post_types:
+        text = data.get(post_type['type'])
+        if _valid_post(text):
+            posts[post_type['type']] = text.strip()
+        else:
+            logger.info("Multi-post output has no usable %s post", post_type['type'])
+    return posts
+
+def parse_enhanced_posts(content, post_types):
+    """Return ``{post_type: (content, engagement_suggestions)}`` for entries that passed validation"""
+    data = _load(content)
+    posts = {}
+    for post_type in post_types:
+        entry = data.get(post_type['type'])
+        if not isinstance(entry, dict):
+            continue
+        text = entry.get('content')
+        engagement = entry.get('engagement_suggestions')
+        if _valid_post(text) and isinstance(engagement, str) and engagement.strip():
+            posts[post_type['type']] = (text.strip(), engagement.strip())
+        else:
+            logger.info("Multi-post enhancement has no usable %s post", post_type['type'])
+    return posts
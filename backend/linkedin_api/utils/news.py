@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+import requests
+from django.conf import settings
+from lxml import etree
+from requests.adapters import HTTPAdapter
+from . import cassettes, metrics, tracing
+from .result_cache import MemoryBackend
+from .single_flight import news_searches
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+CHUNK_SIZE = 8192
+
+class NewsTimeout(Exception):
+    """Raised when the feed doesn't arrive within NEWS_TOTAL_TIMEOUT"""
+
+_session = None
+_session_lock = threading.Lock()
+_news_cache = None
+
+def _get_session():
+    # One keep-alive session per process, shared by every request thread
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers['User-Agent'] = USER_AGENT
+            _session.mount('https://', HTTPAdapter(pool_maxsize=settings.NEWS_POOL_MAX_SIZE))
+        return _session
+
+def _get_news_cache():
+    global _news_cache
+    if _news_cache is None:
+        _news_cache = MemoryBackend(settings.NEWS_CACHE_MAX_ENTRIES, settings.NEWS_CACHE_TTL)
+    return _news_cache
+
+def normalize_query(query):
+    return ' '.join(str(query).split()).casefold()
+
+def parse_feed(chunks, num_results):
+    """Parse RSS ``<item>`` elements from an iterable of byte chunks, stopping after ``num_results``"""
+    parser = etree.XMLPullParser(events=('end',), tag='item', recover=True)
+    results = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, item in parser.read_events():
+            results.append({
+                'title': item.findtext('title') or '',
+                'link': item.findtext('link') or '',
+                'published': item.findtext('pubDate') or ''
+            })
+            item.clear()
+            if len(results) >= num_results:
+                return results
+    return results
+
+def _read_chunks(response, deadline):
+    for chunk in response.iter_content(CHUNK_SIZE):
+        if time.monotonic() > deadline:
+            raise NewsTimeout(f"News feed took longer than {settings.NEWS_TOTAL_TIMEOUT}s")
+        yield chunk
+
+def fetch_google_news(query, num_results):
+    deadline = time.monotonic() + settings.NEWS_TOTAL_TIMEOUT
+    response = _get_session().get(
+        settings.NEWS_FEED_URL,
+        params={'q': query, 'hl': 'en-US', 'gl': 'US', 'ceid': 'US:en'},
+        timeout=(settings.NEWS_CONNECT_TIMEOUT, settings.NEWS_READ_TIMEOUT),
+        stream=True
+    )
+    # Closing the streamed response once enough items are parsed skips the rest of the body
+    with response:
+        response.raise_for_status()
+        return parse_feed(_read_chunks(response, deadline), num_results)
+
+def fetch_fixture_news(query, num_results):
+    """Stand-in for tests and offline runs: serves items from NEWS_FIXTURE_PATH"""
+    with open(settings.NEWS_FIXTURE_PATH, 'rb') as fixture:
+        return parse_feed(iter(lambda: fixture.read(CHUNK_SIZE), b''), num_results)
+
+NEWS_BACKENDS = {
+    'google': fetch_google_news,
+    'fixture': fetch_fixture_news,
+}
+
+def search_news(query, num_results=5, refresh=False):
+    """Search for relevant news articles using Google News; ``refresh`` skips the cached result"""
+    with tracing.span('news.search', backend=settings.NEWS_BACKEND) as span:
+        started = time.perf_counter()
+        cache_key = (normalize_query(query), num_results)
+        cached = None if refresh else _get_news_cache().get(cache_key)
+        if cached is not None:
+            metrics.NEWS_SECONDS.observe(time.perf_counter() - started, result='cached')
+            span.set(result='cached')
+            return list(cached)
+
+        try:
+            # Concurrent lookups of the same query share one fetch
+            results = news_searches.do(cache_key, lambda: cassettes.call(
+                'news',
+                {'query': cache_key[0], 'num_results': num_results},
+                lambda: NEWS_BACKENDS[settings.NEWS_BACKEND](query, num_results)
+            ))
+        except Exception as e:
+            logger.warning("Error searching news, returning an empty news list: %s", e)
+            metrics.NEWS_SECONDS.observe(time.perf_counter() - started, result='error')
+            span.set(result='error', error=str(e))  # Degraded, not failed: the request still succeeds
+            return []
+
+        _get_news_cache().set(cache_key, results)
+        metrics.NEWS_SECONDS.observe(time.perf_counter() - started, result='fetched')
+        span.set(result='fetched', articles=len(results))
+        return list(results)
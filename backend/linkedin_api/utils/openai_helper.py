@@ -1,225 +1,141 @@
-from openai import OpenAI
+import logging
 from django.conf import settings
-import requests
-from bs4 import BeautifulSoup
-import json
-
-def get_openai_client(api_key=None):
-    """Create and return an OpenAI client instance"""
-    print(f"Attempting to create OpenAI client with key: {api_key[:10]}..." if api_key else "No API key provided")
-    
+from . import tracing
+from .client_registry import get_pooled_client, hash_api_key
+from .cv_profile import CV_PROFILE_SCHEMA, parse_cv_profile
+from .metrics import instrumented
+from .multi_post import base_posts_schema, enhanced_posts_schema, parse_base_posts, parse_enhanced_posts
+from .news import search_news
+from .rate_limiter import scheduler
+from .prompt_budget import budget_items, budget_text, compact_json, prepare_cv_text
+from .result_cache import PROMPT_VERSION, cache_key, result_cache
+from .similarity import SimilarityIndex
+from .single_flight import completions
+
+# Request builders and response parsers below are shared with openai_helper_async,
+# so the sync and async helpers only differ in how they send the request.
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-4o-2024-11-20"
+
+# CV profiles of analyzed CVs, reused for near-duplicate uploads
+similar_cvs = SimilarityIndex('cv_profile', f'{MODEL}:{PROMPT_VERSION}')
+
+def validate_api_key(api_key):
+    """Raise ValueError if the API key is missing or malformed"""
     if not api_key:
         raise ValueError("OpenAI API key is required")
-    
+
     if not isinstance(api_key, str):
         raise ValueError("API key must be a string")
-    
+
     if not api_key.startswith('sk-'):
         raise ValueError("Invalid API key format. Key should start with 'sk-'")
-    
+
+def _report_error(message, error, exc_info=False):
+    """Log a helper failure and mark the current trace span as failed"""
+    logger.error("%s: %s", message, error, exc_info=exc_info)
+    tracing.current_span().record_error(error)
+
+def get_openai_client(api_key=None):
+    """Return the long-lived OpenAI client for an API key from the process-wide pool"""
+    validate_api_key(api_key)
+
     try:
-        # Initialize with base configuration
-        client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.openai.com/v1",  # Explicitly set base URL
-            timeout=30.0,  # Set reasonable timeout
-            max_retries=2  # Set retry limit
-        )
-        print("Successfully created OpenAI client")
-        return client
+        return get_pooled_client(api_key)
     except Exception as e:
-        print(f"Error creating OpenAI client: {str(e)}")
+        logger.error("Error creating OpenAI client: %s", e)
         raise ValueError(f"Failed to initialize OpenAI client: {str(e)}")
 
-def search_news(query, num_results=5):
-    """Search for relevant news articles using Google News"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        url = f'https://news.google.com/rss/search?q={query}&hl=en-US&gl=US&ceid=US:en'
-        response = requests.get(url, headers=headers)
-        
-        # Explicitly use lxml parser
-        soup = BeautifulSoup(response.text, 'lxml-xml')
-        
-        # Fallback to html parser if lxml fails
-        if not soup.find_all('item'):
-            soup = BeautifulSoup(response.text, 'html.parser')
-        
-        items = soup.find_all('item', limit=num_results)
-        
-        results = []
-        for item in items:
-            try:
-                results.append({
-                    'title': item.title.text if item.title else '',
-                    'link': item.link.text if item.link else '',
-                    'published': item.pubDate.text if item.pubDate else ''
-                })
-            except AttributeError as e:
-                print(f"Error parsing news item: {str(e)}")
-                continue
-                
-        return results
-    except Exception as e:
-        print(f"Error searching news: {str(e)}")
-        print("Returning empty news list")
-        return []
+def _completion_flight_key(client, request, cache_namespace):
+    return hash_api_key(client.api_key), cache_key(cache_namespace, request)
 
-def analyze_cv(cv_text, api_key=None):
-    """Analyze CV to extract key information and specialties"""
-    client = get_openai_client(api_key)
-    
-    print("=== Starting CV Analysis ===")
-    
-    analysis_prompt = """Analyze this CV and extract the following information in a clear, structured format:
-    1. Key Areas of Expertise: List the main areas of professional expertise (comma-separated)
-    2. Industry Focus: The primary industry or sector
-    3. Notable Achievements: Focus on factual, measurable results (one per line, start each with a dash)
-    4. Technical Skills: List all technical skills (comma-separated)
-    5. Soft Skills: List all soft skills (comma-separated)
-    6. Career Level: Specify one of: junior, mid-level, senior, executive
-    7. Content Topics: Topics this person could write about (comma-separated)
-    
-    Format your response with these exact headings followed by a colon, then the details.
-    For lists, use commas to separate items.
-    Example:
-    Key Areas of Expertise: skill1, skill2, skill3
-    Industry Focus: specific industry
-    Technical Skills: tech1, tech2, tech3
-    etc."""
+def _cached_completion(client, request, cache_namespace):
+    """Return the message content for a request, served from the result cache when possible.
 
-    try:
-        print("Sending request to OpenAI...")
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=[
-                {"role": "system", "content": "You are an expert CV analyzer focused on extracting factual information."},
-                {"role": "user", "content": f"{analysis_prompt}\n\nCV Content:\n{cv_text}"}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        
-        print("Parsing OpenAI response...")
+    On a miss, an identical request already in flight for the same key is joined rather than repeated.
+    """
+    content = result_cache.get(cache_namespace, request)
+    if content is not None:
+        return content
+
+    def complete():
+        response = scheduler.create(client, **request)
         content = response.choices[0].message.content
-        print("Raw OpenAI response:", content)
-        
-        result = {}
-        current_key = None
-        current_value = []
-        
-        # Define expected keys and their dictionary versions
-        key_mapping = {
-            'Key Areas of Expertise': 'key_areas_of_expertise',
-            'Industry Focus': 'industry_focus',
-            'Notable Achievements': 'notable_achievements',
-            'Technical Skills': 'technical_skills',
-            'Soft Skills': 'soft_skills',
-            'Career Level': 'career_level',
-            'Content Topics': 'content_topics'
-        }
-        
-        # Define which fields should be arrays
-        array_fields = {
-            'key_areas_of_expertise',
-            'technical_skills',
-            'soft_skills',
-            'content_topics'
-        }
-        
-        for line in content.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Check if this line starts with any of our expected keys
-            found_key = None
-            for expected_key in key_mapping.keys():
-                if line.startswith(expected_key + ':'):
-                    found_key = expected_key
-                    break
-            
-            if found_key:
-                # Save previous key's data if it exists
-                if current_key and current_value:
-                    dict_key = key_mapping[current_key]
-                    joined_value = '\n'.join(current_value)
-                    
-                    # Convert comma-separated strings to arrays for specific fields
-                    if dict_key in array_fields:
-                        result[dict_key] = [item.strip() for item in joined_value.split(',') if item.strip()]
-                    else:
-                        result[dict_key] = joined_value
-                
-                # Start new key
-                current_key = found_key
-                value = line[len(found_key) + 1:].strip()  # +1 for the colon
-                current_value = [value] if value else []
-            else:
-                if current_key:
-                    current_value.append(line)
-        
-        # Save the last key's data
-        if current_key and current_value:
-            dict_key = key_mapping[current_key]
-            joined_value = '\n'.join(current_value)
-            
-            # Convert comma-separated strings to arrays for specific fields
-            if dict_key in array_fields:
-                result[dict_key] = [item.strip() for item in joined_value.split(',') if item.strip()]
-            else:
-                result[dict_key] = joined_value
-        
-        # Ensure all array fields exist, even if empty
-        for field in array_fields:
-            if field not in result:
-                result[field] = []
-        
-        print("Parsed result:", result)
-        print("=== CV Analysis Complete ===")
-        return result
-        
-    except Exception as e:
-        print(f"Error in analyze_cv: {str(e)}")
-        import traceback
-        print("Traceback:", traceback.format_exc())
-        return None
+        result_cache.set(cache_namespace, request, content)
+        return content
 
-def analyze_cv_skills(cv_text, api_key=None):
+    return completions.do(_completion_flight_key(client, request, cache_namespace), complete)
 
+def _streamed_completion(client, request, on_delta):
+    """Send a streaming request, passing each content delta to ``on_delta``; returns the full text"""
+    parts = []
+    with scheduler.stream(client, **request) as chunks:
+        for chunk in chunks:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+    return ''.join(parts)
+
+def _cv_profile_request(cv_text):
+    cv_text = prepare_cv_text(cv_text, 'cv_profile')
+    profile_prompt = """Analyze this CV and extract:
+    1. analysis: key areas of expertise, the primary industry or sector, notable achievements
+       (factual, measurable results, one per item), technical skills, soft skills, the career
+       level and topics this person could write about
+    2. skills: every skill categorized as technical skills (with proficiency), soft skills
+       (with strength), domain knowledge (with experience), tools & technologies (with
+       expertise) and certifications & training (with status)
+
+    Only include information supported by the CV."""
+
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are an expert CV analyzer and HR analyst focused on extracting factual information."},
+            {"role": "user", "content": f"{profile_prompt}\n\nCV Content:\n{cv_text}"}
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "cv_profile", "strict": True, "schema": CV_PROFILE_SCHEMA}
+        },
+        temperature=0.7,
+        max_tokens=2000
+    )
+
+@instrumented
+def analyze_cv_profile(cv_text, api_key=None):
+    """Analyze the CV and categorize its skills in one structured-output call; returns a CVProfile"""
     client = get_openai_client(api_key)
 
-    """Analyze CV skills with detailed categorization"""
-    skills_prompt = """Analyze the CV and categorize skills into:
-    1. Technical Skills (with proficiency levels: Expert, Advanced, Intermediate, Beginner)
-    2. Soft Skills (with strength indicators: Strong, Moderate, Developing)
-    3. Domain Knowledge (with experience levels: Deep, Moderate, Basic)
-    4. Tools & Technologies (with expertise: Expert, Proficient, Familiar)
-    5. Certifications & Training (with status: Active, Expired, In Progress)
-    
-    Format as JSON with categories and subcategories."""
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=[
-                {"role": "system", "content": "You are a skilled HR analyst specializing in technical skill assessment."},
-                {"role": "user", "content": f"{skills_prompt}\n\nCV Content:\n{cv_text}"}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content
+        similar = similar_cvs.lookup(cv_text, hash_api_key(api_key))
+        if similar is not None:
+            return parse_cv_profile(similar[0])
+        content = _cached_completion(client, _cv_profile_request(cv_text), 'cv_profile')
+        profile = parse_cv_profile(content)
+        similar_cvs.add(cv_text, content, hash_api_key(api_key))
+        return profile
+
     except Exception as e:
-        print(f"Error in skill analysis: {str(e)}")
+        _report_error("Error in analyze_cv_profile", e, exc_info=True)
         return None
 
-def generate_content_ideas(cv_analysis, api_key=None):
-    """Generate content ideas based on CV analysis"""
-    client = get_openai_client(api_key)
+def analyze_cv(cv_text, api_key=None):
+    """Analyze CV to extract key information and specialties"""
+    profile = analyze_cv_profile(cv_text, api_key)
+    return profile.analysis.to_dict() if profile else None
+
+def analyze_cv_skills(cv_text, api_key=None):
+    """Analyze CV skills with detailed categorization"""
+    profile = analyze_cv_profile(cv_text, api_key)
+    return profile.skills.to_dict() if profile else None
 
+def _content_ideas_request(cv_analysis):
     ideas_prompt = f"""Based on this professional's profile:
     - Expertise: {', '.join(cv_analysis.get('key_areas_of_expertise', []))}
     - Industry: {cv_analysis.get('industry_focus', '')}
@@ -253,207 +169,357 @@ def generate_content_ideas(cv_analysis, api_key=None):
 
     Keep the tone professional, helpful, and humble. Focus on sharing knowledge rather than self-promotion."""
 
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are a content strategist who focuses on helpful, value-driven content."},
+            {"role": "user", "content": ideas_prompt}
+        ],
+        temperature=0.8,
+        max_tokens=1000
+    )
+
+def _parse_content_ideas(content):
+    logger.debug("Raw content ideas response: %s", content)
+
+    # Parse the response into a structured format
+    ideas = {}
+    current_idea = None
+
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        # Check for new idea starting with number
+        if line[0].isdigit() and line[1] == '.':
+            current_idea = f"idea_{len(ideas) + 1}"
+            ideas[current_idea] = {'title': '', 'angle': '', 'key_points': []}
+            continue
+
+        if line.lower().startswith('title:'):
+            if current_idea:
+                ideas[current_idea]['title'] = line.split(':', 1)[1].strip()
+        elif line.lower().startswith('angle:'):
+            if current_idea:
+                ideas[current_idea]['angle'] = line.split(':', 1)[1].strip()
+        elif line.startswith('-') and current_idea:
+            point = line[1:].strip()
+            if point:
+                ideas[current_idea]['key_points'].append(point)
+
+    logger.debug("Parsed content ideas: %s", ideas)
+    return ideas
+
+@instrumented
+def generate_content_ideas(cv_analysis, api_key=None):
+    """Generate content ideas based on CV analysis"""
+    client = get_openai_client(api_key)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=[
-                {"role": "system", "content": "You are a content strategist who focuses on helpful, value-driven content."},
-                {"role": "user", "content": ideas_prompt}
-            ],
-            temperature=0.8,
-            max_tokens=1000
-        )
-        
-        print("Raw content ideas response:", response.choices[0].message.content)
-        
-        # Parse the response into a structured format
-        content = response.choices[0].message.content
-        ideas = {}
-        current_idea = None
-        
-        for line in content.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Check for new idea starting with number
-            if line[0].isdigit() and line[1] == '.':
-                current_idea = f"idea_{len(ideas) + 1}"
-                ideas[current_idea] = {'title': '', 'angle': '', 'key_points': []}
-                continue
-                
-            if line.lower().startswith('title:'):
-                if current_idea:
-                    ideas[current_idea]['title'] = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('angle:'):
-                if current_idea:
-                    ideas[current_idea]['angle'] = line.split(':', 1)[1].strip()
-            elif line.startswith('-') and current_idea:
-                point = line[1:].strip()
-                if point:
-                    ideas[current_idea]['key_points'].append(point)
-        
-        print("Parsed content ideas:", ideas)
-        return ideas
+        content = _cached_completion(client, _content_ideas_request(cv_analysis), 'content_ideas')
+        return _parse_content_ideas(content)
     except Exception as e:
-        print(f"Error generating ideas: {str(e)}")
-        import traceback
-        print("Traceback:", traceback.format_exc())
+        _report_error("Error generating ideas", e, exc_info=True)
         return None
 
-def generate_linkedin_content(cv_text, post_type, tone, api_key=None):
-    """Generate LinkedIn content based on CV analysis and current trends"""
-    client = get_openai_client(api_key)
-    try:
-        # First, analyze the CV and skills
-        cv_analysis = analyze_cv(cv_text, api_key)
-        if not cv_analysis:
-            raise Exception("Failed to analyze CV")
-        
+class AnalysisContext:
+    """CV-level analysis shared by every post generated from the same upload"""
+
+    def __init__(self, cv_text, cv_analysis, skills_analysis=None, content_ideas=None,
+                 industry_trends=None, news_results=None):
+        self.cv_text = cv_text
+        self.cv_analysis = cv_analysis
+        self.skills_analysis = skills_analysis
+        self.content_ideas = content_ideas
+        self.industry_trends = industry_trends
+        self.news_results = news_results if news_results is not None else []
+
+def build_news_query(cv_analysis):
+    """Build the news search query for a CV analysis"""
+    return f"{cv_analysis.get('industry_focus', '')} {' '.join(cv_analysis.get('key_areas_of_expertise', []))}"
+
+def build_analysis_context(cv_text, api_key=None, cv_analysis=None):
+    """Run the CV-level analysis once so that post generation can reuse it.
+
+    Pass an existing ``cv_analysis`` to only fetch the skills from the profile call.
+    Returns None if the CV analysis fails.
+    """
+    if cv_analysis is None:
+        profile = analyze_cv_profile(cv_text, api_key)
+        if not profile:
+            return None
+        cv_analysis = profile.analysis.to_dict()
+        skills_analysis = profile.skills.to_dict()
+    else:
         skills_analysis = analyze_cv_skills(cv_text, api_key)
         if not skills_analysis:
-            print("Warning: Detailed skills analysis failed, continuing with basic analysis")
-
-        # Generate content ideas and analyze industry trends
-        content_ideas = generate_content_ideas(cv_analysis, api_key)
-        industry_trends = analyze_industry_trends(
-            cv_analysis.get('industry_focus', ''),
-            ', '.join(cv_analysis.get('key_areas_of_expertise', [])),
-            api_key
-        )
+            logger.warning("Detailed skills analysis failed, continuing with basic analysis")
+
+    content_ideas = generate_content_ideas(cv_analysis, api_key)
+    industry_trends = analyze_industry_trends(
+        cv_analysis.get('industry_focus', ''),
+        ', '.join(cv_analysis.get('key_areas_of_expertise', [])),
+        api_key
+    )
+    news_results = search_news(build_news_query(cv_analysis))
+
+    return AnalysisContext(
+        cv_text,
+        cv_analysis,
+        skills_analysis=skills_analysis,
+        content_ideas=content_ideas,
+        industry_trends=industry_trends,
+        news_results=news_results
+    )
+
+# Enhancement applied to the base content of each post type
+ENHANCEMENT_MAPPING = {
+    'achievement': 'storytelling',
+    'skill_highlight': 'problem_solution',
+    'career_journey': 'storytelling',
+    'industry_insight': 'thought_leadership'
+}
+
+def _post_prompts(context):
+    cv_analysis = context.cv_analysis
+    skills_analysis = budget_text(compact_json(context.skills_analysis or {}), 'skills_context')
+    industry_trends = budget_text(context.industry_trends, 'industry_trends')
+    news_results = compact_json(budget_items(context.news_results, 'news'))
+
+    # Define base prompt based on post type
+    prompts = {
+        'achievement': f"""Create a LinkedIn post sharing a learning experience or achievement in {cv_analysis.get('key_areas_of_expertise', '')}.
+                         Focus on the lessons learned and how they might help others. Include specific examples but maintain humility.
+
+                         Skills Context:
+                         {skills_analysis}
+
+                         Industry Trends:
+                         {industry_trends}""",
+
+        'skill_highlight': f"""Create a LinkedIn post discussing expertise in {cv_analysis.get('technical_skills', '')}.
+                             Focus on how these skills can help solve common challenges. Share practical insights rather than self-promotion.
+
+                             Detailed Skills Analysis:
+                             {skills_analysis}""",
+
+        'career_journey': f"""Create a reflective LinkedIn post about experiences in {cv_analysis.get('industry_focus', '')}.
+                            Share honest insights about challenges faced and lessons learned. Keep the tone authentic and humble.
+
+                            Career Context:
+                            {cv_analysis.get('notable_achievements', '')}""",
+
+        'industry_insight': f"""Create a thoughtful post about trends in {cv_analysis.get('industry_focus', '')}.
+                              Share observations and insights while encouraging discussion and different perspectives.
+
+                              Industry Analysis:
+                              {industry_trends}
+
+                              Current Industry News:
+                              {news_results}"""
+    }
+    return prompts
+
+def _post_system_prompt(context, tone):
+    cv_analysis = context.cv_analysis
+    content_ideas = compact_json(context.content_ideas)
+
+    return f"""You are a professional LinkedIn content creator writing as a {cv_analysis.get('career_level', '')} professional in {cv_analysis.get('industry_focus', '')}.
+    Your task is to create an engaging post in a {tone} tone that shares valuable insights from your experience in {', '.join(cv_analysis.get('key_areas_of_expertise', []))}.
+
+    Writing Guidelines:
+    - Write in first person
+    - Keep the post between 150-300 words
+    - Include 3-5 relevant hashtags
+    - Be authentic and humble
+    - Focus on helping others
+    - Encourage discussion
+    - Share practical insights
+    - Acknowledge learning is continuous
+    - Avoid self-promotion or boasting
+    - Reference industry trends where relevant
+
+    Content Ideas for Reference:
+    {content_ideas}"""
+
+def _base_post_request(context, post_type, tone):
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": _post_system_prompt(context, tone)},
+            {"role": "user", "content": _post_prompts(context)[post_type]}
+        ],
+        temperature=0.7,
+        max_tokens=500
+    )
+
+def _multi_post_request(context, post_types):
+    prompts = _post_prompts(context)
+    sections = '\n\n'.join(
+        f"### {post_type['type']} (tone: {post_type['tone']})\n{prompts[post_type['type']]}"
+        for post_type in post_types
+    )
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": _post_system_prompt(context, "the tone given for each post")},
+            {"role": "user", "content": f"Write one post for each of the following, keyed by the post type:\n\n{sections}"}
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "linkedin_posts", "strict": True, "schema": base_posts_schema(post_types)}
+        },
+        temperature=0.7,
+        max_tokens=500 * len(post_types)
+    )
+
+def _multi_enhance_request(base_posts, post_types):
+    sections = '\n\n'.join(
+        f"### {post_type['type']}\nInstruction: {ENHANCEMENT_PROMPTS[ENHANCEMENT_MAPPING[post_type['type']]]}\n"
+        f"Content:\n{base_posts[post_type['type']]}"
+        for post_type in post_types
+    )
+    engagement_prompt = """For each enhanced post, also write engagement suggestions covering:
+    1. 3 Conversation-Starting Questions
+    2. 2 Call-to-Action Ideas
+    3. 3 Follow-up Comment Templates
+    4. Relevant Industry Statistics
+    5. Engagement Hook Ideas
 
-        # Search for relevant news
-        news_results = search_news(
-            f"{cv_analysis.get('industry_focus', '')} {' '.join(cv_analysis.get('key_areas_of_expertise', []))}"
-        )
+    Focus on fostering meaningful professional discussions."""
+
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are a professional content editor and social media engagement specialist specializing in LinkedIn posts."},
+            {"role": "user", "content": f"Apply each post's instruction to its content.\n\n{sections}\n\n{engagement_prompt}"}
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "enhanced_linkedin_posts", "strict": True, "schema": enhanced_posts_schema(post_types)}
+        },
+        temperature=0.7,
+        max_tokens=1600 * len(post_types)
+    )
+
+@instrumented
+def generate_multi_posts(context, post_types, api_key=None):
+    """Write every post type with one call, then enhance them and add engagement with a second.
+
+    Returns ``{'posts': {type: post result}, 'base': {type: base text}}``. Types
+    missing from ``posts`` failed validation and should go through the per-post
+    path, reusing their ``base`` text when it is there.
+    """
+    client = get_openai_client(api_key)
+    posts = {}
+    base_posts = {}
+    try:
+        response = scheduler.create(client, **_multi_post_request(context, post_types))
+        base_posts = parse_base_posts(response.choices[0].message.content, post_types)
+
+        enhance_types = [post_type for post_type in post_types if post_type['type'] in base_posts]
+        if enhance_types:
+            response = scheduler.create(client, **_multi_enhance_request(base_posts, enhance_types))
+            enhanced = parse_enhanced_posts(response.choices[0].message.content, enhance_types)
+            for post_type, (content, engagement) in enhanced.items():
+                posts[post_type] = _post_result(context, content, engagement)
+    except Exception as e:
+        _report_error("Error in multi-post generation", e)
+
+    return {'posts': posts, 'base': base_posts}
+
+def _post_result(context, enhanced_content, engagement_content):
+    return {
+        'content': enhanced_content,
+        'engagement_suggestions': engagement_content,
+        'industry_trends': context.industry_trends,
+        'skills_analysis': context.skills_analysis,
+        'related_news': context.news_results
+    }
 
-        # Define base prompt based on post type
-        prompts = {
-            'achievement': f"""Create a LinkedIn post sharing a learning experience or achievement in {cv_analysis.get('key_areas_of_expertise', '')}.
-                             Focus on the lessons learned and how they might help others. Include specific examples but maintain humility.
-                             
-                             Skills Context:
-                             {skills_analysis}
-                             
-                             Industry Trends:
-                             {industry_trends}""",
-            
-            'skill_highlight': f"""Create a LinkedIn post discussing expertise in {cv_analysis.get('technical_skills', '')}.
-                                 Focus on how these skills can help solve common challenges. Share practical insights rather than self-promotion.
-                                 
-                                 Detailed Skills Analysis:
-                                 {skills_analysis}""",
-            
-            'career_journey': f"""Create a reflective LinkedIn post about experiences in {cv_analysis.get('industry_focus', '')}.
-                                Share honest insights about challenges faced and lessons learned. Keep the tone authentic and humble.
-                                
-                                Career Context:
-                                {cv_analysis.get('notable_achievements', '')}""",
-            
-            'industry_insight': f"""Create a thoughtful post about trends in {cv_analysis.get('industry_focus', '')}.
-                                  Share observations and insights while encouraging discussion and different perspectives.
-                                  
-                                  Industry Analysis:
-                                  {industry_trends}
-                                  
-                                  Current Industry News:
-                                  {json.dumps(news_results, indent=2)}"""
-        }
-
-        system_prompt = f"""You are a professional LinkedIn content creator writing as a {cv_analysis.get('career_level', '')} professional in {cv_analysis.get('industry_focus', '')}.
-        Your task is to create an engaging post in a {tone} tone that shares valuable insights from your experience in {', '.join(cv_analysis.get('key_areas_of_expertise', []))}.
-        
-        Writing Guidelines:
-        - Write in first person
-        - Keep the post between 150-300 words
-        - Include 3-5 relevant hashtags
-        - Be authentic and humble
-        - Focus on helping others
-        - Encourage discussion
-        - Share practical insights
-        - Acknowledge learning is continuous
-        - Avoid self-promotion or boasting
-        - Reference industry trends where relevant
-        
-        Content Ideas for Reference:
-        {json.dumps(content_ideas, indent=2)}"""
+@instrumented
+def generate_linkedin_content(cv_text, post_type, tone, api_key=None, context=None, on_delta=None, base_content=None):
+    """Generate LinkedIn content based on CV analysis and current trends.
+
+    ``context`` is an ``AnalysisContext`` built once per CV; when omitted the
+    analysis is run here, which costs five extra model calls and a news fetch.
+    When ``on_delta(phase, text)`` is given, the base and enhancement calls are
+    streamed and their text is forwarded as it arrives (phase is 'base' or 'enhanced').
+    An already written ``base_content`` skips the base generation call.
+    """
+    client = get_openai_client(api_key)
+    try:
+        if context is None:
+            context = build_analysis_context(cv_text, api_key)
+            if not context:
+                raise Exception("Failed to analyze CV")
 
         # Generate base content
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompts[post_type]}
-            ],
-            temperature=0.7,
-            max_tokens=500
-        )
-        
-        base_content = response.choices[0].message.content.strip()
+        if base_content:
+            base_content = base_content.strip()
+        else:
+            request = _base_post_request(context, post_type, tone)
+            if on_delta:
+                base_content = _streamed_completion(client, request, lambda text: on_delta('base', text)).strip()
+            else:
+                response = scheduler.create(client, **request)
+                base_content = response.choices[0].message.content.strip()
 
         # Enhance the content based on post type
-        enhancement_mapping = {
-            'achievement': 'storytelling',
-            'skill_highlight': 'problem_solution',
-            'career_journey': 'storytelling',
-            'industry_insight': 'thought_leadership'
-        }
-        
-        enhanced_content = enhance_post_content(base_content, enhancement_mapping[post_type], api_key)
+        enhanced_content = enhance_post_content(
+            base_content,
+            ENHANCEMENT_MAPPING[post_type],
+            api_key,
+            on_delta=(lambda text: on_delta('enhanced', text)) if on_delta else None
+        )
         if not enhanced_content:
             enhanced_content = base_content
 
         # Generate engagement prompts
         engagement_content = generate_engagement_prompts(enhanced_content, api_key)
 
-        return {
-            'content': enhanced_content,
-            'engagement_suggestions': engagement_content,
-            'industry_trends': industry_trends,
-            'skills_analysis': skills_analysis,
-            'related_news': news_results
-        }
+        return _post_result(context, enhanced_content, engagement_content)
 
     except Exception as e:
-        print(f"Error generating content: {str(e)}")
-        import traceback
-        print("Traceback:", traceback.format_exc())
+        _report_error("Error generating content", e, exc_info=True)
         return f"Error generating {post_type} post. Please try again."
 
-def analyze_industry_trends(industry, expertise, api_key=None):
-
-    client = get_openai_client(api_key)
-
-    """Generate industry trend analysis and recommendations"""
+def _industry_trends_request(industry, expertise):
+    # Without expertise the analysis only depends on the industry, so it is shared
+    # (through the result cache) by every CV in that industry
+    expertise_line = f"\n    Consider the expertise in: {expertise}" if expertise else ""
     trend_prompt = f"""Analyze current trends in {industry} focusing on:
     1. Emerging Technologies
     2. Market Challenges
     3. Growth Opportunities
     4. Skills in Demand
     5. Industry Predictions
-    
-    Consider the expertise in: {expertise}
+{expertise_line}
     Provide actionable insights for content creation."""
 
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are an industry analyst specializing in market trends and professional development."},
+            {"role": "user", "content": trend_prompt}
+        ],
+        temperature=0.8,
+        max_tokens=1000
+    )
+
+@instrumented
+def analyze_industry_trends(industry, expertise, api_key=None):
+    """Generate industry trend analysis and recommendations"""
+    client = get_openai_client(api_key)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=[
-                {"role": "system", "content": "You are an industry analyst specializing in market trends and professional development."},
-                {"role": "user", "content": trend_prompt}
-            ],
-            temperature=0.8,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content
+        return _cached_completion(client, _industry_trends_request(industry, expertise), 'industry_trends')
     except Exception as e:
-        print(f"Error in trend analysis: {str(e)}")
+        _report_error("Error in trend analysis", e)
         return None
 
-def generate_content_calendar(cv_analysis, timeframe=30, api_key=None):
-    """Generate a content calendar with post ideas"""
-
-    client = get_openai_client(api_key)
+def _content_calendar_request(cv_analysis, timeframe):
     calendar_prompt = f"""Create a {timeframe}-day LinkedIn content calendar based on:
     - Expertise: {cv_analysis.get('key_areas_of_expertise', [])}
     - Industry: {cv_analysis.get('industry_focus', '')}
@@ -468,24 +534,28 @@ def generate_content_calendar(cv_analysis, timeframe=30, api_key=None):
 
     Format as structured JSON."""
 
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are a social media strategist specializing in professional content planning."},
+            {"role": "user", "content": calendar_prompt}
+        ],
+        temperature=0.8,
+        max_tokens=1500
+    )
+
+@instrumented
+def generate_content_calendar(cv_analysis, timeframe=30, api_key=None):
+    """Generate a content calendar with post ideas"""
+    client = get_openai_client(api_key)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=[
-                {"role": "system", "content": "You are a social media strategist specializing in professional content planning."},
-                {"role": "user", "content": calendar_prompt}
-            ],
-            temperature=0.8,
-            max_tokens=1500
-        )
-        return response.choices[0].message.content
+        return _cached_completion(client, _content_calendar_request(cv_analysis, timeframe), 'content_calendar')
     except Exception as e:
-        print(f"Error generating calendar: {str(e)}")
+        _report_error("Error generating calendar", e)
         return None
 
-def generate_engagement_prompts(post_content, api_key=None):
-    """Generate engagement prompts and conversation starters"""
-    client = get_openai_client(api_key)
+def _engagement_prompts_request(post_content):
     prompt = f"""For this LinkedIn post:
     {post_content}
 
@@ -498,43 +568,58 @@ def generate_engagement_prompts(post_content, api_key=None):
 
     Focus on fostering meaningful professional discussions."""
 
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are a social media engagement specialist focusing on professional networking."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=800
+    )
+
+@instrumented
+def generate_engagement_prompts(post_content, api_key=None):
+    """Generate engagement prompts and conversation starters"""
+    client = get_openai_client(api_key)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=[
-                {"role": "system", "content": "You are a social media engagement specialist focusing on professional networking."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=800
-        )
+        response = scheduler.create(client, **_engagement_prompts_request(post_content))
         return response.choices[0].message.content
     except Exception as e:
-        print(f"Error generating engagement prompts: {str(e)}")
+        _report_error("Error generating engagement prompts", e)
         return None
 
-def enhance_post_content(content, enhancement_type, api_key=None):
-    """Enhance post content with specific improvements"""
+ENHANCEMENT_PROMPTS = {
+    'storytelling': "Transform this content into a compelling professional story with a clear narrative arc.",
+    'data_driven': "Enhance this content with relevant industry statistics and data points.",
+    'thought_leadership': "Elevate this content to establish thought leadership with expert insights.",
+    'problem_solution': "Restructure this content into a clear problem-solution format.",
+    'case_study': "Transform this content into a mini case study format."
+}
+
+def _enhance_post_request(content, enhancement_type):
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are a professional content editor specializing in LinkedIn posts."},
+            {"role": "user", "content": f"{ENHANCEMENT_PROMPTS[enhancement_type]}\n\nContent:\n{content}"}
+        ],
+        temperature=0.7,
+        max_tokens=800
+    )
+
+@instrumented
+def enhance_post_content(content, enhancement_type, api_key=None, on_delta=None):
+    """Enhance post content with specific improvements, streaming it to ``on_delta`` if given"""
     client = get_openai_client(api_key)
-    enhancement_prompts = {
-        'storytelling': "Transform this content into a compelling professional story with a clear narrative arc.",
-        'data_driven': "Enhance this content with relevant industry statistics and data points.",
-        'thought_leadership': "Elevate this content to establish thought leadership with expert insights.",
-        'problem_solution': "Restructure this content into a clear problem-solution format.",
-        'case_study': "Transform this content into a mini case study format."
-    }
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=[
-                {"role": "system", "content": "You are a professional content editor specializing in LinkedIn posts."},
-                {"role": "user", "content": f"{enhancement_prompts[enhancement_type]}\n\nContent:\n{content}"}
-            ],
-            temperature=0.7,
-            max_tokens=800
-        )
+        request = _enhance_post_request(content, enhancement_type)
+        if on_delta:
+            return _streamed_completion(client, request, on_delta)
+        response = scheduler.create(client, **request)
         return response.choices[0].message.content
     except Exception as e:
-        print(f"Error enhancing content: {str(e)}")
-        return None
\ No newline at end of file
+        _report_error("Error enhancing content", e)
+        return None
@@ -0,0 +1,259 @@
+"""Async counterparts of the helpers in openai_helper, built on AsyncOpenAI.
+
+Prompts and response parsing are shared with the sync module; only the
+transport differs, so both stay in step when a prompt changes.
+"""
+import asyncio
+import logging
+from . import openai_helper
+from .client_registry import get_pooled_async_client, hash_api_key
+from .cv_profile import parse_cv_profile
+from .metrics import instrumented
+from .multi_post import parse_base_posts, parse_enhanced_posts
+from .rate_limiter import scheduler
+from .result_cache import result_cache
+from .single_flight import completions
+from .openai_helper import (
+    AnalysisContext,
+    ENHANCEMENT_MAPPING,
+    build_news_query,
+    similar_cvs,
+    validate_api_key,
+    _report_error,
+    _base_post_request,
+    _completion_flight_key,
+    _content_calendar_request,
+    _content_ideas_request,
+    _cv_profile_request,
+    _engagement_prompts_request,
+    _enhance_post_request,
+    _industry_trends_request,
+    _multi_enhance_request,
+    _multi_post_request,
+    _parse_content_ideas,
+    _post_result,
+)
+
+logger = logging.getLogger(__name__)
+
+def get_async_openai_client(api_key=None):
+    """Return the pooled AsyncOpenAI client for an API key on the running event loop"""
+    validate_api_key(api_key)
+
+    try:
+        return get_pooled_async_client(api_key)
+    except Exception as e:
+        logger.error("Error creating AsyncOpenAI client: %s", e)
+        raise ValueError(f"Failed to initialize OpenAI client: {str(e)}")
+
+async def _cached_completion(client, request, cache_namespace):
+    """Return the message content for a request, served from the result cache when possible"""
+    content = await result_cache.aget(cache_namespace, request)
+    if content is not None:
+        return content
+
+    async def complete():
+        response = await scheduler.acreate(client, **request)
+        content = response.choices[0].message.content
+        await result_cache.aset(cache_namespace, request, content)
+        return content
+
+    return await completions.ado(_completion_flight_key(client, request, cache_namespace), complete)
+
+async def _streamed_completion(client, request, on_delta):
+    """Send a streaming request, passing each content delta to ``on_delta``; returns the full text"""
+    parts = []
+    async with scheduler.astream(client, **request) as chunks:
+        async for chunk in chunks:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+    return ''.join(parts)
+
+async def search_news(query, num_results=5):
+    """Search for relevant news articles without blocking the event loop"""
+    return await asyncio.to_thread(openai_helper.search_news, query, num_results)
+
+@instrumented
+async def analyze_cv_profile(cv_text, api_key=None):
+    """Analyze the CV and categorize its skills in one structured-output call; returns a CVProfile"""
+    client = get_async_openai_client(api_key)
+
+    try:
+        similar = await similar_cvs.alookup(cv_text, hash_api_key(api_key))
+        if similar is not None:
+            return parse_cv_profile(similar[0])
+        content = await _cached_completion(client, _cv_profile_request(cv_text), 'cv_profile')
+        profile = parse_cv_profile(content)
+        await similar_cvs.aadd(cv_text, content, hash_api_key(api_key))
+        return profile
+    except Exception as e:
+        _report_error("Error in analyze_cv_profile", e)
+        return None
+
+async def analyze_cv(cv_text, api_key=None):
+    """Analyze CV to extract key information and specialties"""
+    profile = await analyze_cv_profile(cv_text, api_key)
+    return profile.analysis.to_dict() if profile else None
+
+async def analyze_cv_skills(cv_text, api_key=None):
+    """Analyze CV skills with detailed categorization"""
+    profile = await analyze_cv_profile(cv_text, api_key)
+    return profile.skills.to_dict() if profile else None
+
+@instrumented
+async def generate_content_ideas(cv_analysis, api_key=None):
+    """Generate content ideas based on CV analysis"""
+    client = get_async_openai_client(api_key)
+
+    try:
+        content = await _cached_completion(client, _content_ideas_request(cv_analysis), 'content_ideas')
+        return _parse_content_ideas(content)
+    except Exception as e:
+        _report_error("Error generating ideas", e)
+        return None
+
+@instrumented
+async def analyze_industry_trends(industry, expertise, api_key=None):
+    """Generate industry trend analysis and recommendations"""
+    client = get_async_openai_client(api_key)
+
+    try:
+        return await _cached_completion(client, _industry_trends_request(industry, expertise), 'industry_trends')
+    except Exception as e:
+        _report_error("Error in trend analysis", e)
+        return None
+
+@instrumented
+async def generate_content_calendar(cv_analysis, timeframe=30, api_key=None):
+    """Generate a content calendar with post ideas"""
+    client = get_async_openai_client(api_key)
+
+    try:
+        return await _cached_completion(client, _content_calendar_request(cv_analysis, timeframe), 'content_calendar')
+    except Exception as e:
+        _report_error("Error generating calendar", e)
+        return None
+
+@instrumented
+async def generate_engagement_prompts(post_content, api_key=None):
+    """Generate engagement prompts and conversation starters"""
+    client = get_async_openai_client(api_key)
+
+    try:
+        response = await scheduler.acreate(client, **_engagement_prompts_request(post_content))
+        return response.choices[0].message.content
+    except Exception as e:
+        _report_error("Error generating engagement prompts", e)
+        return None
+
+@instrumented
+async def enhance_post_content(content, enhancement_type, api_key=None, on_delta=None):
+    """Enhance post content with specific improvements, streaming it to ``on_delta`` if given"""
+    client = get_async_openai_client(api_key)
+
+    try:
+        request = _enhance_post_request(content, enhancement_type)
+        if on_delta:
+            return await _streamed_completion(client, request, on_delta)
+        response = await scheduler.acreate(client, **request)
+        return response.choices[0].message.content
+    except Exception as e:
+        _report_error("Error enhancing content", e)
+        return None
+
+async def build_analysis_context(cv_text, api_key=None, cv_analysis=None):
+    """Run the CV-level analysis once, issuing the independent calls concurrently"""
+    if cv_analysis is None:
+        profile = await analyze_cv_profile(cv_text, api_key)
+        if not profile:
+            return None
+        cv_analysis = profile.analysis.to_dict()
+        skills_analysis = profile.skills.to_dict()
+    else:
+        skills_analysis = await analyze_cv_skills(cv_text, api_key)
+
+    content_ideas, industry_trends, news_results = await asyncio.gather(
+        generate_content_ideas(cv_analysis, api_key),
+        analyze_industry_trends(
+            cv_analysis.get('industry_focus', ''),
+            ', '.join(cv_analysis.get('key_areas_of_expertise', [])),
+            api_key
+        ),
+        search_news(build_news_query(cv_analysis))
+    )
+
+    return AnalysisContext(
+        cv_text,
+        cv_analysis,
+        skills_analysis=skills_analysis,
+        content_ideas=content_ideas,
+        industry_trends=industry_trends,
+        news_results=news_results
+    )
+
+@instrumented
+async def generate_linkedin_content(cv_text, post_type, tone, api_key=None, context=None, on_delta=None, base_content=None):
+    """Generate LinkedIn content based on CV analysis and current trends"""
+    client = get_async_openai_client(api_key)
+    try:
+        if context is None:
+            context = await build_analysis_context(cv_text, api_key)
+            if not context:
+                raise Exception("Failed to analyze CV")
+
+        if base_content:
+            base_content = base_content.strip()
+        else:
+            request = _base_post_request(context, post_type, tone)
+            if on_delta:
+                base_content = (await _streamed_completion(client, request, lambda text: on_delta('base', text))).strip()
+            else:
+                response = await scheduler.acreate(client, **request)
+                base_content = response.choices[0].message.content.strip()
+
+        enhanced_content = await enhance_post_content(
+            base_content,
+            ENHANCEMENT_MAPPING[post_type],
+            api_key,
+            on_delta=(lambda text: on_delta('enhanced', text)) if on_delta else None
+        )
+        if not enhanced_content:
+            enhanced_content = base_content
+
+        engagement_content = await generate_engagement_prompts(enhanced_content, api_key)
+
+        return _post_result(context, enhanced_content, engagement_content)
+
+    except Exception as e:
+        _report_error("Error generating content", e)
+        return f"Error generating {post_type} post. Please try again."
+
+@instrumented
+async def generate_multi_posts(context, post_types, api_key=None):
+    """Async version of openai_helper.generate_multi_posts"""
+    client = get_async_openai_client(api_key)
+    posts = {}
+    base_posts = {}
+    try:
+        response = await scheduler.acreate(client, **_multi_post_request(context, post_types))
+        base_posts = parse_base_posts(response.choices[0].message.content, post_types)
+
+        enhance_types = [post_type for post_type in post_types if post_type['type'] in base_posts]
+        if enhance_types:
+            response = await scheduler.acreate(client, **_multi_enhance_request(base_posts, enhance_types))
+            enhanced = parse_enhanced_posts(response.choices[0].message.content, enhance_types)
+            for post_type, (content, engagement) in enhanced.items():
+                posts[post_type] = _post_result(context, content, engagement)
+    except Exception as e:
+        _report_error("Error in multi-post generation", e)
+
+    return {'posts': posts, 'base': base_posts}
+
+async def list_models(api_key):
+    """List the models available to a key; raises if the key is rejected"""
+    client = get_async_openai_client(api_key)
+    return await client.models.list()
@@ -0,0 +1,134 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import PyPDF2
+from django.conf import settings
+from . import metrics, tracing
+from .result_cache import MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+class PDFExtractionError(ValueError):
+    """Raised when an uploaded PDF is rejected or cannot be read"""
+
+class ExtractionResult:
+    """Extracted CV text plus per-page extraction timings (in seconds)"""
+
+    def __init__(self, text, page_count, page_timings, total_time, sha256, cached=False):
+        self.text = text
+        self.page_count = page_count
+        self.page_timings = page_timings
+        self.total_time = total_time
+        self.sha256 = sha256
+        self.cached = cached
+
+_text_cache = None
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_text_cache():
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = MemoryBackend(settings.PDF_TEXT_CACHE_MAX_ENTRIES, settings.PDF_TEXT_CACHE_TTL)
+    return _text_cache
+
+def _get_executor():
+    # page.extract_text() is pure Python and holds the GIL, so large PDFs are
+    # split across processes rather than threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+def _extract_pages(data, start, stop):
+    """Extract pages ``start:stop``; returns a list of ``(text, seconds)``"""
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    pages = []
+    for page_number in range(start, stop):
+        started = time.perf_counter()
+        text = reader.pages[page_number].extract_text() or ''
+        pages.append((text, time.perf_counter() - started))
+    return pages
+
+def _extract_parallel(data, page_count):
+    global _executor
+    workers = settings.PDF_EXTRACTION_WORKERS
+    chunk_size = -(-page_count // workers)  # Ceiling division
+    ranges = [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+    try:
+        executor = _get_executor()
+        futures = [executor.submit(_extract_pages, data, start, stop) for start, stop in ranges]
+        return [page for future in futures for page in future.result()]
+    except BrokenProcessPool as e:
+        logger.warning("PDF extraction pool failed, extracting serially: %s", e)
+        with _executor_lock:
+            _executor = None
+        return _extract_pages(data, 0, page_count)
+
+def extract_cv_text(data):
+    """Extract text from PDF bytes, enforcing the size/page limits and caching by file hash"""
+    with tracing.span('pdf.extract', bytes=len(data)) as span:
+        result = _extract_cv_text(data)
+        span.set(pages=result.page_count, cached=result.cached)
+        return result
+
+def _extract_cv_text(data):
+    if len(data) > settings.PDF_MAX_BYTES:
+        raise PDFExtractionError(f"PDF is larger than {settings.PDF_MAX_BYTES // (1024 * 1024)} MB")
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    cached = _get_text_cache().get(sha256)
+    if cached is not None:
+        text, page_count = cached
+        metrics.PDF_EXTRACTION_SECONDS.observe(0.0, mode='cached')
+        return ExtractionResult(text, page_count, [], 0.0, sha256, cached=True)
+
+    started = time.perf_counter()
+    try:
+        page_count = len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+    except Exception as e:
+        raise PDFExtractionError(str(e))
+
+    if page_count > settings.PDF_MAX_PAGES:
+        raise PDFExtractionError(f"PDF has {page_count} pages; the limit is {settings.PDF_MAX_PAGES}")
+
+    mode = 'parallel' if page_count >= settings.PDF_PARALLEL_MIN_PAGES and settings.PDF_EXTRACTION_WORKERS > 1 else 'serial'
+    try:
+        if mode == 'parallel':
+            pages = _extract_parallel(data, page_count)
+        else:
+            pages = _extract_pages(data, 0, page_count)
+    except PDFExtractionError:
+        raise
+    except Exception as e:
+        raise PDFExtractionError(str(e))
+
+    # Join once instead of growing a string page by page; the form feeds let
+    # prompt_budget.normalize_cv_text tell page headers and footers from body text
+    text = '\f'.join(page_text for page_text, _ in pages)
+    result = ExtractionResult(
+        text,
+        page_count,
+        [seconds for _, seconds in pages],
+        time.perf_counter() - started,
+        sha256
+    )
+    _get_text_cache().set(sha256, (text, page_count))
+    metrics.PDF_EXTRACTION_SECONDS.observe(result.total_time, mode=mode)
+    metrics.PDF_PAGES.observe(page_count)
+    return result
+
+def extract_uploaded_cv(cv_file):
+    """Extract text from an uploaded CV file, checking its size before reading it"""
+    if cv_file.size is not None and cv_file.size > settings.PDF_MAX_BYTES:
+        raise PDFExtractionError(f"PDF is larger than {settings.PDF_MAX_BYTES // (1024 * 1024)} MB")
+    return extract_cv_text(cv_file.read())
@@ -0,0 +1,367 @@
+import asyncio
+import contextvars
+import inspect
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.conf import settings
+from . import metrics, openai_helper, openai_helper_async, tracing
+from .openai_helper import AnalysisContext
+from .warmer import industry_profile, profile_expertise, profile_news_query, warmer
+
+logger = logging.getLogger(__name__)
+
+POST_TYPES = [
+    {'type': 'achievement', 'tone': 'professional'},
+    {'type': 'skill_highlight', 'tone': 'confident'},
+    {'type': 'career_journey', 'tone': 'storytelling'},
+    {'type': 'industry_insight', 'tone': 'thought_leadership'},
+]
+
+# Caps the number of stages running at once across every request in this process
+_process_slots = threading.BoundedSemaphore(settings.GENERATION_MAX_CONCURRENT_STAGES)
+
+# asyncio semaphores are bound to a loop, so the async cap is kept per event loop
+# (under ASGI there is a single loop for the whole process)
+_async_process_slots = weakref.WeakKeyDictionary()
+
+class Stage:
+    """A unit of pipeline work that runs once all of its dependencies have finished"""
+
+    def __init__(self, name, func, depends_on=(), required=None):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        # Error message used to fail the stage when it returns an empty result
+        self.required = required
+
+    def check(self, result):
+        if self.required and not result:
+            raise StageFailed(self.required)
+        return result
+
+class StageFailed(Exception):
+    """Raised by a stage whose result is unusable by the stages depending on it"""
+
+class StageSkipped(Exception):
+    """Recorded for a stage that did not run because a dependency failed"""
+
+class StageCancelled(StageSkipped):
+    """Recorded for a stage that did not run because the pipeline was cancelled"""
+
+def _run_stage(stage, dependencies):
+    queued = time.perf_counter()
+    with _process_slots:
+        started = time.perf_counter()
+        metrics.STAGE_QUEUE_SECONDS.observe(started - queued, stage=stage.name)
+        try:
+            with tracing.span(f'stage:{stage.name}', queued_ms=round((started - queued) * 1000, 3)):
+                return stage.check(stage.func(dependencies))
+        except Exception:
+            metrics.STAGE_ERRORS.inc(stage=stage.name)
+            raise
+        finally:
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage.name)
+
+def _index_stages(stages):
+    pending = {stage.name: stage for stage in stages}
+    for stage in pending.values():
+        for dependency in stage.depends_on:
+            if dependency not in pending:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+    return pending
+
+def _start_ready_stages(pending, results, errors, start):
+    # Keep scanning until nothing changes so that skips cascade
+    changed = True
+    while changed:
+        changed = False
+        for name, stage in list(pending.items()):
+            failed = [d for d in stage.depends_on if d in errors]
+            if failed:
+                errors[name] = StageSkipped(f"Skipped because '{failed[0]}' failed")
+            elif all(d in results for d in stage.depends_on):
+                start(stage, {d: results[d] for d in stage.depends_on})
+            else:
+                continue
+            del pending[name]
+            changed = True
+
+def run_stages(stages, max_workers=None, on_stage_done=None, cancel_event=None):
+    """Run stages concurrently, starting each one as soon as its dependencies are done.
+
+    Each stage function receives a dict mapping its dependency names to their
+    results. Returns ``(results, errors)`` dicts keyed by stage name; a stage
+    whose dependency failed is not run and gets a ``StageSkipped`` error.
+    ``on_stage_done(name, result, error)`` is called as each stage that ran finishes.
+    Once ``cancel_event`` is set no further stages start; running ones finish.
+    """
+    if max_workers is None:
+        max_workers = settings.GENERATION_MAX_WORKERS_PER_REQUEST
+
+    pending = _index_stages(stages)
+
+    results = {}
+    errors = {}
+    running = {}
+
+    def start(stage, dependencies):
+        # Run in a copy of the caller's context so request-scoped context vars reach the stage
+        context = contextvars.copy_context()
+        running[executor.submit(context.run, _run_stage, stage, dependencies)] = stage.name
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            if cancel_event is not None and cancel_event.is_set():
+                for name in pending:
+                    errors[name] = StageCancelled('Pipeline cancelled')
+                pending.clear()
+
+            _start_ready_stages(pending, results, errors, start)
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Stage dependencies contain a cycle: {', '.join(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger.warning("Stage '%s' failed: %s", name, e)
+                    errors[name] = e
+                if on_stage_done:
+                    on_stage_done(name, results.get(name), errors.get(name))
+
+    return results, errors
+
+def _async_slots():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_process_slots:
+        _async_process_slots[loop] = asyncio.Semaphore(settings.GENERATION_MAX_CONCURRENT_ASYNC_STAGES)
+    return _async_process_slots[loop]
+
+async def _run_stage_async(stage, dependencies, request_slots):
+    queued = time.perf_counter()
+    async with request_slots, _async_slots():
+        started = time.perf_counter()
+        metrics.STAGE_QUEUE_SECONDS.observe(started - queued, stage=stage.name)
+        try:
+            with tracing.span(f'stage:{stage.name}', queued_ms=round((started - queued) * 1000, 3)):
+                result = stage.func(dependencies)
+                if inspect.isawaitable(result):
+                    result = await result
+                return stage.check(result)
+        except Exception:
+            metrics.STAGE_ERRORS.inc(stage=stage.name)
+            raise
+        finally:
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage.name)
+
+async def run_stages_async(stages, max_concurrency=None, on_stage_done=None):
+    """Async version of run_stages; stage functions may return awaitables."""
+    if max_concurrency is None:
+        max_concurrency = settings.GENERATION_MAX_WORKERS_PER_REQUEST
+
+    pending = _index_stages(stages)
+    request_slots = asyncio.Semaphore(max_concurrency)
+    results = {}
+    errors = {}
+    running = {}
+
+    def start(stage, dependencies):
+        running[asyncio.ensure_future(_run_stage_async(stage, dependencies, request_slots))] = stage.name
+
+    while pending or running:
+        _start_ready_stages(pending, results, errors, start)
+
+        if not running:
+            if pending:
+                raise ValueError(f"Stage dependencies contain a cycle: {', '.join(pending)}")
+            break
+
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            name = running.pop(task)
+            try:
+                results[name] = task.result()
+            except Exception as e:
+                logger.warning("Stage '%s' failed: %s", name, e)
+                errors[name] = e
+            if on_stage_done:
+                on_stage_done(name, results.get(name), errors.get(name))
+
+    return results, errors
+
+def format_post(post_type, post_data):
+    """Shape the output of generate_linkedin_content into a post entry"""
+    if isinstance(post_data, str):  # Error case
+        return {
+            'type': post_type,
+            'content': post_data,
+            'status': 'error'
+        }
+    return {
+        'type': post_type,
+        'content': post_data['content'],
+        'engagement_suggestions': post_data.get('engagement_suggestions'),
+        'industry_trends': post_data.get('industry_trends'),
+        'skills_analysis': post_data.get('skills_analysis'),
+        'related_news': post_data.get('related_news'),
+        'status': 'success'
+    }
+
+def generation_stages(helpers, cv_text, api_key, post_types=None, include_calendar=True, on_post_delta=None,
+                      multi_post=False):
+    """Build the stage graph for one CV.
+
+    ``helpers`` is either ``openai_helper`` or ``openai_helper_async``; both
+    expose the same functions, so the graph is shared by both runners. When
+    ``on_post_delta(post_type, phase, text)`` is given, post text is streamed to it.
+    Industry trends and news are asked for by the CV's normalized industry
+    profile (industry and areas of expertise), so CVs with the same profile,
+    e.g. in a batch or kept warm by the warmer, reuse one cached result.
+    With ``multi_post`` (ignored when streaming post text) all posts are written
+    and then enhanced by two batched calls; a post that fails validation falls
+    back to its own calls.
+    """
+    if post_types is None:
+        post_types = POST_TYPES
+
+    def industry_trends(deps):
+        profile = industry_profile(deps['cv_analysis'])
+        warmer.record(profile)
+        tracing.current_span().set(warm=warmer.is_warm(profile))
+        return helpers.analyze_industry_trends(profile[0], profile_expertise(profile), api_key)
+
+    def news(deps):
+        return helpers.search_news(profile_news_query(industry_profile(deps['cv_analysis'])))
+
+    stages = [
+        # One structured-output call yields both the CV analysis and the categorized skills
+        Stage('cv_profile', lambda deps: helpers.analyze_cv_profile(cv_text, api_key), required='Failed to analyze CV'),
+        Stage(
+            'cv_analysis',
+            lambda deps: deps['cv_profile'].analysis.to_dict(),
+            depends_on=['cv_profile'],
+            required='Failed to analyze CV'
+        ),
+        Stage('skills_analysis', lambda deps: deps['cv_profile'].skills.to_dict(), depends_on=['cv_profile']),
+        Stage(
+            'content_ideas',
+            lambda deps: helpers.generate_content_ideas(deps['cv_analysis'], api_key),
+            depends_on=['cv_analysis'],
+            required='Failed to generate content ideas'
+        ),
+        Stage('industry_trends', industry_trends, depends_on=['cv_analysis']),
+        Stage('news', news, depends_on=['cv_analysis']),
+        Stage(
+            'context',
+            lambda deps: AnalysisContext(
+                cv_text,
+                deps['cv_analysis'],
+                skills_analysis=deps['skills_analysis'],
+                content_ideas=deps['content_ideas'],
+                industry_trends=deps['industry_trends'],
+                news_results=deps['news']
+            ),
+            depends_on=['cv_analysis', 'skills_analysis', 'content_ideas', 'industry_trends', 'news']
+        ),
+    ]
+
+    if include_calendar:
+        stages.append(Stage(
+            'content_calendar',
+            lambda deps: helpers.generate_content_calendar(deps['cv_analysis'], api_key=api_key),
+            depends_on=['cv_analysis']
+        ))
+
+    multi_post = multi_post and not on_post_delta
+    if multi_post:
+        stages.append(Stage(
+            'multi_post',
+            lambda deps: helpers.generate_multi_posts(deps['context'], post_types, api_key),
+            depends_on=['context']
+        ))
+
+    def generate_post(deps, post_type):
+        base_content = None
+        if multi_post:
+            batch = deps['multi_post']
+            if post_type['type'] in batch['posts']:
+                return batch['posts'][post_type['type']]
+            base_content = batch['base'].get(post_type['type'])
+        return helpers.generate_linkedin_content(
+            cv_text,
+            post_type['type'],
+            post_type['tone'],
+            api_key=api_key,
+            context=deps['context'],
+            on_delta=(
+                (lambda phase, text: on_post_delta(post_type['type'], phase, text))
+                if on_post_delta else None
+            ),
+            base_content=base_content
+        )
+
+    for post_type in post_types:
+        stages.append(Stage(
+            f"post:{post_type['type']}",
+            lambda deps, post_type=post_type: generate_post(deps, post_type),
+            depends_on=['context', 'multi_post'] if multi_post else ['context']
+        ))
+
+    return stages
+
+def collect_generation(results, post_types=None):
+    """Turn stage results into the generation dict returned by run_generation"""
+    if post_types is None:
+        post_types = POST_TYPES
+
+    posts = []
+    for post_type in post_types:
+        name = f"post:{post_type['type']}"
+        if name in results:
+            posts.append(format_post(post_type['type'], results[name]))
+        else:
+            posts.append(format_post(post_type['type'], f"Error generating {post_type['type']} post. Please try again."))
+
+    return {
+        'cv_analysis': results.get('cv_analysis'),
+        'content_ideas': results.get('content_ideas'),
+        'industry_trends': results.get('industry_trends'),
+        'skills_analysis': results.get('skills_analysis'),
+        'news': results.get('news', []),
+        'content_calendar': results.get('content_calendar'),
+        'posts': posts,
+    }
+
+def run_generation(cv_text, api_key, post_types=None, include_calendar=True, max_workers=None, on_stage_done=None,
+                   on_post_delta=None, cancel_event=None, multi_post=None):
+    """Run the full generation pipeline for one CV with independent stages in parallel.
+
+    Returns a dict with ``cv_analysis``, ``content_ideas``, ``industry_trends``,
+    ``skills_analysis``, ``news``, ``content_calendar`` and ``posts``. The
+    ``cv_analysis`` and ``content_ideas`` entries are None when those stages
+    failed; a failed post becomes an entry with ``status: 'error'``.
+    """
+    if multi_post is None:
+        multi_post = settings.GENERATION_MULTI_POST
+    stages = generation_stages(openai_helper, cv_text, api_key, post_types, include_calendar, on_post_delta,
+                               multi_post)
+    results, errors = run_stages(stages, max_workers=max_workers, on_stage_done=on_stage_done, cancel_event=cancel_event)
+    return collect_generation(results, post_types)
+
+async def run_generation_async(cv_text, api_key, post_types=None, include_calendar=True, max_concurrency=None,
+                               on_stage_done=None, on_post_delta=None, multi_post=None):
+    """Async version of run_generation using the AsyncOpenAI helpers"""
+    if multi_post is None:
+        multi_post = settings.GENERATION_MULTI_POST
+    stages = generation_stages(openai_helper_async, cv_text, api_key, post_types, include_calendar, on_post_delta,
+                               multi_post=multi_post)
+    results, errors = await run_stages_async(stages, max_concurrency=max_concurrency, on_stage_done=on_stage_done)
+    return collect_generation(results, post_types)
@@ -0,0 +1,169 @@
+import json
+import logging
+import re
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Prompt inputs are normalized and trimmed here before they reach a request
+# builder, so the request (and its cache key) only carries what the model needs.
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_estimate_logged = False
+
+# "Page 3", "page 3 of 5", "3 of 5", "3/5"; a bare number only counts at a page edge
+_PAGE_MARKER = re.compile(r'^(page\s*\d+(\s*(of|/)\s*\d+)?|\d+\s*(of|/)\s*\d+)$', re.IGNORECASE)
+_BARE_PAGE_NUMBER = re.compile(r'^\d{1,3}$')
+# Lines this close to the top or bottom of a page can be headers, footers or page numbers
+_PAGE_EDGE_LINES = 3
+_INLINE_WHITESPACE = re.compile(r'[ \t\f\v\u00a0]+')
+
+def load_encoding():
+    """Load the PROMPT_TOKEN_ENCODING tokenizer; returns it, or None when unset or unavailable.
+
+    Called once at startup (see apps.py), never from a request: tiktoken
+    downloads an encoding's data file on first use unless it is already in
+    TIKTOKEN_CACHE_DIR, which the Docker image prefetches.
+    """
+    global _encoding
+    name = settings.PROMPT_TOKEN_ENCODING
+    if not name:
+        return None
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(name)
+                logger.info("Loaded token encoding %s", name)
+            except Exception as e:
+                logger.warning("Token encoding %s unavailable, estimating token counts: %s", name, e)
+    return _encoding
+
+def _get_encoding():
+    """The loaded tokenizer, or None until (or unless) load_encoding succeeds"""
+    global _estimate_logged
+    if _encoding is None and not _estimate_logged:
+        _estimate_logged = True
+        logger.info("No token encoding loaded; estimating token counts at 4 characters per token")
+    return _encoding
+
+def count_tokens(text):
+    """Count the tokens in ``text``; falls back to ~4 characters per token"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def compact_json(value):
+    """Serialize a value for a prompt without indentation or padding"""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+def _page_lines(page):
+    lines = (_INLINE_WHITESPACE.sub(' ', line).strip() for line in page.split('\n'))
+    return [line for line in lines if line]
+
+def _edge_positions(index, page):
+    """Offsets of a line from the top and bottom of its page, where within _PAGE_EDGE_LINES"""
+    positions = []
+    if index < _PAGE_EDGE_LINES:
+        positions.append(('top', index))
+    if len(page) - 1 - index < _PAGE_EDGE_LINES:
+        positions.append(('bottom', len(page) - 1 - index))
+    return positions
+
+def normalize_cv_text(text):
+    """Collapse whitespace and drop page numbers and headers/footers repeated across pages.
+
+    Pages are separated by form feeds (see pdf_extraction). Only lines near a
+    page edge are candidates: a bare number there is a page number, and a line
+    found at the same offset from the top or bottom of several pages is a
+    header or footer, kept once. Body lines, including years and repeated
+    entries, are left alone.
+    """
+    text = (text or '').replace('\r\n', '\n').replace('\r', '\n')
+    pages = [page for page in (_page_lines(page) for page in text.split('\f')) if page]
+    multi_page = len(pages) > 1
+
+    # (line, edge position) -> pages on which the line sits there
+    edge_pages = {}
+    if multi_page:
+        for page in pages:
+            for index, line in enumerate(page):
+                for position in _edge_positions(index, page):
+                    edge_pages[line.casefold(), position] = edge_pages.get((line.casefold(), position), 0) + 1
+
+    lines = []
+    kept_repeats = set()
+    for page in pages:
+        for index, line in enumerate(page):
+            if _PAGE_MARKER.match(line):
+                continue
+            positions = _edge_positions(index, page) if multi_page else []
+            if positions and _BARE_PAGE_NUMBER.match(line):
+                continue
+            key = line.casefold()
+            if any(edge_pages[key, position] > 1 for position in positions):
+                if key in kept_repeats:
+                    continue
+                kept_repeats.add(key)
+            lines.append(line)
+    return '\n'.join(lines)
+
+def truncate_to_budget(text, max_tokens):
+    """Keep whole lines from the start of ``text`` until ``max_tokens`` is reached"""
+    if not text or max_tokens is None or count_tokens(text) <= max_tokens:
+        return text
+
+    kept = []
+    used = 0
+    for line in text.split('\n'):
+        line_tokens = count_tokens(line) + 1  # + the newline
+        if used + line_tokens > max_tokens:
+            if not kept:
+                kept.append(_truncate_line(line, max_tokens))
+            break
+        kept.append(line)
+        used += line_tokens
+    return '\n'.join(kept)
+
+def _truncate_line(line, max_tokens):
+    encoding = _get_encoding()
+    if encoding is None:
+        return line[:max_tokens * 4]
+    return encoding.decode(encoding.encode(line, disallowed_special=())[:max_tokens])
+
+def budget_items(items, call_type):
+    """Keep the leading items whose compact JSON fits the budget for ``call_type``"""
+    max_tokens = settings.PROMPT_TOKEN_BUDGETS.get(call_type)
+    items = list(items or [])
+    if max_tokens is None:
+        return items
+
+    kept = []
+    used = 2  # The enclosing brackets
+    for item in items:
+        item_tokens = count_tokens(compact_json(item)) + 1
+        if used + item_tokens > max_tokens:
+            logger.debug("Trimmed %s prompt input to %d of %d items", call_type, len(kept), len(items))
+            break
+        kept.append(item)
+        used += item_tokens
+    return kept
+
+def budget_text(text, call_type):
+    """Trim ``text`` to the token budget configured for ``call_type`` in PROMPT_TOKEN_BUDGETS"""
+    if not isinstance(text, str):
+        return text
+    max_tokens = settings.PROMPT_TOKEN_BUDGETS.get(call_type)
+    trimmed = truncate_to_budget(text, max_tokens)
+    if len(trimmed) < len(text):
+        logger.debug("Trimmed %s prompt input to %d tokens (%d -> %d chars)", call_type, max_tokens, len(text), len(trimmed))
+    return trimmed
+
+def prepare_cv_text(cv_text, call_type):
+    """Normalize extracted CV text and fit it to the budget for ``call_type``"""
+    return budget_text(normalize_cv_text(cv_text), call_type)
@@ -0,0 +1,371 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+import openai
+from django.conf import settings
+from . import cassettes, metrics, tracing
+from .client_registry import hash_api_key
+from .prompt_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Every chat completion goes through the scheduler below. Per API key it keeps
+# request and token buckets (resynced from the x-ratelimit-* response headers),
+# an AIMD concurrency window, and one backoff deadline shared by all callers, so
+# a 429 slows down every call on that key instead of each call retrying alone.
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+_RETRYABLE_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+def parse_duration(value):
+    """Parse OpenAI reset durations such as ``'1s'``, ``'6m0s'`` or ``'120ms'`` into seconds"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+def _header_number(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(request):
+    """Prompt tokens plus the completion allowance a request can consume"""
+    prompt = ''.join(message.get('content') or '' for message in request.get('messages', []))
+    return count_tokens(prompt) + request.get('max_tokens', 0)
+
+def _record_usage(operation, usage):
+    if usage is None:
+        return
+    metrics.record_usage(operation, usage)
+    tracing.current_span().set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+class TokenBucket:
+    """Refills ``capacity`` units per minute, continuously"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, cost, now):
+        """Seconds until ``cost`` units are available (0 if they are now)"""
+        self._refill(now)
+        cost = min(cost, self.capacity)  # Oversized requests go through once the bucket is full
+        if self.level >= cost:
+            return 0
+        return (cost - self.level) * 60 / self.capacity
+
+    def take(self, cost):
+        self.level -= min(cost, self.capacity)
+
+    def sync(self, limit, remaining, now):
+        """Adopt the server's view of the limit and of what is left in the window"""
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+class KeyLimiter:
+    """Rate-limit state for one API key"""
+
+    def __init__(self):
+        self.requests = TokenBucket(settings.OPENAI_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(settings.OPENAI_TOKENS_PER_MINUTE)
+        self.concurrency = float(settings.OPENAI_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.waiting = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.throttle_events = 0
+        self.waits = 0
+        self.condition = threading.Condition()
+
+    def _wait_time(self, cost, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.in_flight >= int(self.concurrency):
+            return settings.OPENAI_SCHEDULER_POLL_INTERVAL
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(cost, now))
+
+    def try_acquire(self, cost):
+        """Take a slot and the bucket units; returns 0, or the seconds to wait before retrying"""
+        with self.condition:
+            wait = self._wait_time(cost, time.monotonic())
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(cost)
+            self.in_flight += 1
+            return 0
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def on_response(self, headers):
+        """Resync the buckets from the response headers and widen the window (additive increase)"""
+        now = time.monotonic()
+        with self.condition:
+            self.requests.sync(
+                _header_number(headers, 'x-ratelimit-limit-requests'),
+                _header_number(headers, 'x-ratelimit-remaining-requests'),
+                now
+            )
+            self.tokens.sync(
+                _header_number(headers, 'x-ratelimit-limit-tokens'),
+                _header_number(headers, 'x-ratelimit-remaining-tokens'),
+                now
+            )
+            if self.concurrency < settings.OPENAI_MAX_CONCURRENCY:
+                self.concurrency = min(settings.OPENAI_MAX_CONCURRENCY, self.concurrency + 1 / self.concurrency)
+
+    def on_throttled(self, headers, attempt):
+        """Halve the window (once per burst of 429s) and push back the shared backoff deadline"""
+        now = time.monotonic()
+        retry_after = _header_number(headers, 'retry-after-ms')
+        retry_after = retry_after / 1000 if retry_after is not None else _header_number(headers, 'retry-after')
+        if retry_after is None:
+            resets = [parse_duration(headers.get(name)) for name in ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')]
+            resets = [reset for reset in resets if reset]
+            retry_after = min(resets) if resets else settings.OPENAI_BACKOFF_BASE * 2 ** attempt
+        retry_after = min(retry_after, settings.OPENAI_BACKOFF_MAX) * random.uniform(1, 1.25)
+
+        with self.condition:
+            self.throttle_events += 1
+            if now - self.last_decrease > 1:
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self.last_decrease = now
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        logger.warning("OpenAI rate limit hit; backing off %.2fs, concurrency now %d", retry_after, int(self.concurrency))
+
+    def stats(self):
+        with self.condition:
+            return {
+                'concurrency_limit': int(self.concurrency),
+                'in_flight': self.in_flight,
+                'queue_depth': self.waiting,
+                'throttle_events': self.throttle_events,
+                'waits': self.waits,
+                'requests_available': int(self.requests.level),
+                'tokens_available': int(self.tokens.level),
+                'backoff_remaining': round(max(0.0, self.blocked_until - time.monotonic()), 3),
+            }
+
+class CallScheduler:
+    """Routes chat completions through per-key limiters, retrying 429s with shared backoff"""
+
+    def __init__(self):
+        self._limiters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def limiter_for(self, client):
+        key = hash_api_key(client.api_key)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = KeyLimiter()
+                # Drop the least recently used idle limiters beyond the client pool size
+                for old_key in list(self._limiters):
+                    if len(self._limiters) <= settings.OPENAI_CLIENT_POOL_MAX_SIZE:
+                        break
+                    old = self._limiters[old_key]
+                    if old is not limiter and old.in_flight == 0 and old.waiting == 0:
+                        del self._limiters[old_key]
+            self._limiters.move_to_end(key)
+            return limiter
+
+    def _acquire(self, limiter, cost):
+        wait = limiter.try_acquire(cost)
+        if wait <= 0:
+            return
+        with limiter.condition:
+            limiter.waiting += 1
+            limiter.waits += 1
+        try:
+            while wait > 0:
+                with limiter.condition:
+                    limiter.condition.wait(timeout=wait)
+                wait = limiter.try_acquire(cost)
+        finally:
+            with limiter.condition:
+                limiter.waiting -= 1
+
+    async def _aacquire(self, limiter, cost):
+        wait = limiter.try_acquire(cost)
+        if wait <= 0:
+            return
+        with limiter.condition:
+            limiter.waiting += 1
+            limiter.waits += 1
+        try:
+            while wait > 0:
+                await asyncio.sleep(min(wait, settings.OPENAI_SCHEDULER_POLL_INTERVAL))
+                wait = limiter.try_acquire(cost)
+        finally:
+            with limiter.condition:
+                limiter.waiting -= 1
+
+    def _should_retry(self, limiter, error, attempt):
+        delay = self._retry_delay(limiter, error, attempt)
+        operation = metrics.current_operation.get()
+        if delay is None:
+            metrics.OPENAI_ERRORS.inc(operation=operation, error=type(error).__name__)
+        else:
+            reason = 'rate_limit' if isinstance(error, openai.RateLimitError) else type(error).__name__
+            metrics.OPENAI_RETRIES.inc(operation=operation, reason=reason)
+        return delay
+
+    def _retry_delay(self, limiter, error, attempt):
+        if attempt >= settings.OPENAI_MAX_RETRIES:
+            return None
+        if isinstance(error, openai.RateLimitError):
+            if getattr(error, 'code', None) == 'insufficient_quota':
+                return None
+            limiter.on_throttled(error.response.headers, attempt)
+            return 0  # The shared backoff deadline already delays the retry
+        if isinstance(error, _RETRYABLE_ERRORS):
+            return min(settings.OPENAI_BACKOFF_BASE * 2 ** attempt, settings.OPENAI_BACKOFF_MAX)
+        return None
+
+    def _measured(self, response, request, started):
+        """Record latency and token usage; streams are wrapped so both are taken once consumed"""
+        operation = metrics.current_operation.get()
+        if not request.get('stream'):
+            metrics.OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, operation=operation)
+            _record_usage(operation, getattr(response, 'usage', None))
+            return response
+        if hasattr(response, '__aiter__'):
+            return self._ameasured_stream(response, operation, started)
+        return self._measured_stream(response, operation, started)
+
+    def _measured_stream(self, chunks, operation, started):
+        try:
+            for chunk in chunks:
+                # With include_usage the last chunk has no choices and carries the usage
+                _record_usage(operation, getattr(chunk, 'usage', None))
+                yield chunk
+        finally:
+            metrics.OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+    async def _ameasured_stream(self, chunks, operation, started):
+        try:
+            async for chunk in chunks:
+                _record_usage(operation, getattr(chunk, 'usage', None))
+                yield chunk
+        finally:
+            metrics.OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+    @contextmanager
+    def _slot(self, client, request):
+        limiter = self.limiter_for(client)
+        with tracing.span('openai.request', operation=metrics.current_operation.get(), model=request.get('model'),
+                          stream=bool(request.get('stream'))) as span:
+            attempt = 0
+            while True:
+                queued = time.perf_counter()
+                self._acquire(limiter, estimate_tokens(request))
+                started = time.perf_counter()
+                metrics.OPENAI_QUEUE_SECONDS.observe(started - queued, operation=metrics.current_operation.get())
+                span.set(attempts=attempt + 1, queued_ms=round((started - queued) * 1000, 3))
+                try:
+                    raw = cassettes.create(client, request)
+                except Exception as e:
+                    limiter.release()
+                    delay = self._should_retry(limiter, e, attempt)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                try:
+                    limiter.on_response(raw.headers)
+                    yield self._measured(raw.parse(), request, started)
+                finally:
+                    limiter.release()
+                return
+
+    @asynccontextmanager
+    async def _aslot(self, client, request):
+        limiter = self.limiter_for(client)
+        with tracing.span('openai.request', operation=metrics.current_operation.get(), model=request.get('model'),
+                          stream=bool(request.get('stream'))) as span:
+            attempt = 0
+            while True:
+                queued = time.perf_counter()
+                await self._aacquire(limiter, estimate_tokens(request))
+                started = time.perf_counter()
+                metrics.OPENAI_QUEUE_SECONDS.observe(started - queued, operation=metrics.current_operation.get())
+                span.set(attempts=attempt + 1, queued_ms=round((started - queued) * 1000, 3))
+                try:
+                    raw = await cassettes.acreate(client, request)
+                except Exception as e:
+                    limiter.release()
+                    delay = self._should_retry(limiter, e, attempt)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                try:
+                    limiter.on_response(raw.headers)
+                    yield self._measured(raw.parse(), request, started)
+                finally:
+                    limiter.release()
+                return
+
+    def create(self, client, **request):
+        """Scheduled ``client.chat.completions.create``"""
+        with self._slot(client, request) as response:
+            return response
+
+    def stream(self, client, **request):
+        """Scheduled streaming completion; use as ``with scheduler.stream(...) as chunks``.
+
+        The concurrency slot is held until the stream has been consumed.
+        """
+        return self._slot(client, dict(request, stream=True, stream_options={'include_usage': True}))
+
+    async def acreate(self, client, **request):
+        async with self._aslot(client, request) as response:
+            return response
+
+    def astream(self, client, **request):
+        return self._aslot(client, dict(request, stream=True, stream_options={'include_usage': True}))
+
+    def stats(self):
+        """Per-key (hashed) scheduler state: window, in-flight, queue depth and throttle counts"""
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {key[:12]: limiter.stats() for key, limiter in limiters}
+
+scheduler = CallScheduler()
+
+def _scheduler_gauge(field):
+    return lambda: [({'key': key}, stats[field]) for key, stats in scheduler.stats().items()]
+
+for _field, _documentation in [
+    ('queue_depth', 'OpenAI requests waiting in the scheduler'),
+    ('in_flight', 'OpenAI requests in flight'),
+    ('concurrency_limit', 'Current AIMD concurrency window'),
+    ('throttle_events', '429 responses seen since the key was first used'),
+]:
+    metrics.register(metrics.Gauges(f'openai_scheduler_{_field}', _documentation, _scheduler_gauge(_field)))
@@ -0,0 +1,163 @@
+import contextvars
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from . import metrics
+
+# Bump when prompts or sampling change in a way that should invalidate cached results
+PROMPT_VERSION = 3
+
+# Set for the duration of a request that asked for ``no_cache``
+_bypass = contextvars.ContextVar('result_cache_bypass', default=False)
+
+class MemoryBackend:
+    """In-process LRU store with a per-entry TTL"""
+
+    blocking = False
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class DjangoCacheBackend:
+    """Store backed by a Django cache alias (locmem, file or database).
+
+    The size cap comes from the alias' own ``MAX_ENTRIES`` option.
+    """
+
+    blocking = True
+
+    def __init__(self, alias, ttl):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, timeout=self.ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+def _create_backend():
+    if settings.RESULT_CACHE_BACKEND == 'django':
+        return DjangoCacheBackend(settings.RESULT_CACHE_ALIAS, settings.RESULT_CACHE_TTL)
+    if settings.RESULT_CACHE_BACKEND == 'memory':
+        return MemoryBackend(settings.RESULT_CACHE_MAX_ENTRIES, settings.RESULT_CACHE_TTL)
+    raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {settings.RESULT_CACHE_BACKEND}")
+
+def cache_key(namespace, request):
+    """Hash a model request into a cache key.
+
+    The request holds the model, the full prompt (so the CV text or the
+    industry/expertise pair) and the sampling parameters.
+    """
+    payload = json.dumps(
+        {'version': PROMPT_VERSION, 'namespace': namespace, 'request': request},
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return f"llm:{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+class ResultCache:
+    """Content-addressed cache for model outputs that only depend on their prompt"""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = _create_backend()
+        return self._backend
+
+    def get(self, namespace, request):
+        if not settings.RESULT_CACHE_ENABLED or _bypass.get():
+            return None
+        value = self.backend.get(cache_key(namespace, request))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        metrics.RESULT_CACHE_REQUESTS.inc(namespace=namespace, result='miss' if value is None else 'hit')
+        return value
+
+    def set(self, namespace, request, value):
+        # Fresh results are stored even when reads are bypassed, refreshing the entry
+        if not settings.RESULT_CACHE_ENABLED or value is None:
+            return
+        self.backend.set(cache_key(namespace, request), value)
+
+    async def aget(self, namespace, request):
+        if self.backend.blocking:
+            return await sync_to_async(self.get)(namespace, request)
+        return self.get(namespace, request)
+
+    async def aset(self, namespace, request, value):
+        if self.backend.blocking:
+            return await sync_to_async(self.set)(namespace, request, value)
+        return self.set(namespace, request, value)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+result_cache = ResultCache()
+
+metrics.register(metrics.Gauges(
+    'result_cache_entries',
+    'Entries held by the in-memory result cache backend',
+    lambda: [({}, len(result_cache.backend))] if isinstance(result_cache.backend, MemoryBackend) else []
+))
+
+def reads_bypassed():
+    """Whether the current request asked for fresh results (``no_cache``)"""
+    return _bypass.get()
+
+@contextmanager
+def cache_bypassed(bypass=True):
+    """Skip cache reads for calls made inside the block (and stages it starts)"""
+    token = _bypass.set(bypass)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
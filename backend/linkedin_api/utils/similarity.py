@@ -0,0 +1,318 @@
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from . import metrics, tracing
+from .result_cache import reads_bypassed
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate CV detection. Re-uploads of the same CV with a typo fixed or a
+# line added miss the exact-hash result cache, so every analyzed CV is also
+# summarized by a MinHash signature of its word shingles. Signatures are
+# bucketed by LSH bands, so a lookup only compares against the few stored CVs
+# sharing a band instead of all of them, and a CV whose estimated Jaccard
+# similarity reaches SIMILAR_CV_THRESHOLD reuses the stored analysis. Only
+# signatures, identity hashes and analyses are kept, not CV text.
+#
+# Entries are scoped (by API key hash), so one user's analysis is never served
+# to another, and a near-duplicate only matches when its identity fingerprint
+# (the header line, emails, phone numbers and links) is unchanged: the same CV
+# under another person's name is analyzed afresh rather than reusing a profile
+# derived from someone else.
+
+SHINGLE_SIZE = 5  # Words per shingle
+NUM_BANDS = 16
+ROWS_PER_BAND = 8
+NUM_HASHES = NUM_BANDS * ROWS_PER_BAND
+
+_FILE_FORMAT = 2  # Files in another format are discarded on load
+
+_indexes = []
+
+_MAX_HASH = (1 << 64) - 1
+_WORD = re.compile(r'\w+')
+_CONTACT = re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+|(https?://|www\.)\S+|\+?\d[\d ().-]{7,}\d')
+
+def _words(text):
+    return _WORD.findall(str(text or '').lower())
+
+def text_key(text):
+    """Hash of the CV text with case, punctuation and whitespace ignored"""
+    return hashlib.sha256(' '.join(_words(text)).encode('utf-8')).hexdigest()
+
+def identity_key(text):
+    """Hash of what identifies the person behind a CV: its first line (usually the name) and contact details"""
+    lines = (line.strip() for line in str(text or '').splitlines())
+    header = next((line for line in lines if line), '')
+    contacts = sorted({re.sub(r'[\s().-]', '', match.group(0).lower()) for match in _CONTACT.finditer(str(text or ''))})
+    return hashlib.sha256('\n'.join([' '.join(_words(header)), *contacts]).encode('utf-8')).hexdigest()
+
+def _shingle_hashes(text):
+    words = _words(text)
+    if len(words) < SHINGLE_SIZE:
+        shingles = {' '.join(words)} if words else set()
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingles]
+
+def signature(text):
+    """MinHash signature of the text's shingles, or None for an empty text.
+
+    Uses one-permutation hashing: each shingle is hashed once and the hash
+    space is split into NUM_HASHES bins, keeping the minimum per bin, so the
+    cost is linear in the CV length rather than in NUM_HASHES times it. Empty
+    bins borrow the next filled bin's value (rotation densification).
+    """
+    hashes = _shingle_hashes(text)
+    if not hashes:
+        return None
+    bins = [_MAX_HASH] * NUM_HASHES
+    for h in hashes:
+        i = h % NUM_HASHES
+        if h < bins[i]:
+            bins[i] = h
+    if _MAX_HASH in bins:
+        source = list(bins)
+        for i in range(NUM_HASHES):
+            distance = 0
+            while source[(i + distance) % NUM_HASHES] == _MAX_HASH:
+                distance += 1
+            if distance:
+                # The offset keeps a borrowed value from matching its source bin
+                bins[i] = (source[(i + distance) % NUM_HASHES] + distance) & _MAX_HASH
+    return array('Q', bins)
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_HASHES
+
+def _bands(scope, sig):
+    return [
+        (scope, band, hash(tuple(sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])))
+        for band in range(NUM_BANDS)
+    ]
+
+class SimilarityIndex:
+    """Bounded LSH index from CV signatures to a stored value, persisted to ``path``.
+
+    Every entry belongs to a ``scope`` (the caller's API key hash); lookups
+    only see entries of their own scope.
+
+    ``version`` identifies what produced the values (model and prompt version);
+    a file saved under another version is discarded on load.
+
+    Least recently matched CVs are evicted beyond ``max_entries``. Changes are
+    written back at most every ``save_interval`` seconds by a timer thread, so
+    requests never wait on the disk after the index is loaded.
+    """
+
+    def __init__(self, name, version, path=None, max_entries=None, save_interval=None):
+        self.name = name
+        self.version = version
+        self._path = path
+        self._max_entries = max_entries
+        self._save_interval = save_interval
+        self._entries = OrderedDict()  # (scope, text key) -> (signature, identity key, value)
+        self._buckets = {}  # (scope, band, band hash) -> set of entry keys
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._save_timer = None
+        _indexes.append(self)
+
+    @property
+    def enabled(self):
+        return settings.SIMILAR_CV_ENABLED and settings.RESULT_CACHE_ENABLED
+
+    @property
+    def path(self):
+        return settings.SIMILAR_CV_INDEX_PATH if self._path is None else self._path
+
+    @property
+    def max_entries(self):
+        return settings.SIMILAR_CV_MAX_ENTRIES if self._max_entries is None else self._max_entries
+
+    @property
+    def save_interval(self):
+        return settings.SIMILAR_CV_SAVE_INTERVAL if self._save_interval is None else self._save_interval
+
+    def _insert(self, key, sig, identity, value):
+        self._remove(key)
+        self._entries[key] = (sig, identity, value)
+        for band in _bands(key[0], sig):
+            self._buckets.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in _bands(key[0], entry[0]):
+            keys = self._buckets.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[band]
+
+    def load(self):
+        """Read the index from disk once; a missing, unreadable or outdated file starts it empty"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.path or not os.path.exists(self.path):
+                return
+            try:
+                with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not read similarity index %s: %s", self.path, e)
+                return
+            if data.get('format') != _FILE_FORMAT or data.get('version') != self.version:
+                logger.info("Discarding similarity index %s built for another prompt version", self.path)
+                return
+            for entry in data.get('entries', []):
+                self._insert(
+                    (entry['scope'], entry['key']),
+                    array('Q', entry['signature']),
+                    entry['identity'],
+                    entry['value']
+                )
+
+    async def aload(self):
+        if not self._loaded:
+            await sync_to_async(self.load, thread_sensitive=False)()
+
+    def save(self):
+        """Write the index to disk atomically"""
+        if not self.path:
+            return
+        with self._lock:
+            self._save_timer = None
+            data = {
+                'format': _FILE_FORMAT,
+                'version': self.version,
+                'entries': [
+                    {'scope': scope, 'key': key, 'signature': list(sig), 'identity': identity, 'value': value}
+                    for (scope, key), (sig, identity, value) in self._entries.items()
+                ],
+            }
+        path = Path(self.path)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write similarity index %s: %s", self.path, e)
+
+    def save_pending(self):
+        """Write changes still waiting for the save timer"""
+        timer = self._save_timer
+        if timer is not None:
+            timer.cancel()
+            self.save()
+
+    def _schedule_save(self):
+        if not self.path or self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.save_interval, self.save)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def lookup(self, text, scope):
+        """Return ``(value, similarity)`` for the most similar CV of ``scope`` above the threshold, else None.
+
+        A near-duplicate only matches a stored CV with the same identity_key.
+        """
+        if not self.enabled or reads_bypassed():
+            return None
+        self.load()
+        started = time.perf_counter()
+        key = (scope, text_key(text))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            match = (entry[2], 1.0)
+            best_key = key
+        else:
+            sig = signature(text)
+            identity = identity_key(text)
+            match = best_key = None
+            if sig is not None:
+                with self._lock:
+                    candidates = set()
+                    for band in _bands(scope, sig):
+                        candidates.update(self._buckets.get(band, ()))
+                    for candidate in candidates:
+                        stored_sig, stored_identity, value = self._entries[candidate]
+                        if stored_identity != identity:
+                            continue
+                        score = similarity(sig, stored_sig)
+                        if score >= settings.SIMILAR_CV_THRESHOLD and (match is None or score > match[1]):
+                            match, best_key = (value, score), candidate
+        if best_key is not None:
+            with self._lock:
+                if best_key in self._entries:
+                    self._entries.move_to_end(best_key)
+
+        metrics.SIMILAR_CV_LOOKUP_SECONDS.observe(time.perf_counter() - started, index=self.name)
+        metrics.SIMILAR_CV_LOOKUPS.inc(index=self.name, result='miss' if match is None else 'hit')
+        if match is not None:
+            tracing.current_span().set(similar_cv=round(match[1], 3))
+        return match
+
+    async def alookup(self, text, scope):
+        if not self.enabled or reads_bypassed():
+            return None
+        await self.aload()
+        return self.lookup(text, scope)
+
+    def add(self, text, value, scope):
+        """Store the value computed for a CV under ``scope``"""
+        if not self.enabled or value is None:
+            return
+        self.load()
+        sig = signature(text)
+        if sig is None:
+            return
+        with self._lock:
+            self._insert((scope, text_key(text)), sig, identity_key(text), value)
+            self._schedule_save()
+
+    async def aadd(self, text, value, scope):
+        if not self.enabled:
+            return
+        await self.aload()
+        self.add(text, value, scope)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+metrics.register(metrics.Gauges(
+    'similar_cv_index_entries',
+    'Analyzed CVs held by each near-duplicate index',
+    lambda: [({'index': index.name}, len(index)) for index in _indexes]
+))
+
+@atexit.register
+def _save_pending_indexes():
+    for index in _indexes:
+        index.save_pending()
@@ -0,0 +1,127 @@
+import asyncio
+import copy
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from . import metrics, tracing
+
+# Request coalescing: concurrent callers asking for the same thing (a double
+# click, a client retrying a slow request) share one in-flight computation
+# instead of each paying for it. The first caller for a key runs the work;
+# later ones wait for its result, or run the work themselves once
+# SINGLE_FLIGHT_TIMEOUT passes. Sync and async callers share one table, so a
+# thread and a coroutine can coalesce with each other.
+
+# Result handed to followers when the leader was cancelled rather than failed
+_ABANDONED = object()
+
+class SingleFlight:
+    """Table of in-flight calls for one kind of work, keyed by content hash"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}  # key -> Future of the leader's result
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Return ``(future, leader)``; the leader must resolve the future and then call _done"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def _timeout(self, timeout):
+        return settings.SINGLE_FLIGHT_TIMEOUT if timeout is None else timeout
+
+    def _shared(self, result):
+        # Followers get their own copy so no caller can mutate another's result
+        metrics.SINGLE_FLIGHT_CALLS.inc(name=self.name, role='follower')
+        tracing.current_span().set(coalesced=self.name)
+        return copy.deepcopy(result)
+
+    def do(self, key, func, timeout=None):
+        """Return ``func()``, or the result of an identical call already in flight.
+
+        A follower raises the leader's exception, and runs ``func()`` itself when
+        the leader takes longer than ``timeout`` (SINGLE_FLIGHT_TIMEOUT by default)
+        or is cancelled.
+        """
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return func()
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                result = future.result(timeout=self._timeout(timeout))
+            except FutureTimeoutError:
+                result = _ABANDONED
+            if result is _ABANDONED:
+                metrics.SINGLE_FLIGHT_CALLS.inc(name=self.name, role='fallback')
+                return func()
+            return self._shared(result)
+
+        metrics.SINGLE_FLIGHT_CALLS.inc(name=self.name, role='leader')
+        try:
+            result = func()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_result(_ABANDONED)  # Cancelled: followers run the work themselves
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._done(key, future)
+
+    async def ado(self, key, func, timeout=None):
+        """Async version of do; ``func()`` returns an awaitable"""
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await func()
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                # Shielded so a follower timing out doesn't cancel the leader's future
+                result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self._timeout(timeout))
+            except asyncio.TimeoutError:
+                result = _ABANDONED
+            if result is _ABANDONED:
+                metrics.SINGLE_FLIGHT_CALLS.inc(name=self.name, role='fallback')
+                return await func()
+            return self._shared(result)
+
+        metrics.SINGLE_FLIGHT_CALLS.inc(name=self.name, role='leader')
+        try:
+            result = await func()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_result(_ABANDONED)  # Cancelled: followers run the work themselves
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._done(key, future)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+completions = SingleFlight('completion')
+news_searches = SingleFlight('news')
+generations = SingleFlight('generation')
+
+metrics.register(metrics.Gauges(
+    'single_flight_in_flight',
+    'Distinct calls in flight that later identical callers can join',
+    lambda: [({'name': flight.name}, flight.in_flight()) for flight in (completions, news_searches, generations)]
+))
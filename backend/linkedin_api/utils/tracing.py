@@ -0,0 +1,273 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+
+# Request tracing: every request gets a trace ID, and pipeline stages, OpenAI
+# calls, PDF extraction and news lookups record spans linked to their parent.
+# Spans are buffered on the trace and only written when the trace ends, and
+# only if it was sampled, failed, or took longer than TRACE_SLOW_THRESHOLD, so
+# the waterfall of a slow request can be rebuilt from the file afterwards while
+# fast requests cost a few dict appends. Writing goes through a queue to a
+# background thread that owns the rotating JSON-lines file.
+
+_current_span = contextvars.ContextVar('trace_span', default=None)
+
+_TRACE_ID = re.compile(r'^[0-9a-fA-F-]{8,64}$')
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+class Trace:
+    """Spans of one request, written together when the request finishes"""
+
+    def __init__(self, name, trace_id=None, sampled=None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.sampled = random.random() < settings.TRACE_SAMPLE_RATE if sampled is None else sampled
+        self.failed = False
+        self.spans = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            if len(self.spans) < settings.TRACE_MAX_SPANS:
+                self.spans.append(record)
+            else:
+                self.dropped_spans += 1
+
+    def finish(self, duration):
+        if not (self.sampled or self.failed or duration >= settings.TRACE_SLOW_THRESHOLD):
+            return
+        with self._lock:
+            spans, self.spans = self.spans, []
+        writer = _get_writer()
+        for record in spans:
+            writer.info(json.dumps(record, default=str))
+        if self.dropped_spans:
+            writer.info(json.dumps({
+                'trace_id': self.trace_id,
+                'name': 'trace.dropped_spans',
+                'attributes': {'count': self.dropped_spans},
+            }))
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attributes', 'start', '_started', 'status', 'ended')
+
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.status = 'ok'
+        self.ended = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record_error(self, error):
+        self.status = 'error'
+        self.attributes['error'] = f"{type(error).__name__}: {str(error)}"[:500]
+        self.trace.failed = True
+
+    def end(self):
+        """Record the span on its trace; returns its duration in seconds"""
+        duration = time.perf_counter() - self._started
+        if self.ended:
+            return duration
+        self.ended = True
+        self.trace.add({
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round(duration * 1000, 3),
+            'status': self.status,
+            'thread': threading.current_thread().name,
+            'attributes': self.attributes,
+        })
+        return duration
+
+class _NoopSpan:
+    """Stands in for a span when there is no active trace"""
+    trace = None
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+def current_span():
+    return _current_span.get() or _NOOP_SPAN
+
+def current_trace_id():
+    span = _current_span.get()
+    return span.trace.trace_id if span else None
+
+@contextmanager
+def span(name, **attributes):
+    """Record a child span of the current one; does nothing outside a trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield _NOOP_SPAN
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+def is_trace_id(value):
+    return bool(value) and _TRACE_ID.match(value) is not None
+
+def begin_trace(name, trace_id=None, sampled=None, **attributes):
+    """Start a trace and return its root span; finish it with ``end_trace``"""
+    if not settings.TRACE_ENABLED:
+        return None
+    if trace_id and not is_trace_id(trace_id):
+        trace_id = None
+    return Span(Trace(name, trace_id, sampled), name, attributes=attributes)
+
+def end_trace(root):
+    if root is not None:
+        root.trace.finish(root.end())
+
+@contextmanager
+def activate(root):
+    """Make ``root`` (a span from begin_trace, or None) the current span"""
+    token = _current_span.set(root)
+    try:
+        yield root or _NOOP_SPAN
+    finally:
+        _current_span.reset(token)
+
+@contextmanager
+def trace(name, trace_id=None, sampled=None, **attributes):
+    """Run the block as its own trace, e.g. for a background job"""
+    root = begin_trace(name, trace_id, sampled, **attributes)
+    try:
+        with activate(root) as active:
+            yield active
+    except BaseException as e:
+        if root is not None:
+            root.record_error(e)
+        raise
+    finally:
+        end_trace(root)
+
+def traced_stream(chunks, root):
+    """Wrap a streaming response body so the trace stays active, and open, until it is consumed"""
+    iterator = iter(chunks)
+    try:
+        while True:
+            token = _current_span.set(root)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_span.reset(token)
+            yield chunk
+    except GeneratorExit:
+        root.set(client_disconnected=True)
+        raise
+    except Exception as e:
+        root.record_error(e)
+        raise
+    finally:
+        end_trace(root)
+
+async def atraced_stream(chunks, root):
+    """Async version of traced_stream"""
+    iterator = chunks.__aiter__()
+    try:
+        while True:
+            token = _current_span.set(root)
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_span.reset(token)
+            yield chunk
+    except GeneratorExit:
+        root.set(client_disconnected=True)
+        raise
+    except Exception as e:
+        root.record_error(e)
+        raise
+    finally:
+        end_trace(root)
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the request: records are dropped when the writer falls behind"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            directory = os.path.dirname(settings.TRACE_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                settings.TRACE_FILE,
+                maxBytes=settings.TRACE_FILE_MAX_BYTES,
+                backupCount=settings.TRACE_FILE_BACKUPS,
+                encoding='utf-8'
+            )
+            file_handler.setFormatter(logging.Formatter('%(message)s'))
+            records = queue.Queue(settings.TRACE_QUEUE_SIZE)
+            listener = logging.handlers.QueueListener(records, file_handler)
+            listener.start()
+            atexit.register(listener.stop)
+
+            logger = logging.getLogger('linkedin_api.traces')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(_DroppingQueueHandler(records))
+            _writer = logger
+            _writer.listener = listener
+        return _writer
+
+def flush():
+    """Write out queued spans (used at shutdown and by tools reading the file)"""
+    with _writer_lock:
+        writer = _writer
+    if writer is not None:
+        writer.listener.stop()
+        writer.listener.start()
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from . import metrics, openai_helper, tracing
+from .result_cache import cache_bypassed
+
+logger = logging.getLogger(__name__)
+
+# Background warmer for industry analysis. Industry trends and news depend on
+# a CV's industry and areas of expertise only, so the pipeline asks for them by
+# the normalized pair (its "industry profile"): CVs with the same profile share
+# one cached analysis and news lookup. For the profiles seen most often a daemon
+# thread refreshes both into the result and news caches every WARMER_INTERVAL
+# seconds, using WARMER_API_KEY, so requests with a warm profile find them
+# cached instead of making the calls on the critical path.
+
+def normalize_industry(industry_focus):
+    return ' '.join(str(industry_focus or '').split()).title()
+
+def industry_profile(cv_analysis):
+    """``(industry, areas)`` of a CV analysis, normalized so equivalent analyses share cache entries.
+
+    The areas of expertise are deduplicated case-insensitively and sorted.
+    """
+    areas = {}
+    for area in cv_analysis.get('key_areas_of_expertise') or []:
+        area = ' '.join(str(area).split())
+        if area:
+            areas.setdefault(area.casefold(), area)
+    return normalize_industry(cv_analysis.get('industry_focus', '')), tuple(areas[key] for key in sorted(areas))
+
+def profile_expertise(profile):
+    """The expertise argument of analyze_industry_trends for a profile"""
+    return ', '.join(profile[1])
+
+def profile_news_query(profile):
+    industry, areas = profile
+    return ' '.join([industry, *areas])
+
+class IndustryWarmer:
+    def __init__(self):
+        self._counts = Counter()
+        self._warm = {}  # industry -> monotonic time of its last successful refresh
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        # Warm trends are read back through the result cache
+        return settings.WARMER_ENABLED and settings.RESULT_CACHE_ENABLED and bool(settings.WARMER_API_KEY)
+
+    def record(self, profile):
+        """Count an industry profile seen in a CV analysis; starts the warmer thread on first use"""
+        if not profile[0] or not self.enabled:
+            return
+        with self._lock:
+            self._counts[profile] += 1
+            if len(self._counts) > settings.WARMER_MAX_TRACKED:
+                # Halve every count and forget the rarest, so the tracked set stays
+                # bounded and recent popularity outweighs old
+                self._counts = Counter({name: count // 2 for name, count in self._counts.items() if count > 1})
+        self._ensure_thread()
+
+    def popular(self):
+        """The industry profiles to keep warm, most frequent first"""
+        with self._lock:
+            return [profile for profile, count in self._counts.most_common(settings.WARMER_MAX_INDUSTRIES)
+                    if count >= settings.WARMER_MIN_REQUESTS]
+
+    def is_warm(self, profile):
+        """Whether the profile's trends and news were refreshed within WARMER_MAX_AGE"""
+        if not self.enabled:
+            return False
+        refreshed = self._warm.get(profile)
+        return refreshed is not None and time.monotonic() - refreshed <= settings.WARMER_MAX_AGE
+
+    def refresh(self, profiles=None):
+        """Recompute trends and news for ``profiles`` (default: the popular ones); returns those refreshed"""
+        refreshed = []
+        for profile in self.popular() if profiles is None else profiles:
+            with tracing.trace('industry_warmer', industry=profile[0]), cache_bypassed():
+                # The same arguments as the pipeline's, so requests with this profile hit the caches
+                trends = openai_helper.analyze_industry_trends(profile[0], profile_expertise(profile), settings.WARMER_API_KEY)
+                openai_helper.search_news(profile_news_query(profile), refresh=True)
+            if trends:
+                with self._lock:
+                    self._warm[profile] = time.monotonic()
+                refreshed.append(profile)
+            metrics.WARMER_REFRESHES.inc(result='success' if trends else 'error')
+
+        # Profiles that dropped out of the popular set go cold once stale
+        with self._lock:
+            for profile, at in list(self._warm.items()):
+                if time.monotonic() - at > settings.WARMER_MAX_AGE:
+                    del self._warm[profile]
+        return refreshed
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Industry warmer refresh failed")
+            if self._stop.wait(settings.WARMER_INTERVAL):
+                return
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='industry-warmer', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def warm_count(self):
+        with self._lock:
+            return len(self._warm)
+
+warmer = IndustryWarmer()
+
+metrics.register(metrics.Gauges(
+    'warmer_warm_industries',
+    'Industry profiles whose trends and news are currently kept warm',
+    lambda: [({}, warmer.warm_count())]
+))
@@ -1,12 +1,111 @@
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .utils.openai_helper import generate_linkedin_content, analyze_cv, generate_content_ideas, get_openai_client, search_news, analyze_industry_trends, generate_content_calendar
+from .utils.openai_helper import get_openai_client
+from .utils import openai_helper_async
+from .utils.pipeline import run_generation, run_generation_async
+from .utils.result_cache import cache_bypassed
+from .batch import BatchUploadError, collect_batch_uploads, stream_batch
+from .streaming import CONTENT_TYPES, astream_generation, stream_format_for, stream_generation
+from .utils.jobs import cancel_job, enqueue_generation, get_job
+from .responses import json_response
+from .serializers import (
+    compact_generation,
+    serialize_generation,
+    serialize_generation_summary,
+    serialize_job,
+    serialize_post,
+    serialize_stored_generation,
+)
+from .utils.history import (
+    POST_TONES,
+    SECTION_CALENDAR,
+    current_posts,
+    cv_hash,
+    get_generation,
+    list_generations,
+    post_entry,
+    regenerate_calendar,
+    regenerate_post,
+    save_generation,
+)
+from .utils.client_registry import hash_api_key
+from .utils.pdf_extraction import extract_uploaded_cv
+from .utils.single_flight import generations as generation_flights
+from .utils import metrics as metrics_registry
 from rest_framework.parsers import MultiPartParser, FormParser
-import PyPDF2
-import io
+import json
+import asyncio
+import hmac
+import logging
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view
 from openai import OpenAI
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+logger = logging.getLogger(__name__)
+
+def is_flag_set(value):
+    """Interpret a form/JSON/query flag such as ``no_cache``"""
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def multi_post_flag(request):
+    """The ``multi_post`` flag, or None to use the GENERATION_MULTI_POST default"""
+    value = request.POST.get('multi_post') or request.GET.get('multi_post')
+    return is_flag_set(value) if value is not None else None
+
+def request_api_key(request):
+    """The API key from the ``X-API-Key`` header or the ``api_key`` form field (GETs must use the header)"""
+    return request.headers.get('X-API-Key') or request.POST.get('api_key')
+
+def compact_flag(request):
+    """Whether the client asked for the compact response (``compact`` flag or ``X-Response-Format: compact``)"""
+    if request.headers.get('X-Response-Format', '').strip().lower() == 'compact':
+        return True
+    return is_flag_set(request.POST.get('compact') or request.GET.get('compact'))
+
+def read_cv_text(cv_file):
+    """Extract the text of an uploaded CV PDF"""
+    extraction = extract_uploaded_cv(cv_file)
+    if extraction.cached:
+        logger.debug("Reused extracted text for %d pages", extraction.page_count)
+    else:
+        slowest = max(extraction.page_timings, default=0)
+        logger.debug("Extracted text from %d pages in %.3fs (slowest page %.3fs)",
+                     extraction.page_count, extraction.total_time, slowest)
+    return extraction.text
+
+def generation_flight_key(cv_text, api_key, no_cache, multi_post, include_calendar=True):
+    return hash_api_key(api_key), cv_hash(cv_text), no_cache, multi_post, include_calendar
+
+def run_and_store_generation(cv_text, api_key, no_cache, multi_post, include_calendar=True):
+    """Run the pipeline and store its result; returns ``(generation, stored Generation or None)``"""
+    with cache_bypassed(no_cache):
+        generation = run_generation(cv_text, api_key, include_calendar=include_calendar, multi_post=multi_post)
+    return generation, save_generation(cv_text, api_key, generation)
+
+async def arun_and_store_generation(cv_text, api_key, no_cache, multi_post):
+    with cache_bypassed(no_cache):
+        generation = await run_generation_async(cv_text, api_key, multi_post=multi_post)
+    return generation, await sync_to_async(save_generation)(cv_text, api_key, generation)
+
+def generate_and_store(cv_text, api_key, no_cache, multi_post, include_calendar=True):
+    """Run and store a generation, or join an identical one still in flight (double click, retry)"""
+    return generation_flights.do(
+        generation_flight_key(cv_text, api_key, no_cache, multi_post, include_calendar),
+        lambda: run_and_store_generation(cv_text, api_key, no_cache, multi_post, include_calendar)
+    )
+
+async def agenerate_and_store(cv_text, api_key, no_cache, multi_post):
+    return await generation_flights.ado(
+        generation_flight_key(cv_text, api_key, no_cache, multi_post),
+        lambda: arun_and_store_generation(cv_text, api_key, no_cache, multi_post)
+    )
 
 class GeneratePostsView(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -14,73 +113,12 @@ class GeneratePostsView(APIView):
     def format_response_data(self, cv_analysis, content_ideas, posts, industry_trends, content_calendar, news_results):
         """Format response data in a consistent structure"""
         try:
-            # Format posts data
-            formatted_posts = []
-            for post in posts:
-                formatted_post = {
-                    'type': post['type'],
-                    'content': post['content'],
-                    'status': post['status'],
-                }
-                if post['status'] == 'success':
-                    # Keep engagement_suggestions as string for frontend rendering
-                    formatted_post.update({
-                        'engagement_suggestions': post.get('engagement_suggestions', ''),
-                        'industry_trends': post.get('industry_trends', ''),
-                        'skills_analysis': post.get('skills_analysis', {}),
-                        'related_news': post.get('related_news', []),
-                    })
-                formatted_posts.append(formatted_post)
-
-            # Format CV analysis to match frontend expectations
-            formatted_cv_analysis = {
-                'key_areas_of_expertise': cv_analysis.get('key_areas_of_expertise', []),
-                'industry_focus': cv_analysis.get('industry_focus', ''),
-                'notable_achievements': cv_analysis.get('notable_achievements', ''),  # Keep as string
-                'technical_skills': cv_analysis.get('technical_skills', []),
-                'soft_skills': cv_analysis.get('soft_skills', []),
-                'career_level': cv_analysis.get('career_level', ''),
-                'content_topics': cv_analysis.get('content_topics', [])
-            }
-
-            # Format content ideas as object with numbered keys
-            formatted_content_ideas = {}
-            if isinstance(content_ideas, dict):
-                for key, idea in content_ideas.items():
-                    formatted_content_ideas[key] = {
-                        'title': idea.get('title', ''),
-                        'angle': idea.get('angle', ''),
-                        'key_points': idea.get('key_points', [])
-                    }
-
-            # Keep industry_trends as string for frontend rendering
-            formatted_industry_trends = industry_trends if isinstance(industry_trends, str) else ''
-
-            # Format news to match frontend display
-            formatted_news = []
-            for news_item in news_results:
-                formatted_news.append({
-                    'title': news_item.get('title', ''),
-                    'link': news_item.get('link', ''),
-                    'published': news_item.get('published', '')
-                })
-
-            # Direct response structure to match frontend expectations
-            return {
-                'status': 'success',
-                'cv_analysis': formatted_cv_analysis,
-                'content_ideas': formatted_content_ideas,
-                'posts': formatted_posts,
-                'industry_trends': formatted_industry_trends,
-                'content_calendar': content_calendar,
-                'news': formatted_news,
-                'skills_analysis': posts[0].get('skills_analysis', {}) if posts else {}
-            }
+            return serialize_generation(
+                cv_analysis, content_ideas, posts, industry_trends, content_calendar, news_results
+            )
 
         except Exception as e:
-            print(f"Error formatting response data: {str(e)}")
-            import traceback
-            print("Traceback:", traceback.format_exc())
+            logger.exception("Error formatting response data")
             return {
                 'status': 'error',
                 'error': 'Failed to format response data',
@@ -89,118 +127,65 @@ class GeneratePostsView(APIView):
 
     def post(self, request):
         try:
-            print("=== Starting GeneratePostsView.post ===")
-            
             # Get API key from request
             api_key = request.POST.get('api_key')
-            print(f"API Key received: {api_key[:10]}..." if api_key else "No API key received")
-            
+
             if not api_key:
                 return Response({'error': 'API key is required'}, status=400)
             
             cv_file = request.FILES.get('cv')
             if not cv_file:
-                print("Error: No CV file provided")
                 return Response({'error': 'No CV file provided'}, status=400)
 
-            print(f"Processing CV file: {cv_file.name}")
-
             # Read PDF content
             try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(cv_file.read()))
-                cv_text = ""
-                for page_num, page in enumerate(pdf_reader.pages):
-                    cv_text += page.extract_text()
-                print(f"Successfully extracted text from {len(pdf_reader.pages)} pages")
+                cv_text = read_cv_text(cv_file)
             except Exception as e:
-                print(f"Error reading PDF: {str(e)}")
+                logger.warning("Error reading PDF: %s", e)
                 return Response({'error': f'Failed to read PDF: {str(e)}'}, status=400)
 
-            # First, analyze the CV
-            print("Analyzing CV...")
-            cv_analysis = analyze_cv(cv_text, api_key=api_key)
-            if not cv_analysis:
-                print("Error: CV analysis failed")
-                return Response({'error': 'Failed to analyze CV'}, status=400)
+            no_cache = is_flag_set(request.POST.get('no_cache') or request.query_params.get('no_cache'))
+            multi_post = multi_post_flag(request)
 
-            # Generate content ideas
-            print("Generating content ideas...")
-            content_ideas = generate_content_ideas(cv_analysis, api_key=api_key)
-            if not content_ideas:
-                print("Error: Content ideas generation failed")
-                return Response({'error': 'Failed to generate content ideas'}, status=400)
+            # Optionally hand the work to the background worker pool and return a job ID
+            if is_flag_set(request.POST.get('background') or request.query_params.get('background')):
+                job = enqueue_generation(cv_text, api_key, no_cache=no_cache, multi_post=multi_post)
+                return Response({
+                    'job_id': str(job.id),
+                    'status': job.status,
+                    'status_url': reverse('job-status', args=[job.id])
+                }, status=202)
 
-            # Get industry trends
-            print("Analyzing industry trends...")
-            industry_trends = analyze_industry_trends(
-                cv_analysis.get('industry_focus', ''),
-                ', '.join(cv_analysis.get('key_areas_of_expertise', [])),
-                api_key=api_key
-            )
+            # Run the pipeline; independent stages and post types run concurrently
+            generation, stored = generate_and_store(cv_text, api_key, no_cache, multi_post)
+            if not generation['cv_analysis']:
+                return Response({'error': 'Failed to analyze CV'}, status=400)
 
-            # Generate content calendar
-            print("Generating content calendar...")
-            content_calendar = generate_content_calendar(cv_analysis, api_key=api_key)
-
-            # Generate different types of posts
-            print("Generating posts...")
-            posts = []
-            post_types = [
-                {'type': 'achievement', 'tone': 'professional'},
-                {'type': 'skill_highlight', 'tone': 'confident'},
-                {'type': 'career_journey', 'tone': 'storytelling'},
-                {'type': 'industry_insight', 'tone': 'thought_leadership'},
-            ]
-
-            for post_type in post_types:
-                print(f"Generating {post_type['type']} post...")
-                post_data = generate_linkedin_content(
-                    cv_text,
-                    post_type['type'],
-                    post_type['tone'],
-                    api_key=api_key
-                )
-                
-                if isinstance(post_data, str):  # Error case
-                    posts.append({
-                        'type': post_type['type'],
-                        'content': post_data,
-                        'status': 'error'
-                    })
-                else:
-                    posts.append({
-                        'type': post_type['type'],
-                        'content': post_data['content'],
-                        'engagement_suggestions': post_data.get('engagement_suggestions'),
-                        'industry_trends': post_data.get('industry_trends'),
-                        'skills_analysis': post_data.get('skills_analysis'),
-                        'related_news': post_data.get('related_news'),
-                        'status': 'success'
-                    })
-
-            # Get news for the industry and expertise
-            print("Fetching relevant news...")
-            news_results = search_news(
-                f"{cv_analysis.get('industry_focus', '')} {' '.join(cv_analysis.get('key_areas_of_expertise', []))}"
-            )
+            if not generation['content_ideas']:
+                return Response({'error': 'Failed to generate content ideas'}, status=400)
 
             # Format and return response
             response_data = self.format_response_data(
-                cv_analysis=cv_analysis,
-                content_ideas=content_ideas,
-                posts=posts,
-                industry_trends=industry_trends,
-                content_calendar=content_calendar,
-                news_results=news_results
+                cv_analysis=generation['cv_analysis'],
+                content_ideas=generation['content_ideas'],
+                posts=generation['posts'],
+                industry_trends=generation['industry_trends'],
+                content_calendar=generation['content_calendar'],
+                news_results=generation['news']
             )
             
             if response_data['status'] == 'error':
                 return Response(response_data, status=500)
-                
-            return Response(response_data)
+
+            if stored:
+                response_data['generation_id'] = str(stored.id)
+
+            if compact_flag(request):
+                response_data = compact_generation(response_data)
+            return json_response(request, response_data)
 
         except Exception as e:
-            print(f"=== Error in GeneratePostsView.post: {str(e)} ===")
+            logger.exception("Error in GeneratePostsView.post")
             return Response({
                 'status': 'error',
                 'error': str(e),
@@ -216,10 +201,6 @@ def verify_api_key(request):
         request.FILES.get('api_key')    # Try file upload data last
     )
     
-    print(f"Received request data: {request.data}")
-    print(f"Received POST data: {request.POST}")
-    print(f"API Key received: {api_key[:10]}..." if api_key else "No API key received")
-    
     if not api_key:
         return Response({'error': 'API key is required'}, status=400)
     
@@ -232,30 +213,48 @@ def verify_api_key(request):
         
         # Make a simple API call to verify the key
         try:
-            models = client.models.list()
-            # Check if we can access the models data
-            if hasattr(models, 'data'):
-                print(f"API Key verification successful: {len(models.data)} models available")
-            else:
-                print("API Key verification successful: Models list retrieved")
+            client.models.list()
             return Response({'status': 'valid'})
         except Exception as api_error:
-            print(f"API call failed: {str(api_error)}")
+            logger.info("API key verification failed: %s", api_error)
             return Response({
                 'error': 'API key validation failed',
                 'details': str(api_error)
             }, status=401)
             
     except ValueError as ve:
-        print(f"Validation error: {str(ve)}")
+        logger.info("API key validation error: %s", ve)
         return Response({'error': str(ve)}, status=400)
     except Exception as e:
-        print(f"Unexpected error during API key verification: {str(e)}")
+        logger.exception("Unexpected error during API key verification")
         return Response({
             'error': 'Invalid API key',
             'details': str(e)
         }, status=401)
 
+@api_view(['GET'])
+def job_status(request, job_id):
+    api_key = request_api_key(request)
+    if not api_key:
+        return Response({'error': 'API key is required'}, status=400)
+    job = get_job(job_id, api_key)
+    if job is None:
+        return Response({'error': 'Job not found'}, status=404)
+    # Polled repeatedly, so an unchanged job is answered with 304
+    return json_response(request, serialize_job(job, compact=compact_flag(request)))
+
+@api_view(['POST'])
+def job_cancel(request, job_id):
+    api_key = request_api_key(request)
+    if not api_key:
+        return Response({'error': 'API key is required'}, status=400)
+    if not cancel_job(job_id, api_key):
+        job = get_job(job_id, api_key)
+        if job is None:
+            return Response({'error': 'Job not found'}, status=404)
+        return Response({'error': f'Job already {job.status}'}, status=409)
+    return Response(serialize_job(get_job(job_id, api_key)))
+
 @api_view(['POST'])
 def generate_posts(request):
     api_key = request.data.get('api_key')
@@ -268,69 +267,271 @@ def generate_posts(request):
             return Response({'error': 'No CV file provided'}, status=400)
 
         # Read PDF content
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(cv_file.read()))
-        cv_text = ""
-        for page in pdf_reader.pages:
-            cv_text += page.extract_text()
-
-        # Analyze CV with provided API key
-        cv_analysis = analyze_cv(cv_text, api_key=api_key)
-        if not cv_analysis:
+        cv_text = read_cv_text(cv_file)
+
+        # Run the pipeline; independent stages and post types run concurrently
+        generation, stored = generate_and_store(
+            cv_text, api_key, is_flag_set(request.data.get('no_cache')), multi_post_flag(request),
+            include_calendar=False
+        )
+        if not generation['cv_analysis']:
             return Response({'error': 'Failed to analyze CV'}, status=400)
 
-        # Generate content ideas with provided API key
-        content_ideas = generate_content_ideas(cv_analysis, api_key=api_key)
-        if not content_ideas:
+        if not generation['content_ideas']:
             return Response({'error': 'Failed to generate content ideas'}, status=400)
 
-        # Generate different types of posts
-        print("Generating posts...")
-        posts = []
-        post_types = [
-            {'type': 'achievement', 'tone': 'professional'},
-            {'type': 'skill_highlight', 'tone': 'confident'},
-            {'type': 'career_journey', 'tone': 'storytelling'},
-            {'type': 'industry_insight', 'tone': 'thought_leadership'},
-        ]
-
-        for post_type in post_types:
-            print(f"Generating {post_type['type']} post...")
-            post_data = generate_linkedin_content(
-                cv_text,
-                post_type['type'],
-                post_type['tone'],
-                api_key=api_key
-            )
-            
-            if isinstance(post_data, str):  # Error case
-                posts.append({
-                    'type': post_type['type'],
-                    'content': post_data,
-                    'status': 'error'
-                })
-            else:
-                posts.append({
-                    'type': post_type['type'],
-                    'content': post_data['content'],
-                    'engagement_suggestions': post_data.get('engagement_suggestions'),
-                    'industry_trends': post_data.get('industry_trends'),
-                    'skills_analysis': post_data.get('skills_analysis'),
-                    'related_news': post_data.get('related_news'),
-                    'status': 'success'
-                })
-
+        posts = generation['posts']
         response_data = {
             'status': 'success',
-            'cv_analysis': cv_analysis,
-            'content_ideas': content_ideas,
+            'cv_analysis': generation['cv_analysis'],
+            'content_ideas': generation['content_ideas'],
             'posts': posts,
             'industry_trends': posts[0].get('industry_trends'),
             'skills_analysis': posts[0].get('skills_analysis'),
             'news': posts[0].get('related_news', [])
         }
-        
+        if stored:
+            response_data['generation_id'] = str(stored.id)
+
         return Response(response_data)
 
     except Exception as e:
-        print(f"=== Error in GeneratePostsView.post: {str(e)} ===")
-        return Response({'error': str(e)}, status=500) 
\ No newline at end of file
+        logger.exception("Error in generate_posts")
+        return Response({'error': str(e)}, status=500)
+
+# Generation history: stored runs, and regeneration of one section of a run
+
+@api_view(['GET'])
+def generation_detail(request, generation_id):
+    api_key = request_api_key(request)
+    if not api_key:
+        return Response({'error': 'API key is required'}, status=400)
+    generation = get_generation(generation_id, api_key)
+    if generation is None:
+        return Response({'error': 'Generation not found'}, status=404)
+    posts = [(post_entry(generation, post), post.version) for post in current_posts(generation)]
+    data = serialize_stored_generation(generation, posts)
+    return json_response(request, compact_generation(data) if compact_flag(request) else data)
+
+@api_view(['POST'])
+def generation_history(request):
+    """The stored generations of an API key, newest first (optionally only those of one ``cv_hash``)"""
+    api_key = request.data.get('api_key')
+    if not api_key:
+        return Response({'error': 'API key is required'}, status=400)
+    generations = list_generations(api_key, request.data.get('cv_hash'))
+    return Response({'generations': [serialize_generation_summary(generation) for generation in generations]})
+
+@api_view(['POST'])
+def regenerate_section(request, generation_id):
+    """Regenerate one post type (``section`` is its type) or the ``content_calendar`` of a stored run"""
+    api_key = request.data.get('api_key')
+    if not api_key:
+        return Response({'error': 'API key is required'}, status=400)
+
+    section = request.data.get('section')
+    if section != SECTION_CALENDAR and section not in POST_TONES:
+        return Response({
+            'error': 'Unknown section',
+            'details': f"Use one of: {', '.join([*POST_TONES, SECTION_CALENDAR])}"
+        }, status=400)
+
+    # Only the key that created a generation can regenerate it
+    generation = get_generation(generation_id, api_key)
+    if generation is None:
+        return Response({'error': 'Generation not found'}, status=404)
+
+    try:
+        if section == SECTION_CALENDAR:
+            calendar = regenerate_calendar(generation, api_key)
+            if calendar is None:
+                return Response({'error': 'Failed to regenerate the content calendar'}, status=500)
+            return Response({'status': 'success', 'generation_id': str(generation.id), 'content_calendar': calendar})
+
+        post = regenerate_post(generation, section, api_key)
+        if post is None:
+            return Response({'error': f'Failed to regenerate the {section} post'}, status=500)
+        return Response({
+            'status': 'success',
+            'generation_id': str(generation.id),
+            'post': dict(serialize_post(post_entry(generation, post)), version=post.version)
+        })
+
+    except Exception as e:
+        logger.exception("Error in regenerate_section")
+        return Response({'error': str(e), 'details': 'An unexpected error occurred'}, status=500)
+
+# Async endpoints: plain Django async views (DRF views are sync-only) so a
+# generation does not hold a worker thread while waiting on OpenAI.
+
+def validate_upload(request):
+    """Return ``(api_key, cv_file, error_response)`` for a multipart generate request"""
+    api_key = request.POST.get('api_key')
+    if not api_key:
+        return None, None, JsonResponse({'error': 'API key is required'}, status=400)
+
+    cv_file = request.FILES.get('cv')
+    if not cv_file:
+        return None, None, JsonResponse({'error': 'No CV file provided'}, status=400)
+
+    return api_key, cv_file, None
+
+@csrf_exempt
+@require_POST
+async def generate_posts_async(request):
+    api_key, cv_file, error_response = validate_upload(request)
+    if error_response:
+        return error_response
+
+    try:
+        cv_text = await asyncio.to_thread(read_cv_text, cv_file)
+    except Exception as e:
+        logger.warning("Error reading PDF: %s", e)
+        return JsonResponse({'error': f'Failed to read PDF: {str(e)}'}, status=400)
+
+    try:
+        no_cache = is_flag_set(request.POST.get('no_cache') or request.GET.get('no_cache'))
+        multi_post = multi_post_flag(request)
+        generation, stored = await agenerate_and_store(cv_text, api_key, no_cache, multi_post)
+        if not generation['cv_analysis']:
+            return JsonResponse({'error': 'Failed to analyze CV'}, status=400)
+
+        if not generation['content_ideas']:
+            return JsonResponse({'error': 'Failed to generate content ideas'}, status=400)
+
+        response_data = GeneratePostsView().format_response_data(
+            cv_analysis=generation['cv_analysis'],
+            content_ideas=generation['content_ideas'],
+            posts=generation['posts'],
+            industry_trends=generation['industry_trends'],
+            content_calendar=generation['content_calendar'],
+            news_results=generation['news']
+        )
+
+        if response_data['status'] == 'error':
+            return JsonResponse(response_data, status=500)
+
+        if stored:
+            response_data['generation_id'] = str(stored.id)
+
+        if compact_flag(request):
+            response_data = compact_generation(response_data)
+        return json_response(request, response_data)
+
+    except Exception as e:
+        logger.exception("Error in generate_posts_async")
+        return JsonResponse({
+            'status': 'error',
+            'error': str(e),
+            'details': 'An unexpected error occurred'
+        }, status=500)
+
+@csrf_exempt
+@require_POST
+async def verify_api_key_async(request):
+    api_key = request.POST.get('api_key')
+    if not api_key and request.content_type == 'application/json':
+        try:
+            api_key = json.loads(request.body or b'{}').get('api_key')
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+
+    if not api_key:
+        return JsonResponse({'error': 'API key is required'}, status=400)
+
+    if not api_key.startswith('sk-'):
+        return JsonResponse({'error': 'Invalid API key format. Key should start with "sk-"'}, status=400)
+
+    try:
+        await openai_helper_async.list_models(api_key)
+        return JsonResponse({'status': 'valid'})
+    except ValueError as ve:
+        return JsonResponse({'error': str(ve)}, status=400)
+    except Exception as e:
+        logger.info("API key verification failed: %s", e)
+        return JsonResponse({
+            'error': 'API key validation failed',
+            'details': str(e)
+        }, status=401)
+
+# Streaming endpoints: emit each section as NDJSON lines (or server-sent events
+# with ?format=sse) as soon as its pipeline stage completes.
+
+def _streaming_response(events, stream_format):
+    response = StreamingHttpResponse(events, content_type=CONTENT_TYPES[stream_format])
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+    return response
+
+@csrf_exempt
+@require_POST
+def generate_posts_stream(request):
+    api_key, cv_file, error_response = validate_upload(request)
+    if error_response:
+        return error_response
+
+    try:
+        cv_text = read_cv_text(cv_file)
+    except Exception as e:
+        logger.warning("Error reading PDF: %s", e)
+        return JsonResponse({'error': f'Failed to read PDF: {str(e)}'}, status=400)
+
+    stream_format = stream_format_for(request)
+    no_cache = is_flag_set(request.POST.get('no_cache') or request.GET.get('no_cache'))
+    stream_tokens = is_flag_set(request.POST.get('stream_tokens') or request.GET.get('stream_tokens'))
+    return _streaming_response(
+        stream_generation(cv_text, api_key, stream_format, no_cache, stream_tokens, multi_post_flag(request)),
+        stream_format
+    )
+
+@csrf_exempt
+@require_POST
+async def generate_posts_stream_async(request):
+    api_key, cv_file, error_response = validate_upload(request)
+    if error_response:
+        return error_response
+
+    try:
+        cv_text = await asyncio.to_thread(read_cv_text, cv_file)
+    except Exception as e:
+        logger.warning("Error reading PDF: %s", e)
+        return JsonResponse({'error': f'Failed to read PDF: {str(e)}'}, status=400)
+
+    stream_format = stream_format_for(request)
+    no_cache = is_flag_set(request.POST.get('no_cache') or request.GET.get('no_cache'))
+    stream_tokens = is_flag_set(request.POST.get('stream_tokens') or request.GET.get('stream_tokens'))
+    return _streaming_response(
+        astream_generation(cv_text, api_key, stream_format, no_cache, stream_tokens, multi_post_flag(request)),
+        stream_format
+    )
+
+@csrf_exempt
+@require_POST
+def generate_posts_batch(request):
+    """Generate content for many CVs (PDFs and/or zips of PDFs in ``cvs``), streaming one result per CV"""
+    api_key = request.POST.get('api_key')
+    if not api_key:
+        return JsonResponse({'error': 'API key is required'}, status=400)
+
+    try:
+        cvs = collect_batch_uploads(request.FILES.getlist('cvs'))
+    except BatchUploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    stream_format = stream_format_for(request)
+    no_cache = is_flag_set(request.POST.get('no_cache') or request.GET.get('no_cache'))
+    return _streaming_response(stream_batch(cvs, api_key, stream_format, no_cache), stream_format)
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape endpoint: stage/request latency, token usage, cache and pool state"""
+    if not settings.METRICS_ENABLED:
+        return HttpResponse(status=404)
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        # Without a token the metrics are only served to local development
+        return HttpResponse(status=404)
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -99,32 +99,65 @@ const ContentCreator = () => {
     formData.append('cv', file);
     formData.append('api_key', apiKey);
 
+    setPosts([]);
+    setCvAnalysis(null);
+    setContentIdeas(null);
+    setIndustryTrends(null);
+    setNews([]);
+    setEngagementSuggestions({});
+
+    // Each NDJSON line is one section, rendered as soon as it arrives
+    const handleEvent = ({ event, data }) => {
+      switch (event) {
+        case 'cv_analysis':
+          setCvAnalysis(data);
+          break;
+        case 'content_ideas':
+          setContentIdeas(data);
+          break;
+        case 'industry_trends':
+          setIndustryTrends(data);
+          break;
+        case 'news':
+          setNews(data);
+          break;
+        case 'post':
+          setPosts(prev => [...prev, data]);
+          if (data.engagement_suggestions) {
+            setEngagementSuggestions(prev => ({ ...prev, [data.type]: data.engagement_suggestions }));
+          }
+          break;
+        case 'error':
+          throw new Error(data.error || 'Failed to generate posts');
+        default:
+          break;
+      }
+    };
+
     try {
-      const response = await fetch(`${process.env.REACT_APP_API_URL}/api/generate-posts`, {
+      const response = await fetch(`${process.env.REACT_APP_API_URL}/api/generate-posts/stream`, {
         method: 'POST',
         body: formData,
       });
 
-      const data = await response.json();
-
       if (!response.ok) {
+        const data = await response.json();
         throw new Error(data.error || 'Failed to generate posts');
       }
 
-      setPosts(data.posts);
-      setCvAnalysis(data.cv_analysis);
-      setContentIdeas(data.content_ideas);
-      setIndustryTrends(data.industry_trends);
-      setNews(data.news);
-
-      // Create engagement suggestions map
-      const suggestions = {};
-      data.posts.forEach(post => {
-        if (post.engagement_suggestions) {
-          suggestions[post.type] = post.engagement_suggestions;
-        }
-      });
-      setEngagementSuggestions(suggestions);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+      }
     } catch (err) {
       setError(err.message);
     } finally {
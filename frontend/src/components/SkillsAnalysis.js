@@ -20,6 +20,31 @@ import {
   KeyboardArrowUp,
 } from '@mui/icons-material';
 
+// skills_analysis maps each category to a list of { name, <level> } objects;
+// the level field differs per category (see SKILL_CATEGORIES in cv_profile.py)
+const LEVEL_FIELDS = {
+  technical_skills: 'proficiency',
+  soft_skills: 'strength',
+  domain_knowledge: 'experience',
+  tools_and_technologies: 'expertise',
+  certifications: 'status',
+};
+
+const CATEGORY_LABELS = {
+  technical_skills: 'Technical Skills',
+  soft_skills: 'Soft Skills',
+  domain_knowledge: 'Domain Knowledge',
+  tools_and_technologies: 'Tools & Technologies',
+  certifications: 'Certifications',
+};
+
+const skillLabel = (category, skill) => {
+  // Generations stored before skills carried levels hold plain strings
+  if (typeof skill === 'string') return skill;
+  const level = skill[LEVEL_FIELDS[category]];
+  return level ? `${skill.name} · ${level}` : skill.name;
+};
+
 const SkillCategory = ({ category, skills }) => {
   const [expanded, setExpanded] = useState(false);
   const [page, setPage] = useState(1);
@@ -40,7 +65,7 @@ const SkillCategory = ({ category, skills }) => {
       <CardContent>
         <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', mb: 1 }}>
           <Typography variant="subtitle1" color="primary">
-            {category}
+            {CATEGORY_LABELS[category] || category}
           </Typography>
           <IconButton 
             onClick={() => setExpanded(!expanded)}
@@ -55,7 +80,7 @@ const SkillCategory = ({ category, skills }) => {
             {displayedSkills.map((skill, idx) => (
               <Chip
                 key={idx}
-                label={skill}
+                label={skillLabel(category, skill)}
                 variant="outlined"
                 sx={{ m: 0.5 }}
               />
@@ -84,9 +109,9 @@ const SkillsAnalysis = ({ skillsAnalysis }) => {
 
   // Group skills into categories
   const groupedSkills = Object.entries(skillsAnalysis).reduce((acc, [category, skills]) => {
-    const groupKey = category.includes('Technical') ? 'Technical Skills' :
-                    category.includes('Soft') ? 'Soft Skills' :
-                    category.includes('Domain') ? 'Domain Knowledge' : 'Other Skills';
+    const groupKey = category === 'technical_skills' || category === 'tools_and_technologies' ? 'Technical Skills' :
+                    category === 'soft_skills' ? 'Soft Skills' :
+                    category === 'domain_knowledge' ? 'Domain Knowledge' : 'Other Skills';
     
     if (!acc[groupKey]) acc[groupKey] = {};
     acc[groupKey][category] = skills;